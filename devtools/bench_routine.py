@@ -0,0 +1,73 @@
+"""
+Routine create and resume throughput.
+
+Run from the repository root:
+
+    python devtools/bench_routine.py [-n routines] [-r resumes]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sc3.all import *
+
+
+def gen_noarg():
+    while True:
+        yield 1
+
+
+def gen_inval(inval):
+    while True:
+        inval = yield inval
+
+
+def create(func, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        Routine(func)
+    return n / (time.perf_counter() - t0)
+
+
+def create_resume(func, n, resumes):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        r = Routine(func)
+        for i in range(resumes):
+            r.next(i)
+    return n * resumes / (time.perf_counter() - t0)
+
+
+def resume(func, n):
+    r = Routine(func)
+    r.next()
+    t0 = time.perf_counter()
+    for i in range(n):
+        r.next(i)
+    return n / (time.perf_counter() - t0)
+
+
+def best(func, *args, repeat=5):
+    return max(func(*args) for _ in range(repeat))
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-n', type=int, default=20000, help='routines')
+    parser.add_argument('-r', type=int, default=8, help='resumes per routine')
+    args = parser.parse_args()
+
+    main.nrt()  # Logical time doesn't follow the system clock.
+    for name, func in [('noarg', gen_noarg), ('inval', gen_inval)]:
+        print(f'{name:6}'
+              f' create {best(create, func, args.n):12,.0f}/s'
+              f' create+resume {best(create_resume, func, args.n, args.r):12,.0f}/s'
+              f' resume {best(resume, func, args.n * args.r):12,.0f}/s')
+
+
+if __name__ == '__main__':
+    main_()
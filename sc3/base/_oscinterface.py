@@ -8,6 +8,48 @@ from . import netaddr as nad
 from . import _osclib as oli
 
 
+def build_msg(arg_list):  # ['/path', arg1, arg2, ..., argN]
+    msg_builder = oli.OscMessageBuilder(arg_list.pop(0))
+    for arg in arg_list:
+        if arg is None:
+            msg_builder.add_arg(0)
+        elif isinstance(arg, bool):
+            msg_builder.add_arg(int(arg))
+        elif isinstance(arg, list):
+            if len(arg) == 0:
+                msg_builder.add_arg(0)
+            elif isinstance(arg[0], str):
+                msg_builder.add_arg(build_msg(arg).dgram)
+            elif isinstance(arg[0], (int, float, type(None))):
+                msg_builder.add_arg(build_bundle(arg).dgram)
+            else:
+                raise oli.OscMessageBuildError(
+                    'lists within messages must be a valid '
+                    f'OSC message or bundle: {arg}')
+        else:
+            msg_builder.add_arg(arg)  # Infiere correctamente el resto de los tipos.
+    return msg_builder.build()
+
+
+def build_bundle(arg_list):  # [time, ['/path', arg1, arg2, ..., argN], ['/path', arg1, arg2, ..., argN], ...]
+    time = arg_list.pop(0)
+    if time is None:  # Only None is IMMEDIATELY, zero is t=0 in nrt scores.
+        time = oli.IMMEDIATELY
+    bndl_builder = oli.OscBundleBuilder(time)
+    for arg in arg_list:
+        if isinstance(arg, bytes):
+            bndl_builder.add_content(arg)  # Message datagram.
+        elif isinstance(arg[0], str):
+            bndl_builder.add_content(build_msg(list(arg)))  # Not popped.
+        elif isinstance(arg[0], (int, float, type(None))):
+            bndl_builder.add_content(build_bundle(list(arg)))
+        else:
+            raise oli.OscMessageBuildError(
+                'lists within messages must be a valid '
+                f'OSC message or bundle: {arg}')
+    return bndl_builder.build()
+
+
 class OscInteface():
     def __init__(self, client_port=57120, protocol='udp', port_range=10):
         '''proto es 'udp' o 'tcp', algunos servidores pueden usar abmos.'''
@@ -104,28 +146,6 @@ class OscInteface():
         self._running = False
         atexit.unregister(self.stop)
 
-    def _build_msg(self, arg_list):  # ['/path', arg1, arg2, ..., argN]
-        msg_builder = oli.OscMessageBuilder(arg_list.pop(0))
-        for arg in arg_list:
-            if arg is None:
-                msg_builder.add_arg(0)
-            elif isinstance(arg, bool):
-                msg_builder.add_arg(int(arg))
-            elif isinstance(arg, list):
-                if len(arg) == 0:
-                    msg_builder.add_arg(0)
-                elif isinstance(arg[0], str):
-                    msg_builder.add_arg(self._build_msg(arg).dgram)
-                elif isinstance(arg[0], (int, float, type(None))):
-                    msg_builder.add_arg(self._build_bundle(arg).dgram)
-                else:
-                    raise oli.OscMessageBuildError(
-                        'lists within messages must be a valid '
-                        f'OSC message or bundle: {arg}')
-            else:
-                msg_builder.add_arg(arg)  # Infiere correctamente el resto de los tipos.
-        return msg_builder.build()
-
     def send_msg(self, target, *args):
         '''
         args are values to create one message.
@@ -134,41 +154,63 @@ class OscInteface():
         Non empty lists are converted to blobs containing osc messages or
         bundles. Empty strings are sent unchanged.
         '''
-        msg = self._build_msg(list(args))
+        msg = build_msg(list(args))
         # *** BUG: Check size?
         self._server.socket.sendto(msg.dgram, target)
 
-    def _build_bundle(self, arg_list):  # [time, ['/path', arg1, arg2, ..., argN], ['/path', arg1, arg2, ..., argN], ...]
-        bndl_builder = oli.OscBundleBuilder(arg_list.pop(0) or oli.IMMEDIATELY)  # Only None is IMMEDIATELY, zero can't reach this stage through addr.send_bundle.
-        for arg in arg_list:
-            if isinstance(arg[0], str):
-                bndl_builder.add_content(self._build_msg(arg))
-            elif isinstance(arg[0], (int, float, type(None))):
-                bndl_builder.add_content(self._build_bundle(arg))
-            else:
-                raise oli.OscMessageBuildError(
-                    'lists within messages must be a valid '
-                    f'OSC message or bundle: {arg}')
-        return bndl_builder.build()
-
     def send_bundle(self, target, time, *args):
         '''
         args are lists of values to creae a message or bundle each.
         target is a tuple (hostname, port).
+        time is in elapsed time seconds, it is converted to an OSC timetag.
         If time is None the OSC library must send 1 (immediate) as timetag.
-        If time is negative it will be substracted from elapsed time and be
-        an already late timetag (no check for sign).
         '''
-        bndl = self._build_bundle([time, *args])
+        if time is not None:
+            time = clk.SystemClock.elapsed_time_to_osc(time)
+        bndl = build_bundle([time, *args])
         # *** BUG: Check size?
         self._server.socket.sendto(bndl.dgram, target)
 
+    def timetag(self, time):
+        '''
+        Return the OSC timetag of nested bundles for time in elapsed time
+        seconds, the time of the outer bundle is converted by send_bundle.
+        '''
+        return clk.SystemClock.elapsed_time_to_osc(time)
+
     # *** *** BUG: volver estos métodos a NetAddr de alguna manera.
     def msg_size(self, arg_list): # ['/path', arg1, arg2, ..., argN]
-        msg = _build_msg(arg_list)  # *** BUG: el problema es no estar construyendo el mensaje dos veces igual.
+        msg = build_msg(arg_list)  # *** BUG: el problema es no estar construyendo el mensaje dos veces igual.
         return msg.size  # *** BUG: este método está demás, hay que hacer todo en quién llama y guardar el msg.
 
     # *** BUG: ver _NetAddr_BundleSize
     def bundle_size(self, arg_list): # [time, ['/path', arg1, arg2, ..., argN], ['/path', arg1, arg2, ..., argN], ...]
-        bndl = _build_bundle(arg_list)  # *** BUG: el problema es no estar construyendo el atado dos veces igual.
+        bndl = build_bundle(arg_list)  # *** BUG: el problema es no estar construyendo el atado dos veces igual.
         return bndl.size  # *** BUG: este método está demás, hay que hacer todo en quién llama y guardar el bndl.
+
+
+class OscNrtInterface(OscInteface):
+    '''
+    Interface used in nrt mode, nothing is sent through the network,
+    messages and bundles are recorded into score at logical time.
+    score is any object with an add(bundle) method (Score, ScoreWriter).
+    '''
+
+    def __init__(self, score=None):
+        super().__init__(None, None, 0)
+        self.score = score
+
+    def send_msg(self, target, *args):
+        self.score.add([_libsc3.main.current_tt.seconds, list(args)])
+
+    def timetag(self, time):
+        # Score times are seconds from zero.
+        return int(time * 4294967296)  # 2 ** 32, same as Score.
+
+    def send_bundle(self, target, time, *args):
+        # time is logical time in seconds, None is now.
+        if time is None:
+            time = _libsc3.main.current_tt.seconds
+        # Encoded message datagrams (bytes) are kept as they are.
+        self.score.add([time, *(
+            arg if isinstance(arg, bytes) else list(arg) for arg in args)])
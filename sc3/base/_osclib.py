@@ -533,7 +533,8 @@ class OscBundleBuilder(object):
         """Add a new content to this bundle.
 
         Args:
-          - content: Either an OscBundle or an OscMessage
+          - content: Either an OscBundle, an OscMessage or the bytes
+            of a message datagram.
         """
         self._contents.append(content)
 
@@ -551,6 +552,9 @@ class OscBundleBuilder(object):
                     size = content.size
                     dgram += write_int(size)
                     dgram += content.dgram
+                elif type(content) is bytes:
+                    dgram += write_int(len(content))
+                    dgram += content
                 else:
                     raise OscBundleBuildError(
                         'Content must be either OscBundle or OscMessage '
@@ -874,8 +878,8 @@ class UDPHandler(socketserver.BaseRequestHandler):
         packet = OscPacket(self.request[0])
         for timed_msg in packet.messages:
             msg = [timed_msg.message.address, *timed_msg.message.params]
-            _libsc3.main._osc_interface.recv(self.client_address,
-                                             timed_msg.time, *msg)
+            _libsc3.main._rt_osc_interface.recv(self.client_address,
+                                                timed_msg.time, *msg)
         # NOTE: Exception are handled by BaseServer.handle_error, "The default action is to print the traceback to standard error and continue handling further requests."
         # NOTE: "The type of self.request is different for datagram or stream services. For stream services, self.request is a socket object; for datagram services, self.request is a pair of string and socket."
 
@@ -49,6 +49,7 @@ class scbuiltin():
                             f"supported for type '{type(x).__name__}'")
 
         scbuiltin_.__name__ = func.__name__  # used to obtain special_index.
+        scbuiltin_.__wrapped__ = func  # used by operator fusion.
         scbuiltin_.__qualname__ += func.__name__
         return scbuiltin_
 
@@ -70,6 +71,7 @@ class scbuiltin():
                             f"and '{type(b).__name__}'")
 
         scbuiltin_.__name__ = func.__name__  # used to obtain special_index.
+        scbuiltin_.__wrapped__ = func  # used by operator fusion.
         scbuiltin_.__qualname__ += func.__name__
         return scbuiltin_
 
@@ -87,6 +89,7 @@ class scbuiltin():
                             f"supported for type '{type(x).__name__}'")
 
         scbuiltin_.__name__ = func.__name__  # used to obtain special_index.
+        scbuiltin_.__wrapped__ = func  # used by operator fusion.
         scbuiltin_.__qualname__ += func.__name__
         return scbuiltin_
 
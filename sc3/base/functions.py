@@ -549,9 +549,12 @@ class UnaryOpFunction(AbstractFunction):
     def __init__(self, selector, a):
         self.selector = selector
         self.a = a
+        self._fused = None
 
     def __call__(self, *args, **kwargs):
-        return self.selector(self.a(*args, **kwargs))
+        if self._fused is None:
+            self._fused = _fuse_function(self)
+        return self._fused(*args, **kwargs)
 
 
 class BinaryOpFunction(AbstractFunction):
@@ -559,11 +562,12 @@ class BinaryOpFunction(AbstractFunction):
         self.selector = selector
         self.a = a
         self.b = b
+        self._fused = None
 
     def __call__(self, *args, **kwargs):
-        a_value = self.a(*args, **kwargs) if callable(self.a) else self.a
-        b_value = self.b(*args, **kwargs) if callable(self.b) else self.b
-        return self.selector(a_value, b_value)
+        if self._fused is None:
+            self._fused = _fuse_function(self)
+        return self._fused(*args, **kwargs)
 
 
 class NAryOpFunction(AbstractFunction):
@@ -573,11 +577,101 @@ class NAryOpFunction(AbstractFunction):
         self.args = args
 
     def __call__(self, *args, **kwargs):
+        # Not fused, args are evaluated before a.
         evaluated_args = [x(*args, **kwargs) if isinstance(x, Function) else x\
                           for x in self.args]
         return self.selector(self.a(*args, **kwargs), *evaluated_args)
 
 
+### operator fusion ###
+
+
+class _Fuser():
+    '''
+    Compile an operator tree into a single function.
+
+    The tree is written as one Python expression, operators become infix
+    or prefix operators, leaves and constants are free variables of the
+    function. Code is cached by expression so only the first tree of each
+    shape compiles. If unwrap is True scbuiltin selectors are called
+    without their dispatch when all operands are ints or floats, other
+    values (like UGens, streams or Operands) go through the dispatch.
+    '''
+
+    _INFIX = {
+        operator.add: '+', operator.sub: '-', operator.mul: '*',
+        operator.truediv: '/', operator.floordiv: '//', operator.mod: '%',
+        operator.pow: '**', operator.lshift: '<<', operator.rshift: '>>',
+        operator.and_: '&', operator.or_: '|', operator.xor: '^',
+        operator.lt: '<', operator.le: '<=', operator.gt: '>',
+        operator.ge: '>=', operator.eq: '==', operator.ne: '!='}
+    _PREFIX = {operator.neg: '-', operator.pos: '+', operator.invert: '~'}
+    _code_cache = dict()
+    _CODE_CACHE_SIZE = 256
+
+    def __init__(self, unwrap=False):
+        self.namespace = dict()
+        self.unwrap = unwrap
+
+    def value(self, obj):
+        name = f'_v{len(self.namespace)}'
+        self.namespace[name] = obj
+        return name
+
+    def op(self, selector, *args):
+        if len(args) == 2 and selector in self._INFIX:
+            return f'({args[0]} {self._INFIX[selector]} {args[1]})'
+        if len(args) == 1 and selector in self._PREFIX:
+            return f'({self._PREFIX[selector]}{args[0]})'
+        if self.unwrap and hasattr(selector, '__wrapped__'):
+            selector = _unwrapped_call(selector)
+        return f'{self.value(selector)}({", ".join(args)})'
+
+    def compile(self, params, expr):
+        src = f'def _fused({params}):\n    return {expr}\n'
+        code = self._code_cache.get(src)
+        if code is None:
+            if len(self._code_cache) >= self._CODE_CACHE_SIZE:
+                self._code_cache.clear()
+            code = self._code_cache[src] = compile(src, '<fused>', 'exec')
+        exec(code, self.namespace)
+        return self.namespace['_fused']
+
+
+_PLAIN_NUMBERS = frozenset((int, float))
+
+
+def _unwrapped_call(selector):
+    # Call the scbuiltin without its dispatch if all args are numbers.
+    wrapped = selector.__wrapped__
+
+    def call(*args):
+        if _PLAIN_NUMBERS.issuperset(map(type, args)):
+            return wrapped(*args)
+        return selector(*args)
+
+    return call
+
+
+def _fuse_function(obj):
+    fuser = _Fuser()
+    return fuser.compile('*args, **kwargs', _function_expr(fuser, obj))
+
+
+def _function_expr(fuser, obj):
+    # Unary evaluates a and Binary evaluates callable operands, from left
+    # to right. NAry is a leaf, it evaluates a after its Function args.
+    call = '(*args, **kwargs)'
+    if type(obj) is UnaryOpFunction:
+        return fuser.op(obj.selector, _function_expr(fuser, obj.a))
+    if type(obj) is BinaryOpFunction:
+        return fuser.op(
+            obj.selector,
+            *(_function_expr(fuser, x) if callable(x) else fuser.value(x)
+              for x in (obj.a, obj.b)))
+    return fuser.value(obj) + call
+
+
 # class FunctionList(AbstractFunction):
 #     pass
 
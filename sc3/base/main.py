@@ -3,10 +3,10 @@
 import threading
 import atexit
 import time
-import random
 import sys
 
 from ..synth import server as srv
+from ..synth import score as scr
 from ..seq import stream as stm
 from ..seq import clock as clk
 from . import _oscinterface as osci
@@ -32,8 +32,9 @@ class Process(type):
     def __init__(cls, name, bases, dict):
         cls._main_lock = threading.RLock()
         cls._switch_cond = threading.Condition(cls._main_lock)
+        cls._tls = threading.local()
         cls._mode = None
-        cls._rgen = random.Random()
+        cls._rgen = None  # Created with the first main thread.
         cls._init_platform()
         atexit.register(cls.shutdown)
 
@@ -58,31 +59,23 @@ class Process(type):
         # the same time because main.elapsed_time() == 0 is in logic relation
         # to main._rt_time_of_initialization. Comment to be removed later if true.
         cls._rt_time_of_initialization = time.time()  # time_since_epoch
-        cls._rt_perf_counter_time_of_initialization = time.perf_counter()  # monotonic clock.
+        cls._rt_perf_counter_ns_of_initialization = time.perf_counter_ns()  # monotonic clock.
         cls._create_main_thread('rt')
-        cls._osc_interface = osci.OscInteface()
-        cls._osc_interface.start()
+        cls._rt_osc_interface = osci.OscInteface()
+        cls._rt_osc_interface.start()
 
     def _init_nrt(cls):
         cls._nrt_time_of_initialization = 0.0
         cls._create_main_thread('nrt')
         cls._clock_scheduler = clk.ClockScheduler()
+        cls._nrt_osc_interface = osci.OscNrtInterface(scr.Score())
 
     def _create_main_thread(cls, prefix):
-        # init main time thread # NOTE: ver PyrInterpreter3 L157 newPyrProcess y PyrPrimitive initPyrThread
-        main_tt = stm.TimeThread.__new__(stm.TimeThread)
-        main_tt.parent = None
-        main_tt.func = None
-        main_tt.state = stm.TimeThread.State.Init
-        main_tt._thread_player = None
-        main_tt._beats = 0.0 # NOTE: se inicializan en la declaración de la clase en sclang, sirven solo para mainThread las rutinas llama a _InitThread.
-        main_tt._seconds = 0.0
-        main_tt._rgen = cls._rgen
-
+        if cls._rgen is None:
+            cls._rgen = stm._Random()
+        main_tt = stm._MainTimeThread(cls._rgen)
         main_vname = '_' + prefix + '_main_tt'
-        curr_vname = '_' + prefix + '_current_tt'
         setattr(cls, main_vname, main_tt)
-        setattr(cls, curr_vname, getattr(cls, main_vname)) # NOTE: un solo lock, no pueden existir en paralelo en distintos hilos.
 
     def rt(cls):
         '''Sets the library in rt mode.'''
@@ -94,11 +87,11 @@ class Process(type):
             cls.current_tt = cls.main_tt
             setattr(cls, 'elapsed_time', cls._rt_elapsed_time)
             setattr(cls, 'update_logical_time', cls._rt_update_logical_time)
+            cls._osc_interface = cls._rt_osc_interface
             cls._mode = cls.RT
 
     def nrt(cls):
         '''Sets the library in nrt mode.'''
-        print('*** bug: nrt no va a funcionar con las clases que llaman a SystemClock directamente, por ejemplo Event.')
         if not hasattr(cls, '_nrt_time_of_initialization'):
             cls._init_nrt()
         with cls._switch_cond:
@@ -107,8 +100,53 @@ class Process(type):
             cls.current_tt = cls.main_tt # *** BUG: ver qué pasa si no se resetea.
             setattr(cls, 'elapsed_time', cls._nrt_elapsed_time)
             setattr(cls, 'update_logical_time', cls._nrt_update_logical_time)
+            cls._osc_interface = cls._nrt_osc_interface
             cls._mode = cls.NRT
 
+    def run_nrt(cls, until=None):
+        '''Process the tasks scheduled in nrt mode in logical time order.
+
+        Tasks run one after the other in the calling thread, as fast as
+        possible, until there is nothing left to do or the next task is
+        later than until seconds. Logical time is then left at until.
+        '''
+        if cls._mode != cls.NRT:
+            raise RuntimeError('run_nrt can only be called in nrt mode')
+        cls._clock_scheduler.run(until)
+
+    @property
+    def current_tt(cls):
+        '''The TimeThread running in the calling system thread.'''
+        # Each system thread (clocks, osc, user) runs its own routines.
+        try:
+            return cls._tls.current_tt
+        except AttributeError:
+            return cls.main_tt
+
+    @current_tt.setter
+    def current_tt(cls, value):
+        if value is cls.main_tt:
+            cls._tls.__dict__.pop('current_tt', None)
+        else:
+            cls._tls.current_tt = value
+
+    @property
+    def nrt_score(cls):
+        '''Score where messages and bundles are recorded in nrt mode.
+
+        It can be set to a Score or to a ScoreWriter to stream the
+        bundles to a file as logical time advances.
+        '''
+        if not hasattr(cls, '_nrt_osc_interface'):
+            cls._init_nrt()
+        return cls._nrt_osc_interface.score
+
+    @nrt_score.setter
+    def nrt_score(cls, value):
+        if not hasattr(cls, '_nrt_osc_interface'):
+            cls._init_nrt()
+        cls._nrt_osc_interface.score = value
+
     @property
     def mode(cls):
         return cls._mode
@@ -153,10 +191,10 @@ class Process(type):
     # def open_ports
 
     def add_osc_recv_func(cls, func):
-        cls._osc_interface.add_recv_func(func)
+        cls._rt_osc_interface.add_recv_func(func)
 
     def remove_osc_recv_func(cls, func):
-        cls._osc_interface.remove_recv_func(func)
+        cls._rt_osc_interface.remove_recv_func(func)
 
     # por lo que hace es redundante
     # def replace_osc_recv_func(cls, func):
@@ -165,7 +203,9 @@ class Process(type):
     # *elapsedTime _ElapsedTime
     def _rt_elapsed_time(cls) -> float: # devuelve el tiempo del reloj de mayor precisión menos _time_of_initialization
         '''Physical time since library initialization.'''
-        return time.perf_counter() - cls._rt_perf_counter_time_of_initialization
+        # Integer nanoseconds difference, converted once.
+        return (time.perf_counter_ns()
+                - cls._rt_perf_counter_ns_of_initialization) * 1e-9
 
     def _nrt_elapsed_time(cls) -> float:
         '''Physical time is main_Thread.seconds in nrt.'''
@@ -1,6 +1,6 @@
 """Model.sc"""
 
-import collections
+import collections.abc
 
 
 class _Dendrite():
@@ -37,7 +37,7 @@ class _Dendrite():
             return value
         if isinstance(value, tuple):
             return list(value)
-        if isinstance(value, collections.Hashable):
+        if isinstance(value, collections.abc.Hashable):
             return [value]
         raise KeyError(f'{type(value).__name__} is not a valid path')
 
@@ -3,7 +3,6 @@
 import ipaddress as _ipaddress
 import socket as _socket
 
-from ..seq import clock as clk
 from ..seq import stream as stm
 from . import main as _libsc3
 from . import utils as utl
@@ -56,7 +55,7 @@ class NetAddr():
 
     @classmethod
     def lang_port(cls):
-        return _libsc3.main._osc_interface.port
+        return _libsc3.main._rt_osc_interface.port
 
     @staticmethod
     def match_lang_ip(ipstring):
@@ -104,7 +103,6 @@ class NetAddr():
     def send_bundle(self, time, *args):
         if time is not None:
             time += _libsc3.main.current_tt.seconds
-            time = clk.SystemClock.elapsed_time_to_osc(time)
         _libsc3.main._osc_interface.send_bundle(self._target, time, *args)
 
     def send_status_msg(self):
@@ -1,6 +1,7 @@
 
 from . clock import *
 # from . event import *
+from . parallel import *
 from . pattern import *
 # from . patterns import *
 from . rest import *
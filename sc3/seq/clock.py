@@ -1,7 +1,11 @@
 """Clock.sc"""
 
+import asyncio as _asyncio
+import contextvars as _contextvars
+import fractions as _fractions
 import heapq as _heapq
 import itertools as _itertools
+import queue as _queue
 import threading as _threading
 import time as _time
 import sys as _sys
@@ -17,10 +21,37 @@ from ..base import functions as fn
 from ..base import systemactions as sac
 from ..base import model as mdl
 from . import stream as stm
+from . import tempomap as tmp
 
 
 # // Clocks for timing threads.
 
+
+# Values that can be returned by tasks to be rescheduled.
+_DELTA_TYPES = (int, float, _fractions.Fraction)
+
+# Binary subdivisions, triplets, quintuplets and septuplets.
+_SUBDIVISION = 2 ** 10 * 3 * 5 * 7
+
+# Relative error of floats snapped by _rational.
+_RATIONAL_TOLERANCE = 1e-12
+
+
+def _rational(value):
+    # Return a float as an exact Fraction if it's a multiple of
+    # 1/_SUBDIVISION within a relative error of _RATIONAL_TOLERANCE, that
+    # is float rounding (e.g. 1/3, 0.1 + 0.2, 2.375). Other floats (e.g.
+    # 1/11, 0.123456789, 1e-13), ints, Fractions, inf and nan are returned
+    # unchanged. Only times that are Fractions or ints take the integer
+    # path of SystemClock.elapsed_time_to_osc, seconds of clocks are floats.
+    if type(value) is float and _math.isfinite(value):
+        scaled = value * _SUBDIVISION
+        n = round(scaled)
+        if abs(scaled - n) <= abs(scaled) * _RATIONAL_TOLERANCE:
+            return _fractions.Fraction(n, _SUBDIVISION)
+    return value
+
+
 class TaskQueue():
     """
     This class is an encapsulation of the algorithm found in heapq
@@ -66,6 +97,40 @@ class TaskQueue():
                 self._removed_counter -= 1
         raise KeyError('pop from an empty task queue')
 
+    def pop_batch(self):
+        '''Remove and return all the entries with the lowest time as a
+        tuple (time, tasks), tasks in the order they were added.
+        Raise KeyError if empty.'''
+        time, task = self.pop()
+        tasks = [task]
+        queue = self._queue
+        while queue and queue[0][0] == time:
+            task = _heapq.heappop(queue)[2]
+            if task is not type(self)._REMOVED:
+                del self._entry_finder[task]
+                tasks.append(task)
+            else:
+                self._removed_counter -= 1
+        return (time, tasks)
+
+    def add_batch(self, items):
+        'Add or update the tasks of an iterable of (time, task) pairs.'
+        queue = self._queue
+        entries = []
+        for time, task in items:
+            if task in self._entry_finder:
+                self.remove(task)
+            entry = [time, next(self._counter), task]
+            self._entry_finder[task] = entry
+            entries.append(entry)
+        # heapify is linear, pushing is logarithmic for each entry.
+        if len(entries) * len(queue).bit_length() > len(queue):
+            queue.extend(entries)
+            _heapq.heapify(queue)
+        else:
+            for entry in entries:
+                _heapq.heappush(queue, entry)
+
     def peek(self):
         '''Return the lowest time entry as a tuple (time, task) without
         removing it.'''
@@ -134,7 +199,10 @@ class MetaSystemClock(type):
 
         def init_func(cls):
             cls._task_queue = TaskQueue()
-            cls._sched_cond = _threading.Condition(_libsc3.main._main_lock)
+            cls._batch = []
+            cls._inbox = _queue.SimpleQueue()
+            cls._head = _math.inf
+            cls._sched_cond = _threading.Condition()
             cls._thread = _threading.Thread(
                 target=cls._run,
                 name=cls.__name__,
@@ -242,9 +310,14 @@ class SystemClock(Clock, metaclass=MetaSystemClock):
 
     @classmethod
     def elapsed_time_to_osc(cls, elapsed: float) -> int:  # int64
-        return int(
-            elapsed * cls._SECONDS_TO_OSC
-        ) + cls._elapsed_osc_offset
+        if type(elapsed) is float:
+            # Scaling by a power of two is exact for floats.
+            return int(
+                elapsed * cls._SECONDS_TO_OSC
+            ) + cls._elapsed_osc_offset
+        # Integer only for int and Fraction, exact for any duration.
+        num, den = elapsed.numerator, elapsed.denominator
+        return (num << 32) // den + cls._elapsed_osc_offset
 
     @classmethod
     def osc_to_elapsed_time(cls, osctime: int) -> float:  # L286
@@ -258,15 +331,30 @@ class SystemClock(Clock, metaclass=MetaSystemClock):
 
     @classmethod
     def _sched_add(cls, secs, task):  # L353
-        if cls._task_queue.empty():
-            prev_time = -1e10
-        else:
-            prev_time = cls._task_queue.peek()[0]
-        cls._task_queue.add(secs, task)
+        if _libsc3.main.mode == _libsc3.main.NRT:
+            if isinstance(task, stm.TimeThread):
+                task.next_beat = secs
+            _libsc3.main._clock_scheduler.add(secs, cls, task)
+            return
         if isinstance(task, stm.TimeThread):
             task.next_beat = secs
-        if cls._task_queue.peek()[0] != prev_time:
-            cls._sched_cond.notify_all()  # Call with acquired lock.
+        # Lock free, the scheduler thread moves it to the queue and
+        # only needs to be notified if it's earlier than what it waits.
+        cls._inbox.put((secs, task))
+        if secs < cls._head:
+            with cls._sched_cond:
+                cls._sched_cond.notify_all()
+
+    @classmethod
+    def _drain_inbox(cls):
+        # Call with acquired lock. Producers notify while _head is inf.
+        cls._head = _math.inf
+        inbox = cls._inbox
+        if not inbox.empty():
+            items = []
+            while not inbox.empty():
+                items.append(inbox.get_nowait())
+            cls._task_queue.add_batch(items)
 
     @classmethod
     def _sched_stop(cls):  # Shouldn't be stopped.
@@ -280,63 +368,86 @@ class SystemClock(Clock, metaclass=MetaSystemClock):
     def sched_clear(cls):  # L387, called by schedClearUnsafe() with gLangMutex
         with cls._sched_cond:
             if cls._run_sched:
+                cls._drain_inbox()
                 cls._task_queue.clear()
+                cls._batch.clear()
                 cls._sched_cond.notify_all()
 
     @classmethod
     def _run(cls):
         cls._run_sched = True
+        queue = cls._task_queue
 
         with cls._sched_cond:
             while True:
+                cls._drain_inbox()
+
                 # // wait until there is something in scheduler
-                while cls._task_queue.empty():
+                if queue.empty():
                     cls._sched_cond.wait()
                     if not cls._run_sched:
                         return
+                    continue
 
                 # // wait until an event is ready
-                now = 0
-                while not cls._task_queue.empty():
-                    # NOTE: I think there is no need for this clock to be
-                    # monotonic and sclang may or may not be working this way,
-                    # is less complicated here to use just elapsed_time.
-                    # I leave previous code commented for now (this should be the same).
-                    # now = _time.time()
-                    now = _libsc3.main.elapsed_time()
-                    sched_secs = cls._task_queue.peek()[0]
-                    # sched_point = (_libsc3.main._time_of_initialization
-                    #                + sched_secs)
-                    # if now >= sched_point:
-                    if now >= sched_secs:
-                        break
-                    # cls._sched_cond.wait(sched_point - now)
+                # NOTE: I think there is no need for this clock to be
+                # monotonic and sclang may or may not be working this way,
+                # is less complicated here to use just elapsed_time.
+                now = _libsc3.main.elapsed_time()
+                sched_secs = queue.peek()[0]
+                if now < sched_secs:
+                    cls._head = sched_secs
                     cls._sched_cond.wait(sched_secs - now)
                     if not cls._run_sched:
                         return
+                    continue
 
                 # // perform all events that are ready
-                # while not cls._task_queue.empty()\
-                # and now >= (_libsc3.main._time_of_initialization
-                #             + cls._task_queue.peek()[0]):
-                while not cls._task_queue.empty()\
-                and now >= cls._task_queue.peek()[0]:
-                    item = cls._task_queue.pop()
-                    sched_time = item[0]
-                    task = item[1]
+                sched_time, tasks = queue.pop_batch()
+                # Tasks run without holding the lock so other threads
+                # can schedule meanwhile.
+                cls._sched_cond.release()
+                try:
+                    resched = cls._awake_batch(sched_time, tasks)
+                finally:
+                    cls._sched_cond.acquire()
+                queue.add_batch(resched)
+                if not cls._run_sched:
+                    return
+
+    @classmethod
+    def _awake_batch(cls, sched_time, tasks):
+        # All tasks due at sched_time run back to back, reschedules are
+        # returned to be added to the queue at once when they are done.
+        # Tasks are consumed from cls._batch so clear can remove them.
+        main = _libsc3.main
+        main.update_logical_time(sched_time) # NOTE: cada vez que algo es programado se actualiza el tiempo lógico de mainThread al tiempo programado.
+        main_tt = main.main_tt
+        resched = []
+        batch = cls._batch
+        batch.extend(reversed(tasks))
+        while True:
+            # clear may pop from another thread while the lock is released.
+            try:
+                task = batch.pop()
+            except IndexError:
+                break
+            if isinstance(task, stm.TimeThread):
+                task.next_beat = None
+            try:
+                main_tt.seconds = sched_time
+                delta = task.__awake__(sched_time, sched_time, cls)
+                if isinstance(delta, _DELTA_TYPES)\
+                and not isinstance(delta, bool):
+                    time = sched_time + delta
                     if isinstance(task, stm.TimeThread):
-                        task.next_beat = None
-                    try:
-                        _libsc3.main.update_logical_time(sched_time) # NOTE: cada vez que algo es programado se actualiza el tiempo lógico de mainThread al tiempo programado.
-                        delta = task.__awake__(sched_time, sched_time, cls)
-                        if isinstance(delta, (int, float))\
-                        and not isinstance(delta, bool):
-                            time = sched_time + delta
-                            cls._sched_add(time, task)
-                    except stm.StopStream:
-                        pass
-                    except Exception:
-                        _traceback.print_exception(*_sys.exc_info())  # Always recover.
+                        task.next_beat = time
+                    resched.append((time, task))
+            except stm.StopStream:
+                pass
+            except Exception:
+                _traceback.print_exception(*_sys.exc_info())  # Always recover.
+        return resched
 
     # sclang methods
 
@@ -346,6 +457,11 @@ class SystemClock(Clock, metaclass=MetaSystemClock):
             item = None
             # BUG: NO SÉ QUE ESTABA PENSANDO CUANOD HICE ESTE, FALTA:
             # BUG: queue es thisProcess.prSchedulerQueue, VER!
+            cls._drain_inbox()
+            while cls._batch:
+                item = cls._batch.pop()
+                if isinstance(item, (stm.EventStreamPlayer, stm.PauseStream)):
+                    item.removed_from_scheduler()
             while not cls._task_queue.empty():
                 item = cls._task_queue.pop()[1]
                 if isinstance(item, (stm.EventStreamPlayer, stm.PauseStream)):
@@ -357,12 +473,11 @@ class SystemClock(Clock, metaclass=MetaSystemClock):
     def sched(cls, delta, item):
         if not hasattr(item, '__awake__'):
             item = fn.Function(item)
-        with cls._sched_cond:
-            seconds = _libsc3.main.current_tt.seconds
-            seconds += delta
-            if seconds == _math.inf:
-                return
-            cls._sched_add(seconds, item)
+        seconds = _libsc3.main.current_tt.seconds
+        seconds += delta
+        if seconds == _math.inf:
+            return
+        cls._sched_add(seconds, item)
 
     @classmethod
     def sched_abs(cls, time, item):
@@ -370,8 +485,7 @@ class SystemClock(Clock, metaclass=MetaSystemClock):
             item = fn.Function(item)
         if time == _math.inf:
             return
-        with cls._sched_cond:
-            cls._sched_add(time, item)
+        cls._sched_add(time, item)
 
     # L542 y L588 setea las prioridades 'rt' para mac o linux, es un parámetro de los objetos Thread
     # ver qué hace std::move(thread)
@@ -400,7 +514,7 @@ class Scheduler():
             # NOTE: Parece correcto el comportamiento, se debe actualizar en wakeup o en awake, acá los estoy haciendo antes pero el tiempo lógico es el mismo que se le pasa a awake.
             _libsc3.main.update_logical_time(self._seconds) # NOTE: cada vez que algo es programado se actualiza el tiempo lógico de mainThread al tiempo programado.
             delta = item.__awake__(self._beats, self._seconds, self._clock)
-            if isinstance(delta, (int, float)) and not isinstance(delta, bool):
+            if isinstance(delta, _DELTA_TYPES) and not isinstance(delta, bool):
                 self._sched_add(delta, item)
         except stm.StopStream:
             pass
@@ -481,8 +595,10 @@ class MetaAppClock(type):
     def __init__(cls, *_):
 
         def init_func(cls):
-            cls._sched_cond = _threading.Condition(_libsc3.main._main_lock)
+            cls._sched_cond = _threading.Condition()
             cls._tick_cond = _threading.Condition()
+            cls._inbox = _queue.SimpleQueue()
+            cls._head = _math.inf
             cls._scheduler = Scheduler(cls, drift=True, recursive=False)
             cls._thread = _threading.Thread(
                 target=cls._run,
@@ -503,26 +619,44 @@ class AppClock(Clock, metaclass=MetaAppClock):
         seconds = None
         while True:
             with cls._sched_cond:
+                cls._drain_inbox()
                 seconds = cls.tick()  # First tick for free, returns None
                 if isinstance(seconds, (int, float))\
                 and not isinstance(seconds, bool):
+                    cls._head = seconds
                     seconds = seconds - cls._scheduler.seconds  # tick returns abstime (elapsed)
                 else:
                     seconds = None
             with cls._tick_cond:  # many notify one wait
-                cls._tick_cond.wait(seconds)  # if seconds is None waits for notify
+                if cls._inbox.empty():  # Else scheduled after draining.
+                    cls._tick_cond.wait(seconds)  # if seconds is None waits for notify
             if not cls._run_sched: return
 
+    @classmethod
+    def _drain_inbox(cls):
+        # Call with acquired lock. Producers notify while _head is inf.
+        cls._head = _math.inf
+        inbox = cls._inbox
+        while not inbox.empty():
+            cls._scheduler.sched_abs(*inbox.get_nowait())
+
     @classmethod
     def clear(cls):
-        cls._scheduler.clear()
+        with cls._sched_cond:
+            cls._drain_inbox()
+            cls._scheduler.clear()
 
     @classmethod
     def sched(cls, delta, item):
-        with cls._sched_cond:
-            cls._scheduler.sched(delta, item)
-        with cls._tick_cond:
-            cls._tick_cond.notify() # cls.tick() pasada a run
+        if not hasattr(item, '__awake__'):
+            item = fn.Function(item)
+        # Lock free, the scheduler thread moves it to the queue, drift
+        # scheduler time is elapsed time when sched is called.
+        time = _libsc3.main.elapsed_time() + delta
+        cls._inbox.put((time, item))
+        if time < cls._head:
+            with cls._tick_cond:
+                cls._tick_cond.notify() # cls.tick() pasada a run
 
     @classmethod
     def tick(cls):
@@ -550,80 +684,90 @@ class AppClock(Clock, metaclass=MetaAppClock):
     # Acá podría ir todo dentro de sched(), ergo sum chin pum: cls.tick()
 
 
-class ClockScheduler(_threading.Thread):
+class ClockScheduler():
+    """
+    Single threaded scheduler for nrt mode. Tasks from every clock are kept
+    in one queue sorted by logical time in seconds and are awaken directly,
+    one after the other, by run(). There is no waiting so offline sequencing
+    is as fast as the tasks themselves.
+    """
+
     def __init__(self):
-        self._sched_cond = _threading.Condition(_libsc3.main._main_lock)
         self.queue = TaskQueue()
         self.prev_elapsed_time = 0.0 # NOTE: para volver en tiempo atrás en StopStream con el tiempo previo del scheduler (no de la rutina como en rt!), ver abajo.
-        _threading.Thread.__init__(self)
-        self.daemon = True
-        self.start()
 
-    def run(self):
-        self._run_sched = True
-        with self._sched_cond:
-            while True:
-                while self.queue.empty():
-                    self._sched_cond.wait()
-                    if not self._run_sched:
-                        return
-                while not self.queue.empty():
-                    time, clock_task = self.queue.pop()
-                    if not self.queue.empty():
-                        next_time = self.queue.peek()[0]
-                    else:
-                        next_time = _math.inf
-                    clock_task.run(time, next_time)
-                    self._sched_cond.wait()
-                    if not self._run_sched:
-                        return
+    def add(self, time, clock, task, beats=None):
+        self.queue.add(time, ClockTask(clock, task, beats))
 
-    def add(self, time, clock_task):
-        with self._sched_cond:
-            self.queue.add(time, clock_task)
-            self._sched_cond.notify()
+    def empty(self):
+        return self.queue.empty()
 
-    def stop(self):
-        with self._sched_cond:
-            self._run_sched = False
-            self._sched_cond.notify()
+    def clear(self, clock=None):
+        '''Remove the tasks of clock, or all, and return them as a list.'''
+        tasks = []
+        for time, count, clock_task in list(self.queue._queue):
+            if clock_task is not TaskQueue._REMOVED\
+            and (clock is None or clock_task.clock is clock):
+                self.queue.remove(clock_task)
+                tasks.append(clock_task.task)
+        return tasks
+
+    def run(self, until=None):
+        """Awake scheduled tasks in logical time order until the queue is
+        empty or the next task is later than until (in seconds)."""
+        queue = self.queue
+        while not queue.empty():
+            time, clock_task = queue.pop()
+            if until is not None and time > until:
+                queue.add(time, clock_task)
+                break
+            clock_task.wakeup(self, time)
+        if until is not None and until > _libsc3.main.main_tt._seconds:
+            _libsc3.main.update_logical_time(until)
 
 
 class ClockTask():
-    def __init__(self, beats, clock, task, scheduler):
+    # Queue entry for ClockScheduler, compares as its task so each task
+    # can only be scheduled once as in the clocks' own queues.
+
+    __slots__ = ('clock', 'task', 'beats')
+
+    def __init__(self, clock, task, beats=None):
         self.clock = clock
         self.task = task
-        self.scheduler = scheduler
-        if scheduler.is_alive():
-            scheduler.add(clock.beats2secs(beats), self)
-        else:
-            RuntimeError('ClockScheduler is not running')
+        self.beats = beats  # Exact scheduled beats, time is in seconds.
 
-    def run(self, time, next_time): # NOTE: se llama desde el loop de scheduler
-        with self.clock._sched_cond:
-            self.time = time
-            self.next_time = next_time
-            self.clock._clock_task = self
-            self.clock._sched_cond.notify()
+    def __hash__(self):
+        return hash(self.task)
 
-    def wakeup(self): # NOTE: se llama desde el loop de clock, con el lock
+    def __eq__(self, other):
+        if isinstance(other, ClockTask):
+            return self.task is other.task
+        return NotImplemented
+
+    def wakeup(self, scheduler, time):
+        clock = self.clock
+        task = self.task
+        beats = self.beats
+        if beats is None:
+            beats = clock.secs2beats(time)
+        if isinstance(clock, TempoClock):
+            if not clock.running():
+                return
+            clock._beats = beats
+        if isinstance(task, stm.TimeThread):
+            task.next_beat = None
         try:
-            _libsc3.main.update_logical_time(self.time)
-            delta = self.task.__awake__(self.clock.secs2beats(self.time),
-                                        self.time, self.clock)
-            if isinstance(delta, (int, float)) and not isinstance(delta, bool):
-                self.scheduler.prev_elapsed_time = self.time # NOTE: tiene que ir acá, si la rutina devuelve una valor que no hace avanzar el tiempo (p.e. 'hang') no cambia el tiempo previo.
-                self.time = self.time + self.clock.beats2secs(delta)
-                self.scheduler.add(self.time, self)
+            _libsc3.main.update_logical_time(time)
+            delta = task.__awake__(beats, time, clock)
+            if isinstance(delta, _DELTA_TYPES) and not isinstance(delta, bool):
+                scheduler.prev_elapsed_time = time # NOTE: tiene que ir acá, si la rutina devuelve una valor que no hace avanzar el tiempo (p.e. 'hang') no cambia el tiempo previo.
+                clock._sched_add(beats + delta, task)
         except stm.StopStream:
-            _libsc3.main.update_logical_time(self.scheduler.prev_elapsed_time) # NOTE: No es el tiempo de la rutina sino del scheduler en este caso, prev_time podía ser el tiempo previo de otra rutina!
+            _libsc3.main.update_logical_time(scheduler.prev_elapsed_time) # NOTE: No es el tiempo de la rutina sino del scheduler en este caso, prev_time podía ser el tiempo previo de otra rutina!
         except Exception:
             _traceback.print_exception(*_sys.exc_info())
 
-    def notify_scheduler(self):
-        with self.scheduler._sched_cond:
-            self.scheduler._sched_cond.notify()
-
 
 ### Quant.sc ###
 # // This class is used to encapsulate quantization issues associated with EventStreamPlayer and TempoClock
@@ -703,7 +847,10 @@ class Quant():
 
 
 class MetaTempoClock(type):
-    def __init__(cls, *_):
+    def __init__(cls, name, bases, dict):
+        if any(isinstance(base, MetaTempoClock) for base in bases):
+            return  # Subclasses share all, default and cmd_period.
+
         cls._all = []
 
         def init_func(cls):
@@ -740,17 +887,11 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
         if tempo < 0.0:
             raise ValueError(f'invalid tempo {tempo}')
         beats = beats or 0.0
-        if _libsc3.main.mode == _libsc3.main.RT:
-            if seconds is None:
-                seconds = _libsc3.main.current_tt.seconds # *** BUG: revisar, puede estar mal, en los test nrt no funciona.
-        else:
-            seconds = 0.0 # *** BUG: NO ENTIENDO SI ESTO ESTÁ ES ASÍ PARA NRT POR QUÉ FUNCIONA EN RT (SI ES QUE FUNCIONA).
+        if seconds is None:
+            seconds = _libsc3.main.current_tt.seconds
 
         # TempoClock::TempoClock()
-        self._tempo = tempo
-        self._beat_dur = 1.0 / tempo
-        self._base_seconds = seconds
-        self._base_beats = beats
+        self._set_timebase(tempo, beats, seconds)
         self._beats = 0.0 # NOTE: Se necesita inicializado para prev_beat (el tiempo previo de la rutina en caso de StopIteration)
 
         # init luego de prStart
@@ -759,14 +900,24 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
         self._base_bar_beat = 0
         self._base_bar = 0.0
         self.permanent = False
+        # If True, beats that are multiples of common subdivisions are
+        # kept as exact fractions so they don't drift in long sessions.
+        self.rational = False
+        self._tempo_map = None
         type(self)._all.append(self)
-
-        if _libsc3.main.mode == _libsc3.main.RT:
-            self._task_queue = TaskQueue()
-        else:
-            self._clock_task = None
-        self._sched_cond = _threading.Condition(_libsc3.main._main_lock)
-
+        self._sched_start()
+
+    def _sched_start(self):
+        self._sched_cond = _threading.Condition()
+        if _libsc3.main.mode == _libsc3.main.NRT:
+            # Tasks go to main's ClockScheduler, there is no thread.
+            self._thread = None
+            self._run_sched = True
+            return
+        self._task_queue = TaskQueue()
+        self._batch = []
+        self._inbox = _queue.SimpleQueue()
+        self._head = _math.inf
         self._thread = _threading.Thread(
             target=self._run,
             name=f'{type(self).__name__} id: {id(self)}',
@@ -775,89 +926,110 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
 
     def _run(self):
         with self._sched_cond:
-            if _libsc3.main.mode == _libsc3.main.RT:
-                self._rt_run()
-            else:
-                self._nrt_run()
-
-    def _nrt_run(self):
-        self._run_sched = True
-
-        while True:
-            while self._clock_task is None:
-                self._sched_cond.wait()
-                if not self._run_sched:
-                    return
-            self._clock_task.wakeup()
-            self._clock_task.notify_scheduler() # NOTE: Siempre noficia, aunque no reprograme.
-            self._sched_cond.wait()
-            if not self._run_sched:
-                return
+            self._rt_run()
 
     def _rt_run(self):
         self._run_sched = True
+        queue = self._task_queue
 
         while True:
+            self._drain_inbox()
+
             # // wait until there is something in scheduler
-            while self._task_queue.empty():
+            if queue.empty():
                 self._sched_cond.wait()
                 if not self._run_sched:
                     return
+                continue
 
             # // wait until an event is ready
-            elapsed_beats = 0
-            while not self._task_queue.empty():
-                elapsed_beats = self.elapsed_beats()
-                qpeek = self._task_queue.peek()
-                if elapsed_beats >= qpeek[0]:
-                    break
-                sched_secs = self.beats2secs(qpeek[0])
+            beats = queue.peek()[0]
+            if self.elapsed_beats() < beats:
+                self._head = beats
+                sched_secs = self.beats2secs(beats)
                 # NOTE: I think there is no need for this clock to be
                 # monotonic and sclang may or may not be working this way,
                 # is less complicated here to use just elapsed_time.
-                # I leave previous code commented for now (this should be the same).
-                # sched_point = _libsc3.main._time_of_initialization + sched_secs
-                # self._sched_cond.wait(sched_point - _time.time())
                 self._sched_cond.wait(sched_secs - _libsc3.main.elapsed_time())
                 if not self._run_sched:
                     return
+                continue
 
             # // perform all events that are ready
-            while not self._task_queue.empty()\
-            and elapsed_beats >= self._task_queue.peek()[0]:
-                item = self._task_queue.pop()
-                prev_beat = self._beats
-                self._beats = item[0] # NOTE: setea mBeats, la propiedad de la clase, SystemClock usa la variable sched_time
-                task = item[1]
-                if isinstance(task, stm.TimeThread):
-                    task.next_beat = None
-                try:
-                    _libsc3.main.update_logical_time(
-                        self.beats2secs(self._beats)) # NOTE: cada vez que algo es programado se actualiza el tiempo lógico de mainThread al tiempo programado.
-                    # runAwakeMessage NOTE: que se llama con la preparación previa de la pila del intérprete
-                    delta = task.__awake__(self._beats,
-                                           self.beats2secs(self._beats),
-                                           self)
-                    if isinstance(delta, (int, float))\
-                    and not isinstance(delta, bool):
-                        time = self._beats + delta
-                        self._sched_add(time, task)
-                except stm.StopStream:
-                    _libsc3.main.update_logical_time(
-                        self.beats2secs(prev_beat))
-                except Exception:
-                    _traceback.print_exception(*_sys.exc_info())
+            beats, tasks = queue.pop_batch()
+            # Tasks run without holding the lock so other threads
+            # can schedule or change tempo meanwhile.
+            self._sched_cond.release()
+            try:
+                resched = self._awake_batch(beats, tasks)
+            finally:
+                self._sched_cond.acquire()
+            queue.add_batch(resched)
+            if not self._run_sched:
+                return
+
+    def _drain_inbox(self):
+        # Call with acquired lock. Producers notify while _head is inf.
+        self._head = _math.inf
+        inbox = self._inbox
+        if not inbox.empty():
+            items = []
+            while not inbox.empty():
+                items.append(inbox.get_nowait())
+            self._task_queue.add_batch(items)
+
+    def _awake_batch(self, beats, tasks):
+        # All tasks due at beats share the logical time computed once,
+        # reschedules are returned to be added to the queue at once.
+        # Tasks are consumed from self._batch so clear can remove them.
+        main = _libsc3.main
+        prev_secs = self.beats2secs(self._beats)
+        self._beats = beats # NOTE: setea mBeats, la propiedad de la clase, SystemClock usa la variable sched_time
+        seconds = self.beats2secs(beats)
+        main.update_logical_time(seconds) # NOTE: cada vez que algo es programado se actualiza el tiempo lógico de mainThread al tiempo programado.
+        main_tt = main.main_tt
+        resched = []
+        batch = self._batch
+        batch.extend(reversed(tasks))
+        while True:
+            # clear may pop from another thread while the lock is released.
+            try:
+                task = batch.pop()
+            except IndexError:
+                break
+            if isinstance(task, stm.TimeThread):
+                task.next_beat = None
+            try:
+                main_tt.seconds = seconds
+                # runAwakeMessage NOTE: que se llama con la preparación previa de la pila del intérprete
+                delta = task.__awake__(beats, seconds, self)
+                if isinstance(delta, _DELTA_TYPES)\
+                and not isinstance(delta, bool):
+                    time = beats + delta
+                    if self.rational:
+                        time = _rational(time)
+                    if isinstance(task, stm.TimeThread):
+                        task.next_beat = time
+                    resched.append((time, task))
+            except stm.StopStream:
+                main_tt.seconds = prev_secs
+            except Exception:
+                _traceback.print_exception(*_sys.exc_info())
+            prev_secs = seconds
+        return resched
 
     def stop(self):
         # prStop -> prTempoClock_Free -> StopReq -> StopAndDelete -> Stop
         # prTempoClock_Free
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
 
         # StopAndDelete
         def stop_func(clock):
             # Stop
             with clock._sched_cond: # lock_guard
+                if not clock._run_sched:
+                    return  # Already stopped by a previous request.
                 clock._run_sched = False # NOTE: son daemon y se liberan solas cuando terminan sin join.
                 type(clock)._all.remove(clock)
                 clock._sched_cond.notify_all() # NOTE: en TempoClock::Stop, es notify_all
@@ -867,6 +1039,10 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
             # *** BUG: Pero también puede ser que notifique varias veces a
             # *** BUG: la misma condición por los distintos wait? Desconocimiento.
 
+        if self._thread is None:  # nrt
+            stop_func(self)
+            return
+
         # StopReq
         stop_thread = _threading.Thread(
             target=stop_func,
@@ -878,7 +1054,8 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
     def __del__(self):
         # BUG: threading mantiene referencias al hilo mientras está vivo,
         # BUG: nunca llama. Posiible solución: que no herede de Thread.
-        self.stop()
+        if self.running():
+            self.stop()
 
     def play(self, task, quant=1):
         quant = Quant.as_quant(quant)
@@ -890,7 +1067,7 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
     @property
     def tempo(self):
         # _TempoClock_Tempo
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         return self._tempo
 
@@ -904,7 +1081,7 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
         # NOTE: dependacy o porque difiere la lógica del objeto en C++.
         # NOTE: Paso la lógica de setTempoAtBeat y TempoClock::SetTempoAtBeat a este setter.
         # setTempoAtBeat(newTempo, this.beats) -> prTempoClock_SetTempoAtBeat
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         if self._tempo < 0.0: # BUG: NO ES CLARO: usa _tempo (mTempo), que puede ser negativo mediante etempo y en ese caso no deja setear acá, ES RARO.
             raise ValueError(
@@ -916,12 +1093,9 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
                 "'etempo()' can be used instead.")
         # TempoClock::SetTempoAtBeat
         beats = self.beats # NOTE: hay obtenerlo solo una vez porque el getter cambia al setear las variables, en C++ es el argumento de una función.
-        self._base_seconds = self.beats2secs(beats)
-        self._base_beats = beats
-        self._tempo = value
-        self._beat_dur = 1.0 / value
-        with self._sched_cond:
-            self._sched_cond.notify() # NOTE: es notify_one en C++
+        self._set_timebase(value, beats, self.beats2secs(beats))
+        self._sched_notify()
+        self._record_tempo()
         # en tempo_
         mdl.NotificationCenter.notify(self, 'tempo')
 
@@ -929,28 +1103,25 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
     def etempo(self, value):
         # TODO: this.setTempoAtSec(newTempo, Main.elapsedTime);
         # _TempoClock_SetTempoAtTime
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         # TempoClock::SetTempoAtTime
         seconds = _libsc3.main.elapsed_time()
-        self._base_beats = self.secs2beats(seconds)
-        self._base_seconds = seconds
-        self._tempo = value
-        self._beat_dur = 1 / value
-        with self._sched_cond:
-            self._sched_cond.notify() # NOTE: es notify_one en C++
+        self._set_timebase(value, self.secs2beats(seconds), seconds)
+        self._sched_notify()
+        self._record_tempo()
         # etempo_
         mdl.NotificationCenter.notify(self, 'tempo')
 
     def beat_dur(self):
         # _TempoClock_BeatDur
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         return self._beat_dur
 
     def elapsed_beats(self):
         # _TempoClock_ElapsedBeats
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         return self.secs2beats(_libsc3.main.elapsed_time())
 
@@ -958,7 +1129,7 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
     def beats(self):
         # _TempoClock_Beats
         # // returns the appropriate beats for this clock from any thread
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         if _libsc3.main.current_tt.clock is self:
             return _libsc3.main.current_tt.beats
@@ -968,76 +1139,134 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
     @beats.setter
     def beats(self, value):
         # _TempoClock_SetBeats
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
-        with self._sched_cond:
-            seconds = _libsc3.main.current_tt.seconds # BUG: revisar en C++ las veces que obtiene beats o seconds de &g->thread que es current_tt
-            # TempoClock::SetAll # NOTE: _TempoClock_SetAll no se usa en sclang, creo que no están bien nombrasdos SetAll (para setea beats), SetTempoAtTime (para setea etempo) y SetTempoAtBeat (para setear tempo)
-            self._base_seconds = seconds
-            self._base_beats = value
-            #self._tempo = self._tempo # NOTE: la llamada a SetAll es clock->SetAll(clock->mTempo, beats, seconds)
-            self._beat_dur = 1.0 / self._tempo
-            with self._sched_cond:
-                self._sched_cond.notify() # NOTE: es notify_one en C++
+        seconds = _libsc3.main.current_tt.seconds # BUG: revisar en C++ las veces que obtiene beats o seconds de &g->thread que es current_tt
+        # TempoClock::SetAll # NOTE: _TempoClock_SetAll no se usa en sclang, creo que no están bien nombrasdos SetAll (para setea beats), SetTempoAtTime (para setea etempo) y SetTempoAtBeat (para setear tempo)
+        # NOTE: la llamada a SetAll es clock->SetAll(clock->mTempo, beats, seconds)
+        self._set_timebase(self._tempo, value, seconds)
+        self._sched_notify()
+        self._record_tempo()
+
+    @property
+    def tempo_map(self):
+        '''TempoMap with the tempo changes of this clock or None.'''
+        return self._tempo_map
+
+    @tempo_map.setter
+    def tempo_map(self, value):
+        self._tempo_map = value
+
+    def record_tempo_map(self):
+        '''
+        Start recording tempo changes into a new tempo map, needed to
+        convert beats and seconds before the last change. beats2secs
+        and secs2beats of the clock only use the current tempo.
+        '''
+        self._tempo_map = tmp.TempoMap(
+            self._tempo, self._base_beats, self._base_seconds)
+        return self._tempo_map
+
+    def _record_tempo(self):
+        if self._tempo_map is not None:
+            self._tempo_map.add(
+                self._base_beats, self._tempo, self._base_seconds)
 
     @property
     def seconds(self): # NOTE: definido solo como getter es thisThread.seconds, en TimeThread es property, acá también por consistencia?
         return _libsc3.main.current_tt.seconds
 
+    # Tempo, beat duration and the base seconds and beats of the clock
+    # are swapped as one tuple so conversions made by the scheduler
+    # thread never mix values from before and after a tempo change.
+
+    def _set_timebase(self, tempo, beats, seconds):
+        self._timebase = (tempo, 1.0 / tempo, seconds, beats)
+
+    @property
+    def _tempo(self):
+        return self._timebase[0]
+
+    @property
+    def _beat_dur(self):
+        return self._timebase[1]
+
+    @property
+    def _base_seconds(self):
+        return self._timebase[2]
+
+    @property
+    def _base_beats(self):
+        return self._timebase[3]
+
+    def _sched_notify(self):
+        # Wakes the scheduler to recompute its waiting time.
+        with self._sched_cond:
+            self._sched_cond.notify() # NOTE: es notify_one en C++
+
     def _sched_add(self, beats, task):
         # TempoClock::Add
+        if self.rational:
+            beats = _rational(beats)
         if _libsc3.main.mode == _libsc3.main.RT:
-            if self._task_queue.empty():
-                prev_beat = -1e10
-            else:
-                prev_beat = self._task_queue.peek()[0]
-            self._task_queue.add(beats, task)
             if isinstance(task, stm.TimeThread):
                 task.next_beat = beats
-            if self._task_queue.peek()[0] != prev_beat:
-                self._sched_cond.notify()
+            # Lock free, the scheduler thread moves it to the queue and
+            # only needs to be notified if it's earlier than what it waits.
+            self._inbox.put((beats, task))
+            if beats < self._head:
+                self._sched_notify()
         else:
             if isinstance(task, stm.TimeThread):
                 task.next_beat = beats
-            ClockTask(beats, self, task, _libsc3.main._clock_scheduler)
+            _libsc3.main._clock_scheduler.add(
+                self.beats2secs(beats), self, task, beats)
 
     def sched(self, delta, item):
         # _TempoClock_Sched
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         if not hasattr(item, '__awake__'):
             item = fn.Function(item)
-        with self._sched_cond:
-            if _libsc3.main.current_tt.clock is self:
-                beats = _libsc3.main.current_tt.beats
-            else:
-                seconds = _libsc3.main.current_tt.seconds
-                beats = self.secs2beats(seconds)
-            beats += delta
-            if beats == _math.inf:
-                return
-            self._sched_add(beats, item)
+        if _libsc3.main.current_tt.clock is self:
+            beats = _libsc3.main.current_tt.beats
+        else:
+            seconds = _libsc3.main.current_tt.seconds
+            beats = self.secs2beats(seconds)
+        beats += delta
+        if beats == _math.inf:
+            return
+        self._sched_add(beats, item)
 
     def sched_abs(self, beat, item):
         # _TempoClock_SchedAbs
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
         if not hasattr(item, '__awake__'):
             item = fn.Function(item)
         if beat == _math.inf:
             return
-        with self._sched_cond:
-            self._sched_add(beat, item)
+        self._sched_add(beat, item)
 
     def clear(self, release_nodes=True):
         # // flag tells EventStreamPlayers that CmdPeriod
         # // is removing them, so nodes are already freed
         # clear -> prClear -> _TempoClock_Clear -> TempoClock::Clear
-        if self._thread.is_alive() and self._run_sched:
+        if self.running() and self._run_sched:
             item = None
+            if self._thread is None:  # nrt
+                for item in _libsc3.main._clock_scheduler.clear(self):
+                    if isinstance(item, (stm.EventStreamPlayer, stm.PauseStream)):
+                        item.removed_from_scheduler(release_nodes)
+                return
             with self._sched_cond:
+                self._drain_inbox()
+                while self._batch:
+                    item = self._batch.pop()
+                    if isinstance(item, (stm.EventStreamPlayer, stm.PauseStream)):
+                        item.removed_from_scheduler(release_nodes)
                 while not self._task_queue.empty():
-                    item = self._task_queue.get()[1] # de por sí PriorityQueue es thread safe, la implementación de SuperCollider es distinta, ver SystemClock*clear.
+                    item = self._task_queue.pop()[1]
                     if isinstance(item, (stm.EventStreamPlayer, stm.PauseStream)):
                         item.removed_from_scheduler(release_nodes)
                 self._sched_cond.notify() # NOTE: es notify_one en C++
@@ -1071,20 +1300,22 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
 
     def beats2secs(self, beats):
         # _TempoClock_BeatsToSecs
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
-        return (beats - self._base_beats) * self._beat_dur + self._base_seconds
+        _, beat_dur, base_seconds, base_beats = self._timebase
+        return (beats - base_beats) * beat_dur + base_seconds
 
     def secs2beats(self, seconds):
         # _TempoClock_SecsToBeats
-        if not self._thread.is_alive():
+        if not self.running():
             raise RuntimeError(f'{self} is not running')
-        return (seconds - self._base_seconds) * self._tempo + self._base_beats
+        tempo, _, base_seconds, base_beats = self._timebase
+        return (seconds - base_seconds) * tempo + base_beats
 
     def dump(self):
         # _(pr)TempoClock_Dump -> TepmoClock::Dump
         # BUG: Pero no usa este método sclang, usa dump de Object (_ObjectDump)
-        if self._thread.is_alive():
+        if self.running():
             msg = self.__repr__()
             msg += (f'\n    tempo: {self.tempo}'
                     f'\n    beats: {self.beats}'
@@ -1134,9 +1365,208 @@ class TempoClock(Clock, metaclass=MetaTempoClock):
         return self.beats - self.bars2beats(self.bar())
 
     def running(self):
+        if self._thread is None:  # nrt
+            return self._run_sched
         return self._thread.is_alive()
 
 
+# Logical beat of the running coroutine, (clock, beats), see AsyncioClock.wait.
+_async_beats = _contextvars.ContextVar('_async_beats', default=None)
+
+
+class _AsyncWaiter():
+    __slots__ = ('future',)
+
+    def __init__(self, future):
+        self.future = future
+
+    def __awake__(self, beats, seconds, clock):
+        if not self.future.done():
+            self.future.set_result(beats)
+
+
+class AsyncioClock(TempoClock):
+    '''
+    TempoClock whose scheduler runs on an asyncio event loop.
+
+    Tasks are awaken from loop callbacks set with ``loop.call_at`` instead
+    of a dedicated thread waiting on a condition, there is no locking between
+    the clock and the code running in the loop. Scheduled objects keep the
+    ``__awake__`` protocol and coroutines can use ``await clock.wait(beats)``.
+
+    Methods should be called from the loop's thread, ``sched``, ``sched_abs``,
+    ``stop``, ``clear`` and tempo changes are also safe to call from other
+    threads. If loop is None the clock must be created from a running loop.
+    '''
+
+    def __init__(self, tempo=None, beats=None, seconds=None, loop=None):
+        if loop is None:
+            try:
+                loop = _asyncio.get_running_loop()
+            except RuntimeError:
+                raise RuntimeError(
+                    'AsyncioClock needs a running loop or '
+                    'the loop parameter') from None
+        self._loop = loop
+        super().__init__(tempo, beats, seconds)
+
+    def _sched_start(self):
+        self._task_queue = TaskQueue()
+        self._batch = []
+        self._handle = None
+        self._waking = False
+        self._run_sched = True
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def _in_loop(self):
+        try:
+            return _asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _call_in_loop(self, func, *args):
+        if self._in_loop():
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _sched_notify(self):
+        # Re-arms the loop callback for the earliest task,
+        # loop.call_at is not thread safe.
+        if not self._in_loop():
+            self._loop.call_soon_threadsafe(self._sched_notify)
+            return
+        if self._waking:
+            return
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._run_sched and not self._task_queue.empty():
+            secs = self.beats2secs(self._task_queue.peek()[0])
+            when = self._loop.time() + secs - _libsc3.main.elapsed_time()
+            self._handle = self._loop.call_at(when, self._wakeup)
+
+    def _wakeup(self):
+        self._handle = None
+        self._waking = True
+        try:
+            elapsed_beats = self.elapsed_beats()
+            while not self._task_queue.empty()\
+            and elapsed_beats >= self._task_queue.peek()[0]:
+                self._task_queue.add_batch(
+                    self._awake_batch(*self._task_queue.pop_batch()))
+        finally:
+            self._waking = False
+        self._sched_notify()
+
+    def _sched_add(self, beats, task):
+        if self.rational:
+            beats = _rational(beats)
+        if self._task_queue.empty():
+            prev_beat = None
+        else:
+            prev_beat = self._task_queue.peek()[0]
+        self._task_queue.add(beats, task)
+        if isinstance(task, stm.TimeThread):
+            task.next_beat = beats
+        if self._task_queue.peek()[0] != prev_beat:
+            self._sched_notify()
+
+    def sched(self, delta, item):
+        if not self.running():
+            raise RuntimeError(f'{self} is not running')
+        if not hasattr(item, '__awake__'):
+            item = fn.Function(item)
+        if _libsc3.main.current_tt.clock is self:
+            beats = _libsc3.main.current_tt.beats
+        else:
+            beats = self.secs2beats(_libsc3.main.current_tt.seconds)
+        beats += delta
+        if beats == _math.inf:
+            return
+        self._call_in_loop(self._sched_add, beats, item)
+
+    def sched_abs(self, beat, item):
+        if not self.running():
+            raise RuntimeError(f'{self} is not running')
+        if not hasattr(item, '__awake__'):
+            item = fn.Function(item)
+        if beat == _math.inf:
+            return
+        self._call_in_loop(self._sched_add, beat, item)
+
+    async def wait(self, delta):
+        '''
+        Suspend the calling coroutine for delta beats of logical time.
+
+        Logical time is kept per asyncio task so consecutive waits don't
+        accumulate the wakeup latency. Returns the logical beat reached.
+        '''
+        if not self.running():
+            raise RuntimeError(f'{self} is not running')
+        current = _async_beats.get()
+        if current is not None and current[0] is self:
+            beats = current[1] + delta
+        else:
+            beats = self.beats + delta
+        waiter = _AsyncWaiter(self._loop.create_future())
+        self._sched_add(beats, waiter)
+        try:
+            await waiter.future
+        except _asyncio.CancelledError:
+            try:
+                self._task_queue.remove(waiter)
+            except KeyError:
+                pass
+            raise
+        _async_beats.set((self, beats))
+        _libsc3.main.update_logical_time(self.beats2secs(beats))
+        return beats
+
+    def stop(self):
+        if not self.running():
+            raise RuntimeError(f'{self} is not running')
+
+        def stop_func():
+            if not self._run_sched:
+                return
+            self._run_sched = False
+            type(self)._all.remove(self)
+            if self._handle is not None:
+                self._handle.cancel()
+                self._handle = None
+
+        self._call_in_loop(stop_func)
+
+    def __del__(self):
+        if getattr(self, '_run_sched', False) and not self._loop.is_closed():
+            self.stop()
+
+    def clear(self, release_nodes=True):
+        # Called from the CmdPeriod thread too.
+        def clear_func():
+            if not self.running():
+                return
+            while self._batch:
+                item = self._batch.pop()
+                if isinstance(item, (stm.EventStreamPlayer, stm.PauseStream)):
+                    item.removed_from_scheduler(release_nodes)
+            while not self._task_queue.empty():
+                item = self._task_queue.pop()[1]
+                if isinstance(item, (stm.EventStreamPlayer, stm.PauseStream)):
+                    item.removed_from_scheduler(release_nodes)
+            self._sched_notify()
+
+        if self.running():
+            self._call_in_loop(clear_func)
+
+    def running(self):
+        return self._run_sched
+
+
 def defer(item, delta=None):
     if callable(item):
         def df():
@@ -0,0 +1,268 @@
+"""Tempo and beat phase synchronization of TempoClocks over UDP."""
+
+import collections as _collections
+import logging as _logging
+import math as _math
+import random as _random
+import socket as _socket
+import threading as _threading
+
+from ..base import main as _libsc3
+from ..base import model as mdl
+from ..base import _osclib as oli
+from . import clock as clk
+
+
+_logger = _logging.getLogger(__name__)
+
+_DOUBLE = oli.OscMessageBuilder.ARG_TYPE_DOUBLE
+_INT = oli.OscMessageBuilder.ARG_TYPE_INT
+
+
+def _build_msg(address, *args):
+    builder = oli.OscMessageBuilder(address)
+    for value, arg_type in args:
+        builder.add_arg(value, arg_type)
+    return builder.build().dgram
+
+
+class _Peer():
+    __slots__ = ('addr', 'samples', 'offset', 'last_seen')
+
+    def __init__(self, addr, window):
+        self.addr = addr
+        self.samples = _collections.deque(maxlen=window)  # (rtt, offset)
+        self.offset = None  # Peer's time minus local time.
+        self.last_seen = 0.0
+
+
+class ClockSync():
+    '''
+    Share tempo and beat phase of a TempoClock with other processes.
+
+    Peers bind one port of port_range ports from port and send their
+    timeline (tempo and the beats at a time) to every port of the range
+    in hosts, so several processes on the same host find each other.
+    Clock offsets between peers are estimated from ping round trips,
+    the offset of the sample with the shortest round trip in the last
+    window samples is used.
+
+    The timeline with the highest version wins, a version is created
+    each time the tempo of the clock is changed. The local clock follows
+    the timeline through its tempo (slew) for small phase errors and
+    its beats (jump) for errors larger than max_slew seconds. If quantum
+    is not None only the beat phase within quantum is aligned.
+    '''
+
+    def __init__(self, clock=None, port=57300, port_range=8,
+                 hosts=('127.0.0.1',), interval=0.1, quantum=None,
+                 max_slew=0.05, window=16):
+        if _libsc3.main.mode != _libsc3.main.RT:
+            raise RuntimeError('ClockSync only works in rt mode')
+        self._clock = clock or clk.TempoClock.default
+        self._port = port
+        self._port_range = port_range
+        self._hosts = tuple(hosts)
+        self.interval = interval
+        self.quantum = quantum
+        self.max_slew = max_slew
+        self._window = window
+        self._id = _random.getrandbits(31)
+        self._peers = dict()
+        self._sock = None
+        self._thread = None
+        self._running = False
+        self._adjusting = False
+        self._lock = _threading.Lock()
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def peers(self):
+        '''Number of peers with a known clock offset.'''
+        with self._lock:
+            return sum(p.offset is not None for p in self._peers.values())
+
+    @property
+    def tempo(self):
+        return self._tempo
+
+    @tempo.setter
+    def tempo(self, value):
+        # Changing the clock's tempo creates the new timeline.
+        self._clock.tempo = value
+
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._running:
+            return
+        self._sock = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM)
+        for i in range(self._port_range):
+            try:
+                self._sock.bind(('', self._port + i))
+                break
+            except OSError:
+                if i == self._port_range - 1:
+                    self._sock.close()
+                    raise
+        self._port = self._sock.getsockname()[1]
+        self._base_port = self._port - i
+        now = _libsc3.main.elapsed_time()
+        self._tempo = self._clock.tempo
+        self._tl_beats = self._clock.secs2beats(now)
+        self._tl_time = now
+        self._version = 0  # Adopts any timeline until the first version.
+        self._owner = self._id
+        self._grace_time = now + self.interval * 4
+        mdl.NotificationCenter.register(
+            self._clock, 'tempo', self, self._tempo_changed)
+        self._running = True
+        self._thread = _threading.Thread(
+            target=self._run,
+            name=f'{type(self).__name__} port {self._port}',
+            daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join()
+        self._sock.close()
+        mdl.NotificationCenter.unregister(self._clock, 'tempo', self)
+
+    def _targets(self):
+        for host in self._hosts:
+            for port in range(self._base_port,
+                              self._base_port + self._port_range):
+                if port != self._port or host not in ('127.0.0.1', 'localhost'):
+                    yield (host, port)
+
+    def _run(self):
+        next_tick = _libsc3.main.elapsed_time()
+        while self._running:
+            now = _libsc3.main.elapsed_time()
+            if now >= next_tick:
+                try:
+                    self._tick(now)
+                except Exception:
+                    _logger.exception('ClockSync tick failed')
+                next_tick += self.interval
+                if next_tick < now:
+                    next_tick = now + self.interval
+                continue
+            self._sock.settimeout(next_tick - now)
+            try:
+                data, addr = self._sock.recvfrom(1024)
+            except _socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self._recv(oli.OscMessage(data), addr)
+            except Exception:
+                _logger.exception('ClockSync message failed')
+
+    def _send(self, dgram, addr):
+        try:
+            self._sock.sendto(dgram, addr)
+        except OSError:
+            pass  # Nobody there or network down, keep trying.
+
+    def _tick(self, now):
+        with self._lock:
+            for peer_id, peer in list(self._peers.items()):
+                if now - peer.last_seen > self.interval * 20:
+                    del self._peers[peer_id]
+            if self._version == 0 and now >= self._grace_time:
+                self._version = 1  # Alone, start a session.
+            beats = self._tl_beats + (now - self._tl_time) * self._tempo
+            dgram = _build_msg(
+                '/clocksync/ping', (self._id, _INT), (now, _DOUBLE),
+                (self._version, _INT), (self._owner, _INT),
+                (self._tempo, _DOUBLE), (beats, _DOUBLE))
+        for addr in self._targets():
+            self._send(dgram, addr)
+        self._correct(now)
+
+    def _recv(self, msg, addr):
+        params = msg.params
+        peer_id = params[0]
+        if peer_id == self._id:
+            return
+        now = _libsc3.main.elapsed_time()
+        with self._lock:
+            peer = self._peers.get(peer_id)
+            if peer is None:
+                peer = self._peers[peer_id] = _Peer(addr, self._window)
+            peer.last_seen = now
+            if msg.address == '/clocksync/ping':
+                _, t0, version, owner, tempo, beats = params
+                self._send(_build_msg(
+                    '/clocksync/pong', (self._id, _INT),
+                    (t0, _DOUBLE), (now, _DOUBLE)), addr)
+                if peer.offset is not None:
+                    self._merge(version, owner, tempo, beats, t0 - peer.offset)
+            elif msg.address == '/clocksync/pong':
+                _, t0, t1 = params
+                rtt = now - t0
+                peer.samples.append((rtt, t1 - (t0 + now) * 0.5))
+                peer.offset = min(peer.samples)[1]
+
+    def _merge(self, version, owner, tempo, beats, time):
+        # Call with lock, time is local.
+        if (version, owner) > (self._version, self._owner):
+            self._version = version
+            self._owner = owner
+            self._tempo = tempo
+            self._tl_beats = beats
+            self._tl_time = time
+
+    def _tempo_changed(self):
+        if self._adjusting:
+            return
+        now = _libsc3.main.elapsed_time()
+        with self._lock:
+            self._version += 1
+            self._owner = self._id
+            self._tempo = self._clock.tempo
+            self._tl_beats = self._clock.secs2beats(now)
+            self._tl_time = now
+
+    def _correct(self, now):
+        clock = self._clock
+        if not clock.running():
+            self._running = False
+            return
+        with self._lock:
+            tempo = self._tempo
+            error = self._tl_beats + (now - self._tl_time) * tempo\
+                    - clock.secs2beats(now)
+        if self.quantum:
+            error = (error + self.quantum * 0.5) % self.quantum\
+                    - self.quantum * 0.5
+        self._adjusting = True
+        try:
+            if abs(error) / tempo > self.max_slew:
+                clock.beats = clock.secs2beats(
+                    _libsc3.main.elapsed_time()) + error
+                clock.tempo = tempo
+            else:
+                # Corrects the error in about one second, limited to 5%.
+                slew = max(-0.05, min(0.05, error / tempo))
+                new_tempo = tempo * (1 + slew)
+                if not _math.isclose(clock.tempo, new_tempo, rel_tol=1e-9):
+                    clock.tempo = new_tempo
+        finally:
+            self._adjusting = False
+
+    def __repr__(self):
+        return f'{type(self).__name__}(port {self._port})'
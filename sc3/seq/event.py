@@ -2,8 +2,13 @@
 Event.sc simplification attemp. No multichannel expasion.
 '''
 
+import collections.abc as _abc
+import struct as _struct
+import sys as _sys
+
 from ..base import main as _libsc3
 from ..base import builtins as bi
+from ..base import _osclib as oli
 from ..synth import node as nod
 from ..synth import _graphparam as gpp
 from ..synth import synthdesc as sdc
@@ -17,6 +22,140 @@ class _EmptyKey():
     pass
 
 
+### Event Records ###
+
+
+class EventSchema():
+    '''
+    Interned keys of the events produced by a pattern, each key is the
+    index of a slot in the records that share the schema.
+    '''
+
+    __slots__ = ('keys', 'index')
+
+    def __init__(self, keys):
+        keys = (_sys.intern(k) if type(k) is str else k for k in keys)
+        self.keys = tuple(dict.fromkeys(keys))
+        self.index = {k: i for i, k in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.keys})'
+
+
+class EventRecord(_abc.MutableMapping):
+    '''
+    Compact event, the keys of the schema are stored in a list of slots
+    and other keys in a dictionary created on demand. Missing keys are
+    looked up in parent, which is never modified (like ChainMap), so
+    creating a record doesn't copy the parent event.
+    '''
+
+    __slots__ = ('_schema', '_values', '_extra', '_parent', '_depth')
+
+    _MAX_DEPTH = 8  # Deeper parent chains are flattened.
+
+    def __init__(self, schema, parent=None):
+        self._schema = schema
+        self._values = [_EmptyKey] * len(schema)
+        self._extra = None
+        if type(parent) is EventRecord:
+            if parent._depth >= self._MAX_DEPTH:
+                parent = dict(parent)
+                self._depth = 1
+            else:
+                self._depth = parent._depth + 1
+        else:
+            self._depth = 1
+        self._parent = parent
+
+    @property
+    def schema(self):
+        return self._schema
+
+    @property
+    def parent(self):
+        return self._parent
+
+    def __getitem__(self, key):
+        i = self._schema.index.get(key)
+        if i is not None:
+            value = self._values[i]
+            if value is not _EmptyKey:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if self._parent is None:
+            raise KeyError(key)
+        return self._parent[key]
+
+    def __setitem__(self, key, value):
+        i = self._schema.index.get(key)
+        if i is not None:
+            self._values[i] = value
+        else:
+            if self._extra is None:
+                self._extra = dict()
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        # Only keys of the record, as in ChainMap.
+        i = self._schema.index.get(key)
+        if i is not None:
+            if self._values[i] is _EmptyKey:
+                raise KeyError(key)
+            self._values[i] = _EmptyKey
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        i = self._schema.index.get(key)
+        if i is not None:
+            if self._values[i] is not _EmptyKey:
+                return True
+        elif self._extra is not None and key in self._extra:
+            return True
+        return self._parent is not None and key in self._parent
+
+    def _own_keys(self):
+        for key, value in zip(self._schema.keys, self._values):
+            if value is not _EmptyKey:
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __iter__(self):
+        seen = set()
+        for key in self._own_keys():
+            seen.add(key)
+            yield key
+        if self._parent is not None:
+            for key in self._parent:
+                if key not in seen:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        obj = EventRecord.__new__(EventRecord)
+        obj._schema = self._schema
+        obj._values = self._values[:]
+        obj._extra = None if self._extra is None else self._extra.copy()
+        obj._parent = self._parent
+        obj._depth = self._depth
+        return obj
+
+    __copy__ = copy
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)})'
+
+
 ### Event Keys ###
 
 
@@ -28,12 +167,28 @@ class EventKeys():
         self.__init__(dict)
 
 
+def _pitch_key(name):
+    # Writing a pitch key clears the resolved freq and midinote.
+    attr = '_' + name
+
+    def fget(self):
+        return getattr(self, attr)
+
+    def fset(self, value):
+        setattr(self, attr, value)
+        self._resolved_freq = None
+        self._resolved_midinote = None
+
+    return property(fget, fset)
+
+
 class PitchKeys(EventKeys):
     name = 'pitch'
 
-    __slots__ = ('_freq', '_midinote', '_degree', 'mtranspose', 'gtranspose',
-                 'ctranspose', 'octave', 'root', 'scale', 'detune', 'harmonic',
-                 '_set_key')
+    __slots__ = ('_freq', '_midinote', '_degree', '_mtranspose', '_gtranspose',
+                 '_ctranspose', '_octave', '_root', '_scale', '_detune',
+                 '_harmonic', '_set_key', '_resolved_freq', '_resolved_midinote',
+                 '_resolved_scale')
 
     _special_keys = ('degree', 'midinote', 'freq')  # special keys, other keys in _keys.
 
@@ -42,18 +197,40 @@ class PitchKeys(EventKeys):
              ('root', 0.0), ('scale', scl.Scale([0, 2, 4, 5, 7, 9, 11])),  # BUG: Scale tiene que ser inmutable como tuple.
              ('detune', 0.0), ('harmonic', 1.0)]
 
+    mtranspose = _pitch_key('mtranspose')
+    gtranspose = _pitch_key('gtranspose')
+    ctranspose = _pitch_key('ctranspose')
+    octave = _pitch_key('octave')
+    root = _pitch_key('root')
+    scale = _pitch_key('scale')
+    detune = _pitch_key('detune')
+    harmonic = _pitch_key('harmonic')
+
     def __init__(self, dict):
+        self._resolved_freq = None
+        self._resolved_midinote = None
+        self._resolved_scale = None
         for key in self._special_keys:
             value = dict.pop(key, _EmptyKey)
             if value is not _EmptyKey:
                 setattr(self, key, value)
-                self._set_key = key
                 break
         if value is _EmptyKey or value is None:
             raise ValueError('no valid pitch key given')
         for key, value in self._keys:
             value = dict.pop(key, value)
-            setattr(self, key, value)
+            setattr(self, '_' + key, value)
+
+    def _resolved(self):
+        # freq and midinote are resolved once until a key is written
+        # or, from degree, until the scale changes in place.
+        if self._set_key == 'degree' and self._resolved_scale is not None:
+            scale, version = self._resolved_scale
+            if scale is not self._scale or version != scale.version:
+                self._resolved_scale = None
+                self._resolved_freq = None
+                self._resolved_midinote = None
+        return self._resolved_freq, self._resolved_midinote
 
     @property
     def freq(self):
@@ -62,34 +239,47 @@ class PitchKeys(EventKeys):
             # transformaciones. Pero 'harmonic' podría funcionar (no lo hace
             # en sclang). Aunque si lo hace el valor de set != get.
             return self._freq  # * self.harmonic
-        elif self._set_key == 'midinote':
-            midinote = self._midinote  # midinote -> freq
-        else:  # self._set_key == 'degree'
-            midinote = self.midinote  # degree -> note -> midinote -> freq
-        return bi.midicps(midinote + self.ctranspose) * self.harmonic
+        ret = self._resolved()[0]
+        if ret is None:
+            if self._set_key == 'midinote':
+                midinote = self._midinote  # midinote -> freq
+            else:  # self._set_key == 'degree'
+                midinote = self.midinote  # degree -> note -> midinote -> freq
+            ret = bi.midicps(midinote + self._ctranspose) * self._harmonic
+            self._resolved_freq = ret
+        return ret
 
     @freq.setter
     def freq(self, value):
         self._freq = value
         self._set_key = 'freq'
+        self._resolved_freq = None
+        self._resolved_midinote = None
 
     @property
     def midinote(self):
         if self._set_key == 'midinote':
             return self._midinote
-        elif self._set_key == 'degree':
-            ret = self.scale.degree_to_key(self._degree + self.mtranspose)  # degree -> note -> midinote
-            ret = ret + self.gtranspose + self.root
-            ret = ret / self.scale.spo() + self.octave - 5.0
-            ret = ret * (12.0 * bi.log2(self.scale.octave_ratio)) + 60
-            return ret
-        else:  # self._set_key == 'freq'
-            return bi.cpsmidi(self._freq)  # no existe en sclang
+        ret = self._resolved()[1]
+        if ret is None:
+            if self._set_key == 'degree':
+                # degree -> note -> midinote
+                scale = self._scale
+                ret = scale.degree_to_midinote(
+                    self._degree + self._mtranspose, self._octave,
+                    self._gtranspose + self._root)
+                self._resolved_scale = (scale, scale.version)
+            else:  # self._set_key == 'freq'
+                ret = bi.cpsmidi(self._freq)  # no existe en sclang
+            self._resolved_midinote = ret
+        return ret
 
     @midinote.setter
     def midinote(self, value):
         self._midinote = value
         self._set_key = 'midinote'
+        self._resolved_freq = None
+        self._resolved_midinote = None
 
     @property
     def degree(self):
@@ -107,6 +297,8 @@ class PitchKeys(EventKeys):
     def degree(self, value):
         self._degree = value
         self._set_key = 'degree'
+        self._resolved_freq = None
+        self._resolved_midinote = None
 
     @property
     def detuned_freq(self):
@@ -175,7 +367,8 @@ class ServerKeys(EventKeys):
 
     __slots__ = ('server', 'latency', 'synth_lib', '_group', 'out',
                  'add_action', 'msg_params', 'instrument', 'variant',
-                 'has_gate', '_send_gate', 'args', 'lag', 'timing_offset')
+                 'has_gate', '_send_gate', 'args', 'lag', 'timing_offset',
+                 'index_controls')
 
     _special_keys = ('group', 'send_gate')  # *** TODO
 
@@ -183,7 +376,8 @@ class ServerKeys(EventKeys):
              ('out', 0), ('add_action', 'addToHead'), ('msg_params', None),
              ('instrument', 'default'), ('variant', None), ('has_gate', True),  # // assume SynthDef has gate
              ('args', ('freq', 'amp', 'pan', 'trig')), # // for \type \set
-             ('lag', 0), ('timing_offset', 0)]
+             ('lag', 0), ('timing_offset', 0),
+             ('index_controls', False)]  # Send control indexes if SynthDesc is known.
 
     def __init__(self, dict):
         self._group = dict.pop('group', _EmptyKey)  # NOTE: simplificar redundacia preparando super().__init__ para atributos internos.
@@ -252,6 +446,28 @@ class ServerKeys(EventKeys):
         else:
             return self.msg_params
 
+    def _get_encoder(self, event_type):
+        # Returns None if msg_params was given or there is no usable
+        # SynthDesc for the instrument, then _get_msg_params is used.
+        if self.msg_params is not None:
+            return None
+        if self.synth_lib is None:
+            synth_lib = sdc.SynthDescLib.default
+        else:
+            synth_lib = self.synth_lib
+        desc = synth_lib.synth_descs.get(self.instrument)
+        if desc is None or desc.msg_controls is None:
+            return None
+        self.has_gate = desc.has_gate
+        index_controls = bool(self.index_controls)
+        key = (type(event_type), _dynamic_keys(event_type), index_controls)
+        try:
+            return desc._encoders[key]
+        except KeyError:
+            encoder = desc._encoders[key] = _SNewEncoder(
+                desc, event_type, index_controls)
+            return encoder
+
     def _default_msg_params(self, event_type):  # Was default_msg_func. # NOTE: event_type es un objeto, se confunde.
         # No tiene setter, de ser cambiable tiene que ser a nivel global.
         return ['freq', event_type.pitch.freq, 'amp', event_type.amplitude.amp,
@@ -286,6 +502,99 @@ class CustomKeys(EventKeys):
             setattr(self, key, dict.pop(key))
 
 
+### Event Encoders ###
+
+
+def _dynamic_keys(event_type):
+    # Keys of the EventKeys objects that are not fixed by __slots__.
+    ret = []
+    for keys_class in type(event_type).event_keys:
+        keys_obj = getattr(event_type, keys_class.name)
+        if hasattr(keys_obj, '__dict__'):
+            ret.append(frozenset(vars(keys_obj)))
+    return tuple(ret)
+
+
+class _SNewEncoder():
+    '''
+    /s_new message of a SynthDesc for the events of one type and key set.
+    The keys of the controls are resolved once and read by compiled
+    functions in control order. In rt mode the message datagram is
+    packed directly, values that are not numbers use the generic path.
+    If index_controls is True controls are sent by index.
+    '''
+
+    _HEAD = oli.write_string('/s_new')
+
+    def __init__(self, desc, event_type, index_controls=False):
+        names = []
+        getters = []
+        for name, key in desc.msg_controls:
+            for keys_class in type(event_type).event_keys:
+                keys_obj = getattr(event_type, keys_class.name)
+                if hasattr(keys_obj, key):
+                    if key.isidentifier():
+                        getters.append(f'event.{keys_class.name}.{key}')
+                    else:
+                        getters.append(
+                            f'getattr(event.{keys_class.name}, {key!r})')
+                    if index_controls:
+                        name = desc.control_index(name)
+                    names.append(name)
+                    break
+        self.names = tuple(names)
+        gate = desc.control_index('gate') if index_controls else None
+        self.gate = 'gate' if gate is None else gate
+        type_tag = ',siii'
+        fmt = '>iii'
+        pack_args = []
+        params = []
+        for name, getter in zip(names, getters):
+            if index_controls:
+                type_tag += 'if'
+                fmt += 'if'
+                pack_args.extend((repr(name), getter))
+            else:
+                name_dgram = oli.write_string(name)
+                type_tag += 'sf'
+                fmt += f'{len(name_dgram)}sf'
+                pack_args.extend((repr(name_dgram), getter))
+            params.extend((repr(name), getter))
+        self._type_tag = oli.write_string(type_tag)
+        code = (
+            'def params(event):\n'
+            f'    return [{", ".join(params)}]\n'
+            'def pack(event, node_id, add_action, target):\n'
+            f'    return _pack(node_id, add_action, target, '
+            f'{", ".join(pack_args)})\n')
+        namespace = {'_pack': _struct.Struct(fmt).pack}
+        exec(code, namespace)
+        self._params = namespace['params']
+        self._pack = namespace['pack']
+        self._name_dgrams = dict()
+
+    def encode(self, event, name, node_id, add_action, target):
+        '''
+        Return the /s_new message for event, as datagram in rt mode if
+        all values are numbers, otherwise as a message list.
+        '''
+        if _libsc3.main.mode == _libsc3.main.RT\
+        and type(name) is str and type(target) is int:
+            try:
+                name_dgram = self._name_dgrams[name]
+            except KeyError:
+                name_dgram = self._name_dgrams[name] = oli.write_string(name)
+            try:
+                values = self._pack(event, node_id, add_action, target)
+            except _struct.error:
+                pass
+            else:
+                return self._HEAD + self._type_tag + name_dgram + values
+        msg = ['/s_new', name, node_id, add_action, target]
+        msg.extend(self._params(event))
+        return gpp.node_param(msg)._as_osc_arg_list()
+
+
 ### Event Types ###
 
 # PartialEvent es EventKeys.
@@ -307,7 +616,7 @@ class EventType():  # ABC
 
     def __init__(self, dict, parent=None):
         if parent is None:
-            dict = dict.copy()
+            dict = {**dict}  # Also flattens EventRecord.
         else:
             dict = {**parent, **dict}
         for keys_class in type(self).event_keys:
@@ -333,22 +642,31 @@ class NoteType(EventType):
 
         self.pitch.freq = self.pitch.detuned_freq
 
-        param_list = self.server._get_msg_params(self)  # Populates synth_desc.
+        encoder = self.server._get_encoder(self)
+        if encoder is None:
+            param_list = self.server._get_msg_params(self)  # Populates synth_desc.
         instrument_name = self.server._synthdef_name()
         id = self.server.server.next_node_id()  # NOTE: debería quedar guardado.
         add_action = nod.Node.action_number_for(self.server.add_action)
         group = gpp.node_param(self.server.group)._as_control_input() # *** NOTE: y así la llave 'group' que por defecto es una funcion que retorna node_id no tendría tanto sentido? VER PERORATA ABAJO EN GRAIN
 
-        bndl = ['/s_new', instrument_name, id, add_action, group]
-        bndl.extend(param_list)
-        bndl = gpp.node_param(bndl)._as_osc_arg_list()
+        if encoder is None:
+            bndl = ['/s_new', instrument_name, id, add_action, group]
+            bndl.extend(param_list)
+            bndl = gpp.node_param(bndl)._as_osc_arg_list()
+        else:
+            bndl = encoder.encode(self, instrument_name, id, add_action, group)
 
         # *** BUG: socket.sendto and/or threading mixin use too much cpu.
-        self.server.server.send_bundle(self.server.server.latency, bndl)
+        server = self.server.server
+        latency = _event_latency(server, self.server.timing_offset)
+        server.send_bundle(latency, bndl)
         if self.server.send_gate:
-            self.server.server.send_bundle(
-                self.server.server.latency + self.duration.sustain,
-                ['/n_set', id, 'gate', 0])
+            nod.ReleaseScheduler.for_server(server).add(
+                id,
+                _libsc3.main.current_tt.seconds + (latency or 0)
+                + self.duration.sustain,
+                'gate' if encoder is None else encoder.gate)
 
         self._done = True  # NOTE: instead of is_playing.
 
@@ -385,3 +703,68 @@ class Event():
 
     def reset(self):
         self._event = type(self).event_types[self.type](self.dict, self.parent)
+
+
+def _event_latency(server, timing_offset):
+    # // timingOffset is in beats of the clock playing the event, bundles
+    # are sent that much later instead of being scheduled on the clock.
+    latency = server.latency
+    if timing_offset:
+        thread = _libsc3.main.current_tt
+        beats = thread.beats
+        latency = (latency or 0) + thread.clock.beats2secs(
+            beats + timing_offset) - thread.clock.beats2secs(beats)
+    return latency
+
+
+def _sync_with_quant(event, quant):
+    # Event.syncWithQuant, the timing offset of quant is set in a copy of
+    # event, otherwise the one of event (if any) is set in quant, which
+    # starts the player that many beats earlier on the grid.
+    if quant.timing_offset is not None:
+        event = event.copy()
+        event['timing_offset'] = quant.timing_offset
+    else:
+        quant.timing_offset = event.get('timing_offset')
+    return event
+
+
+def _event_delta(event):
+    # Logical beats to the next event, from delta or dur * stretch.
+    delta = event.get('delta')
+    if delta is None:
+        delta = event.get('dur', 1.0) * event.get('stretch', 1.0)
+    if isinstance(delta, Rest):
+        delta = delta.value
+    return delta
+
+
+def _is_rest(event):
+    return any(isinstance(value, Rest) for value in event.values())
+
+
+def _play_and_delta(event, cleanup, mute=False):
+    # Event.playAndDelta, muted events and rests are not played.
+    cleanup.update(event)
+    if not mute and not _is_rest(event):
+        Event(event).play()
+    return _event_delta(event)
+
+
+def _play_batch(events, cleanup, mute=False):
+    # Events of the same onset, the messages for each server (and timing
+    # offset) are sent in one bundle. Returns the delta of the last event.
+    for event in events:
+        cleanup.update(event)
+    if not mute:
+        servers = dict()
+        for event in events:
+            if not _is_rest(event):
+                server = event.get('server') or srv.Server.default
+                offset = event.get('timing_offset') or 0
+                servers.setdefault((server, offset), []).append(event)
+        for (server, offset), group in servers.items():
+            server.make_bundle(
+                _event_latency(server, offset),
+                lambda: [Event(event).play() for event in group])
+    return _event_delta(events[-1])
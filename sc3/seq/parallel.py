@@ -0,0 +1,121 @@
+"""Parallel nrt rendering of independent event patterns."""
+
+import concurrent.futures as _futures
+import heapq as _heapq
+import multiprocessing as _mp
+import threading as _threading
+
+from ..base import main as _libsc3
+from ..synth import server as srv
+from ..synth import node as nod
+from ..synth import score as scr
+from . import clock as clk
+from . import stream as stm
+
+
+__all__ = ['render_voices']
+
+
+_TEMP_IDS_END = 0x03FFFFFF  # Last temporary id of NodeIDAllocator.
+
+# Voices and arguments read by forked workers, see render_voices.
+_forked_job = None
+_forked_lock = _threading.Lock()
+
+
+def _render_voice(pattern, proto_event, tempo, quant, start, until,
+                  seed, index, count):
+    # Runs in a worker process, the voice is played alone in nrt mode
+    # from a clean scheduler and its sorted bundles are returned.
+    main = _libsc3.main
+    main.nrt()
+    main._clock_scheduler.clear()
+    main.nrt_score = score = scr.Score()
+    main.update_logical_time(start)
+    main.main_tt.rand_seed(seed)
+    server = srv.Server.default
+    nod.ReleaseScheduler.for_server(server).clear()
+    # Each voice allocates temporary node ids from its own range so
+    # nodes don't collide when bundles are merged.
+    allocator = server.node_allocator
+    span = (_TEMP_IDS_END - allocator._init_temp) // count
+    allocator._temp = allocator._init_temp + span * index
+    # Clocks of the parent process don't run here.
+    clock = clk.TempoClock(tempo)
+    pattern.play(clock, proto_event, quant)
+    main.run_nrt(until)
+    clock.stop()
+    score.sort()
+    return score.score
+
+
+def _render_forked(index):
+    # Forked workers have a copy of the parent's memory,
+    # only the index of the voice is pickled.
+    voices, args, seeds = _forked_job
+    return _render_voice(voices[index], *args, seeds[index], index, len(voices))
+
+
+def render_voices(voices, duration=None, proto_event=None, tempo=None,
+                  quant=None, seed=None, max_workers=None, mp_context=None):
+    '''
+    Render independent event patterns in parallel processes and return
+    a Score with their bundles merged in time order.
+
+    Each voice is played alone in nrt mode in a worker process, from the
+    current logical time in nrt mode or zero, for duration seconds or
+    until it ends, on a TempoClock at tempo or the tempo of
+    TempoClock.default. The random generator of each voice is seeded from
+    seed, or from a number drawn from the current thread, so results
+    are deterministic. Voices must not depend on each other or on the
+    state of the calling process after the workers start.
+
+    By default workers are forked, they inherit synthdefs, tempo and
+    servers and voices are not pickled (they can use lambdas). Forking
+    copies the locks held by the rt clock and osc threads, so it must
+    be called in nrt mode. With other mp_context start methods, like
+    forkserver, voices and proto_event are pickled and the workers
+    import the library again.
+    '''
+    voices = list(voices)
+    proto_event = proto_event or dict()
+    main = _libsc3.main
+    start = main.current_tt.seconds if main.mode == main.NRT else 0.0
+    until = None if duration is None else start + duration
+    tempo = tempo or clk.TempoClock.default.tempo
+    if seed is None:
+        seed = main.current_tt.rgen.getrandbits(32)
+    rgen = stm._Random(seed)
+    seeds = [rgen.getrandbits(32) for _ in voices]
+    if mp_context is None and 'fork' in _mp.get_all_start_methods():
+        mp_context = _mp.get_context('fork')
+    forked = mp_context is not None and mp_context.get_start_method() == 'fork'
+    if forked and main.mode != main.NRT:
+        raise RuntimeError(
+            'render_voices forks workers, call it in nrt mode '
+            'or use another mp_context')
+    if not voices:
+        return scr.Score()
+    global _forked_job
+    with _forked_lock:
+        if forked:
+            # Workers are forked on the first submit.
+            _forked_job = (
+                voices, (proto_event, tempo, quant, start, until), seeds)
+        try:
+            with _futures.ProcessPoolExecutor(
+                    max_workers, mp_context) as executor:
+                if forked:
+                    futures = [executor.submit(_render_forked, i)
+                               for i in range(len(voices))]
+                else:
+                    futures = [
+                        executor.submit(
+                            _render_voice, voice, proto_event, tempo, quant,
+                            start, until, seeds[i], i, len(voices))
+                        for i, voice in enumerate(voices)]
+                results = [future.result() for future in futures]
+        finally:
+            _forked_job = None
+    # Bundles at the same time keep the order of the voices.
+    return scr.Score(_heapq.merge(*results, key=lambda bundle: bundle[0]))
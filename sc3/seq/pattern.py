@@ -1,14 +1,161 @@
 """Patterns.sc"""
 
+import collections
 import logging
+import math
+import operator
+import threading
 
+from ..base import main as _libsc3
+from ..base import builtins as bi
 from ..base import functions as fn
 from . import stream as stm
+from . import event as evt
+from .rest import Rest
+
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
 
 
 _logger = logging.getLogger(__name__)
 
 
+### deterministic patterns cache ###
+
+
+# Bounds in number of values.
+_CACHE_MAX_LENGTH = 2 ** 16
+_CACHE_MAX_SIZE = 2 ** 20
+
+_cache = collections.OrderedDict()  # key: (values, array) or None.
+_cache_size = 0
+_cache_lock = threading.Lock()
+_MISSING = object()
+
+# Selectors that always give the same result for the same arguments.
+_DET_OPS = {
+    operator.neg, operator.pos, operator.abs, operator.invert,
+    operator.add, operator.sub, operator.mul, operator.truediv,
+    operator.floordiv, operator.mod, operator.pow, operator.lshift,
+    operator.rshift, operator.and_, operator.or_, operator.xor,
+    operator.lt, operator.le, operator.gt, operator.ge,
+    operator.eq, operator.ne}
+_RANDOM_OPS = {
+    bi.rand, bi.rand2, bi.linrand, bi.bilinrand, bi.sum3rand, bi.coin,
+    bi.rrand, bi.exprand, bi.gauss}
+
+
+def _value_key(obj):
+    if type(obj) is int:
+        return (int, obj)  # 1 and 1.0 are equal keys.
+    if type(obj) is float:
+        if obj != obj:
+            return None  # nan is not equal to itself.
+        return (float, math.copysign(1, obj), obj)  # 0.0 and -0.0 too.
+    if isinstance(obj, Pattern):
+        return obj._cache_key()
+    return None
+
+
+def _det_selector(selector):
+    if selector in _DET_OPS:
+        return True
+    return getattr(selector, '__module__', None) == bi.__name__\
+           and selector not in _RANDOM_OPS
+
+
+def _cache_get(key):
+    # Return the cache entry of key, None if the values are too many
+    # to be cached or _MISSING if no stream of key has ended yet.
+    with _cache_lock:
+        entry = _cache.get(key, _MISSING)
+        if entry is not _MISSING:
+            _cache.move_to_end(key)
+        return entry
+
+
+def _cache_put(key, values):
+    global _cache_size
+    if values is None:
+        entry = None
+    else:
+        array = stm._as_array(values)
+        if array is values:
+            entry = (values, None)
+        else:
+            array.flags.writeable = False
+            entry = (values, array)
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = entry
+            _cache_size += 1 if entry is None else len(entry[0]) + 1
+            while _cache_size > _CACHE_MAX_SIZE:
+                _, old = _cache.popitem(last=False)
+                _cache_size -= 1 if old is None else len(old[0]) + 1
+
+
+class _RecordStream(stm.Stream):
+    # Stream of a deterministic pattern that records its values as they
+    # are pulled, the cache entry is added when the stream ends.
+    def __init__(self, stream, key):
+        self._stream = stream
+        self._key = key
+        self._values = []
+
+    def next(self, inval=None):
+        try:
+            value = self._stream.next(inval)
+        except StopIteration:
+            if self._values is not None:
+                _cache_put(self._key, self._values)
+                self._values = None
+            raise
+        if self._values is not None:
+            # Values are kept as evaluated by next (int + float is not float).
+            self._values.append(value)
+            if len(self._values) > _CACHE_MAX_LENGTH:
+                _cache_put(self._key, None)
+                self._values = None
+        return value
+
+    def next_n(self, n, inval=None):
+        values = self._stream.next_n(n, inval)
+        if self._values is not None:
+            # Values are recorded as evaluated by next, float arrays of
+            # op streams may come from ints and are not recorded.
+            if type(self._stream) is _EmbedStream:
+                self._values.extend(self._stream._block)
+            elif isinstance(values, list):
+                self._values.extend(values)
+            elif values.dtype.kind in 'biu':
+                self._values.extend(values.tolist())
+            else:
+                self._values = None
+                return values
+            if len(values) < n:
+                _cache_put(self._key, self._values)  # Ended.
+                self._values = None
+            elif len(self._values) > _CACHE_MAX_LENGTH:
+                _cache_put(self._key, None)
+                self._values = None
+        return values
+
+    def reset(self):
+        self._stream.reset()
+        if _cache_get(self._key) is _MISSING:
+            self._values = []
+
+    def _rewind(self, n):
+        # The wrapped stream is rewound by stm._rewind.
+        if self._values is not None and n > 0:
+            del self._values[-n:]
+
+
+stm._wrapper_types.add(_RecordStream)
+
+
 class Pattern(fn.AbstractFunction):
     # // concatenate Patterns
     # ++
@@ -19,6 +166,22 @@ class Pattern(fn.AbstractFunction):
         return self.__stream__()
 
     def __stream__(self): # es asStream
+        # The values of deterministic patterns are recorded by the first
+        # stream that ends, next streams iterate the cached values.
+        key = self._cache_key()
+        if key is None:
+            return self._stream()
+        entry = _cache_get(key)
+        if entry is _MISSING:
+            return _RecordStream(self._stream(), key)
+        if entry is None:
+            return self._stream()
+        return stm._CachedStream(*entry)
+
+    def _stream(self):
+        if type(self) in _frames:
+            return _EmbedStream(self)
+
         def _(inval=None): # NOTE: Stream es el pattern iterator
             yield from self.__embed__(inval)
         _.__name__ = type(self).__name__ + '_stream_gf' # e.g. Pseq_stream_gf
@@ -29,11 +192,81 @@ class Pattern(fn.AbstractFunction):
         print('*** usa Pattern __embed__')
         yield from self.__stream__().__embed__(inval)
 
-    def play(self, clock=None, proto_event=None, quant=None):
-        return self.as_event_stream_player(proto_event).play(clock, False, quant)
-
-    def as_event_stream_player(self, proto_event=None):
-        return stm.EventStreamPlayer(self.__stream__(), proto_event)
+    def render(self, n, inval=None):
+        '''
+        Return the first n values of the pattern, see Stream.next_n.
+        Operations between patterns are evaluated by blocks.
+        '''
+        return self.__stream__().next_n(n, inval)
+
+    def to_table(self, max_events, proto_event=None):
+        '''
+        Evaluate up to max_events events of an event pattern and return
+        a dict of columns, one for each key and 'onset' with the logical
+        time of each event in beats, from delta or dur * stretch. Numeric
+        columns are float or int arrays with nan for missing values,
+        other columns are object arrays with None. Without numpy columns
+        are lists. Rest values are stored as their duration and a 'rest'
+        column is added if there are rests. Nothing is played, the stream
+        runs in a routine whose logical time advances by each delta from
+        the time of the calling thread, which is not changed.
+        '''
+        # A routine because the logical time of main_tt is physical time.
+        table = stm.Routine(
+            lambda: self._table(max_events, proto_event or dict())).next()
+        if _np is not None:
+            for key, column in table.items():
+                table[key] = _column_array(column)
+        return table
+
+    def _table(self, max_events, proto_event):
+        thread = _libsc3.main.current_tt
+        start = thread.beats
+        columns = dict()
+        onsets = []
+        rests = []
+        onset = 0.0
+        stream = self.__stream__()
+        for i in range(max_events):
+            thread.beats = start + onset
+            try:
+                event = stream.next(dict(proto_event))
+            except stm.StopStream:
+                break
+            if event is None:
+                break
+            rest = False
+            for key, value in event.items():
+                if isinstance(value, Rest):
+                    rest = True
+                    value = value.value
+                try:
+                    columns[key].append(value)
+                except KeyError:
+                    columns[key] = [None] * i + [value]
+            for column in columns.values():
+                if len(column) == i:
+                    column.append(None)
+            onsets.append(onset)
+            rests.append(rest)
+            onset += evt._event_delta(event)
+        table = {'onset': onsets}
+        table.update(columns)
+        if any(rests):
+            table['rest'] = rests
+        yield table
+
+    def _cache_key(self):
+        # Hashable description of a deterministic pattern, None if the
+        # pattern is random, infinite or depends on inval or the clock.
+        return None
+
+    def play(self, clock=None, proto_event=None, quant=None, batch=False):
+        player = self.as_event_stream_player(proto_event, batch)
+        return player.play(clock, False, quant)
+
+    def as_event_stream_player(self, proto_event=None, batch=False):
+        return stm.EventStreamPlayer(self.__stream__(), proto_event, batch)
 
     # stream_args
     # do
@@ -89,6 +322,144 @@ class Pattern(fn.AbstractFunction):
     # record
 
 
+### flattened embedding ###
+
+
+# Frame operations.
+_YIELD = 0
+_EMBED = 1
+_RETURN = 2
+
+# Pattern type (exact) to frame type (or function returning a frame or
+# None), frames implement the __embed__ algorithm without generators.
+_frames = dict()
+
+
+class _GenFrame():
+    # Any other embeddable object through its generator.
+    __slots__ = ('gen', 'started')
+
+    def __init__(self, gen):
+        self.gen = gen
+        self.started = False
+
+    def step(self, inval):
+        try:
+            if self.started:
+                return _YIELD, self.gen.send(inval)
+            self.started = True
+            return _YIELD, next(self.gen)
+        except StopIteration as e:
+            return _RETURN, e.value
+
+
+def _frame(obj, inval):
+    # Return None for objects that embed themselves as a single value.
+    frame_type = _frames.get(type(obj))
+    if frame_type is not None:
+        frame = frame_type(obj, inval)
+        if frame is not None:
+            return frame
+    if hasattr(obj, '__embed__') or hasattr(obj, '__stream__'):
+        return _GenFrame(stm.embed(obj, inval))
+    return None
+
+
+def _column_array(column):
+    # Numeric columns as float (missing values are nan) or int arrays,
+    # any other type as object array.
+    if not column:
+        return _np.array(column, float)
+    kind = bool
+    for value in column:
+        if value is None or type(value) is float\
+        or isinstance(value, _np.floating):
+            kind = float
+        elif type(value) is int or isinstance(value, _np.integer):
+            if kind is bool:
+                kind = int
+        elif type(value) is not bool and not isinstance(value, _np.bool_):
+            ret = _np.empty(len(column), object)
+            for i, value in enumerate(column):
+                ret[i] = value  # Keeps sequences as objects.
+            return ret
+    if kind is float:
+        return _np.array(
+            [_np.nan if value is None else value for value in column], float)
+    return _np.array(column, kind)
+
+
+class _EmbedStream(stm.Stream):
+    '''
+    Stream of a pattern tree evaluated with an explicit stack of frames.
+
+    Each nested Pseq, Pn, Pbind or random list pattern is a frame
+    instead of a generator that yields from the next, so the cost of a
+    value doesn't depend on how deep it is in the tree. Other patterns
+    and streams are embedded with their own generators as one frame.
+    '''
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self._stack = None
+        self._block = None
+
+    def next(self, inval=None):
+        stack = self._stack
+        if stack is None:
+            stack = self._stack = [_frame(self.pattern, inval)]
+        while stack:
+            op, value = stack[-1].step(inval)
+            if op == _YIELD:
+                return value
+            if op == _EMBED:
+                frame = _frame(value, inval)
+                if frame is None:
+                    return value  # Next inval goes to the parent frame.
+                stack.append(frame)
+            else:
+                stack.pop()
+                inval = value
+        raise stm.StopStream
+
+    def next_n(self, n, inval=None):
+        # The block is kept to be given back by _rewind.
+        lst = self._block = []
+        try:
+            for _ in range(n):
+                lst.append(self.next(inval))
+        except StopIteration:
+            pass
+        return stm._as_array(lst)
+
+    def reset(self):
+        self._stack = None
+        self._block = None
+
+    def _deterministic(self):
+        return self.pattern._cache_key() is not None
+
+    def _rewind(self, n):
+        if n > 0:
+            values = self._block[-n:]
+            del self._block[-n:]
+            values.reverse()
+            self._stack.append(_ValuesFrame(values))
+
+
+class _ValuesFrame():
+    # Values given back to an _EmbedStream, in reverse order.
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def step(self, inval):
+        if self.values:
+            return _YIELD, self.values.pop()
+        return _RETURN, inval
+
+
 ### op patterns ###
 
 
@@ -97,10 +468,16 @@ class Punop(Pattern):
         self.selector = selector
         self.a = a
 
-    def __stream__(self): # BUG: no entiendo cuándo se usan estos métodos si anulan __embed__
+    def _stream(self): # BUG: no entiendo cuándo se usan estos métodos si anulan __embed__
         print('*** convierte Punop en UnaryOpStream')
         return stm.UnaryOpStream(self.selector, stm.stream(self.a))
 
+    def _cache_key(self):
+        a = _value_key(self.a)
+        if a is None or not _det_selector(self.selector):
+            return None
+        return (Punop, self.selector, a)
+
     def __embed__(self, inval=None):
         print('*** usa Punop __embed__')
         stream = stm.stream(self.a)
@@ -118,7 +495,7 @@ class Pbinop(Pattern):
         self.a = a
         self.b = b
 
-    def __stream__(self):
+    def _stream(self):
         print('*** convierte Pbinop en BinaryOpStream')
         return stm.BinaryOpStream(
             self.selector,
@@ -126,6 +503,13 @@ class Pbinop(Pattern):
             stm.stream(self.b)
         )
 
+    def _cache_key(self):
+        a = _value_key(self.a)
+        b = _value_key(self.b)
+        if a is None or b is None or not _det_selector(self.selector):
+            return None
+        return (Pbinop, self.selector, a, b)
+
     # BUG: ver por qué no define __embed__ acá o por qué los define en los otros dos.
 
     # storeOn
@@ -137,7 +521,7 @@ class Pnarop(Pattern): # BUG: nombre cambiado
         self.a = a
         self.args = args
 
-    def __stream__(self):
+    def _stream(self):
         print('*** convierte Pnarop en NAryOpStream')
         args = [stm.stream(x) for x in self.args]
         return stm.NAryOpStream(self.selector, stm.stream(self.a), *args)
@@ -188,45 +572,79 @@ class Pbind(Pattern):
         if len(args) % 2 != 0:
             raise TypeError('Pbind should have even number of args')
         self.pattern_pairs = args
+        keys = []
+        for name in args[::2]:
+            if isinstance(name, (list, tuple)):
+                keys.extend(name)
+            else:
+                keys.append(name)
+        self._schema = evt.EventSchema(keys)
 
     def __embed__(self, in_event=None):
-        event = None
-        #saw_none = False # BUG: en sclang, no se usa.
-        stream_pairs = list(self.pattern_pairs)
-        stop = len(stream_pairs)
-
-        for i in range(1, stop, 2):
-            stream_pairs[i] = stm.stream(stream_pairs[i])
-
+        stream_pairs = self._stream_pairs()
         while True:
             if in_event is None:
                 return # NOTE: es next quién tira la excepción
-            event = in_event.copy()
-            for i in range(0, stop, 2):
-                name = stream_pairs[i]
-                stream = stream_pairs[i + 1]
-                try:
-                    stream_out = stream.next(event)
-                except stm.StopStream:
-                    return in_event # NOTE: ver.
-                if isinstance(name, (list, tuple)):
-                    if isinstance(stream_out, (list, tuple))\
-                    and len(name) > len(stream_out)\
-                    or not isinstance(stream_out, (list, tuple)):
-                        _logger.warning(
-                            'the pattern is not providing enough '
-                            f'values to assign to the key set: {name}')
-                        return in_event
-                    for i, key in enumerate(name):
-                        event[key] = stream_out[i]
-                else:
-                    event[name] = stream_out
+            event = self._next_event(stream_pairs, in_event)
+            if event is None:
+                return in_event # NOTE: ver.
             in_event = yield event
 
+    def _stream_pairs(self):
+        stream_pairs = list(self.pattern_pairs)
+        for i in range(1, len(stream_pairs), 2):
+            stream_pairs[i] = stm.stream(stream_pairs[i])
+        return stream_pairs
+
+    def _next_event(self, stream_pairs, in_event):
+        # Return None when a stream ends.
+        #saw_none = False # BUG: en sclang, no se usa.
+        # The new event only stores the keys of the pattern and reads
+        # the others from in_event, which is not copied.
+        event = evt.EventRecord(self._schema, in_event)
+        for i in range(0, len(stream_pairs), 2):
+            name = stream_pairs[i]
+            stream = stream_pairs[i + 1]
+            try:
+                stream_out = stream.next(event)
+            except stm.StopStream:
+                return None
+            if isinstance(name, (list, tuple)):
+                if isinstance(stream_out, (list, tuple))\
+                and len(name) > len(stream_out)\
+                or not isinstance(stream_out, (list, tuple)):
+                    _logger.warning(
+                        'the pattern is not providing enough '
+                        f'values to assign to the key set: {name}')
+                    return None
+                for j, key in enumerate(name):
+                    event[key] = stream_out[j]
+            else:
+                event[name] = stream_out
+        return event
 
     # storeArgs # TODO
 
 
+class _BindFrame():
+    __slots__ = ('pattern', 'stream_pairs')
+
+    def __init__(self, pattern, inval):
+        self.pattern = pattern
+        self.stream_pairs = pattern._stream_pairs()
+
+    def step(self, inval):
+        if inval is None:
+            return _RETURN, None
+        event = self.pattern._next_event(self.stream_pairs, inval)
+        if event is None:
+            return _RETURN, inval
+        return _YIELD, event
+
+
+_frames[Pbind] = _BindFrame
+
+
 class Pmono(Pattern):
     pass
 
@@ -235,15 +653,123 @@ class PmonoArtic(Pmono):
     pass
 
 
+### FilterPatterns.sc ###
+
+
+class Pn(Pattern):
+    def __init__(self, pattern, repeats=math.inf, key=None):
+        self.pattern = pattern
+        self.repeats = repeats
+        self.key = key
+
+    def __embed__(self, event=None):
+        repeats = fn.value(self.repeats, event)
+        counter = 0
+        while counter < repeats:
+            if self.key is not None:
+                event[self.key] = True
+            event = yield from stm.embed(self.pattern, event)
+            counter += 1
+        if self.key is not None:
+            event[self.key] = False
+        return event
+
+    def _cache_key(self):
+        pattern = _value_key(self.pattern)
+        if pattern is None or self.key is not None\
+        or type(self.repeats) is not int:
+            return None
+        return (Pn, pattern, self.repeats)
+
+    # storeArgs # TODO
+
+
+class _NFrame():
+    __slots__ = ('pattern', 'repeats', 'key', 'counter')
+
+    def __init__(self, pattern, inval):
+        self.pattern = pattern.pattern
+        self.repeats = fn.value(pattern.repeats, inval)
+        self.key = pattern.key
+        self.counter = 0
+
+    def step(self, inval):
+        if self.counter < self.repeats:
+            if self.key is not None:
+                inval[self.key] = True
+            self.counter += 1
+            return _EMBED, self.pattern
+        if self.key is not None:
+            inval[self.key] = False
+        return _RETURN, inval
+
+
+_frames[Pn] = _NFrame
+
+
 ### math patterns ###
 
 
 class Pseries(Pattern):
-    pass
+    def __init__(self, start=0, step=1, length=math.inf):
+        self.start = start
+        self.step = step
+        self.length = length
+
+    def __embed__(self, inval=None):
+        cur = fn.value(self.start, inval)
+        length = fn.value(self.length, inval)
+        step_stream = stm.stream(self.step)
+        counter = 0
+        while counter < length:
+            try:
+                step = step_stream.next(inval)
+            except stm.StopStream:
+                return inval
+            outval = cur
+            cur = cur + step
+            counter += 1
+            inval = yield outval
+        return inval
+
+    def _cache_key(self):
+        keys = (_value_key(self.start), _value_key(self.step))
+        if None in keys or type(self.length) is not int:
+            return None
+        return (Pseries, *keys, self.length)
+
+    # storeArgs # TODO
 
 
 class Pgeom(Pattern):
-    pass
+    def __init__(self, start=1.0, grow=1.0, length=math.inf):
+        self.start = start
+        self.grow = grow
+        self.length = length
+
+    def __embed__(self, inval=None):
+        cur = fn.value(self.start, inval)
+        length = fn.value(self.length, inval)
+        grow_stream = stm.stream(self.grow)
+        counter = 0
+        while counter < length:
+            try:
+                grow = grow_stream.next(inval)
+            except stm.StopStream:
+                return inval
+            outval = cur
+            cur = cur * grow
+            counter += 1
+            inval = yield outval
+        return inval
+
+    def _cache_key(self):
+        keys = (_value_key(self.start), _value_key(self.grow))
+        if None in keys or type(self.length) is not int:
+            return None
+        return (Pgeom, *keys, self.length)
+
+    # storeArgs # TODO
 
 
 class Pbrown(Pattern):
@@ -1,9 +1,48 @@
 """ListPatterns.sc"""
 
+import bisect
 import collections
+import heapq
+import itertools
 
+from ...base import main as _libsc3
+from ...base import functions as fn
 from .. import stream as stm
+from .. import event as evt
 from .. import pattern as ptt
+from ..rest import Rest
+
+
+# Random values are drawn from numpy by blocks of this size at most.
+_BLOCK_SIZE = 256
+
+
+def _draw(repeats, np_draw, py_draw):
+    # Yield repeats random values from the generator of the current
+    # thread, np_draw(generator, n) returns an array of n values and
+    # py_draw(rgen) is a single value for when numpy is not available.
+    # The rest of a block is dropped if the thread's generator changes
+    # or its seed or state is set or read, see _Random.
+    counter = 0
+    block = ()
+    i = 0
+    owner = epoch = None
+    while counter < repeats:
+        rgen = _libsc3.main.current_tt.rgen
+        if i == len(block) or rgen is not owner or rgen._epoch != epoch:
+            generator = rgen.np_generator
+            if generator is None:
+                yield py_draw(rgen)
+                counter += 1
+                continue
+            n = int(min(repeats - counter, _BLOCK_SIZE))
+            block = np_draw(generator, n).tolist()
+            i = 0
+            owner = rgen
+            epoch = rgen._epoch
+        yield block[i]
+        i += 1
+        counter += 1
 
 
 # class Pindex(ptt.Pattern):
@@ -37,31 +76,189 @@ class Pseq(ListPattern):
         repeats = self.repeats
         lst = collections.deque(self.lst)
         lst.rotate(offset) # TODO: tal vez usa wrapAt porque rotar es más costoso y genera un pico.
-        for i in range(repeats):
+        counter = 0
+        while counter < repeats:  # repeats can be inf.
             for item in lst:
                 inval = yield from stm.embed(item, inval)
+            counter += 1
+        return inval
+
+    def _cache_key(self):
+        if type(self) is not Pseq or type(self.repeats) is not int\
+        or type(self.offset) is not int:
+            return None
+        keys = tuple(ptt._value_key(item) for item in self.lst)
+        if None in keys:
+            return None
+        return (Pseq, keys, self.repeats, self.offset)
 
     # storeArgs # TODO
 
 
+class _SeqFrame():
+    __slots__ = ('lst', 'size', 'index')
+
+    def __init__(self, pattern, inval):
+        lst = collections.deque(pattern.lst)
+        lst.rotate(pattern.offset)
+        self.lst = list(lst)
+        self.size = len(lst) * pattern.repeats
+        self.index = 0
+
+    def step(self, inval):
+        if self.index < self.size:
+            item = self.lst[self.index % len(self.lst)]
+            self.index += 1
+            return ptt._EMBED, item
+        return ptt._RETURN, inval
+
+
+ptt._frames[Pseq] = _SeqFrame
+
+
 # Es una variante de Pseq que cuenta por item en lugar de por lista
 class Pser(Pseq):
     pass
 
 
+class _IndexFrame():
+    # Embeds the items of lst in the order of pattern._indices(inval).
+    __slots__ = ('lst', 'indices')
+
+    def __init__(self, pattern, inval):
+        self.lst = pattern.lst
+        self.indices = pattern._indices(inval)
+
+    def step(self, inval):
+        for index in self.indices:
+            return ptt._EMBED, self.lst[index]
+        return ptt._RETURN, inval
+
+
 class Pshuf(ListPattern):
-    pass
+    def __embed__(self, inval=None):
+        lst = self.lst
+        for index in self._indices(inval):
+            inval = yield from stm.embed(lst[index], inval)
+        return inval
+
+    def _indices(self, inval):
+        rgen = _libsc3.main.current_tt.rgen
+        generator = rgen.np_generator
+        if generator is None:
+            order = list(range(len(self.lst)))
+            rgen.shuffle(order)
+        else:
+            order = generator.permutation(len(self.lst)).tolist()
+        repeats = fn.value(self.repeats, inval)
+        counter = 0
+        while counter < repeats:
+            yield from order
+            counter += 1
+
+    # storeArgs # TODO
 
 
 class Prand(ListPattern):
-    pass
+    def __embed__(self, inval=None):
+        lst = self.lst
+        for index in self._indices(inval):
+            inval = yield from stm.embed(lst[index], inval)
+        return inval
+
+    def _indices(self, inval):
+        size = len(self.lst)
+        return _draw(fn.value(self.repeats, inval),
+                     lambda generator, n: generator.integers(size, size=n),
+                     lambda rgen: rgen.randrange(size))
+
+    # storeArgs # TODO
+
 
 class Pxrand(ListPattern):
-    pass
+    def __embed__(self, inval=None):
+        lst = self.lst
+        for index in self._indices(inval):
+            inval = yield from stm.embed(lst[index], inval)
+        return inval
+
+    def _indices(self, inval):
+        # Never repeats the previous item, the offset is 1 to size - 1.
+        size = len(self.lst)
+        high = max(size, 2)
+        index = _libsc3.main.current_tt.rgen.randrange(size)
+        for offset in _draw(fn.value(self.repeats, inval),
+                            lambda generator, n: generator.integers(1, high, size=n),
+                            lambda rgen: rgen.randrange(1, high)):
+            index = (index + offset) % size
+            yield index
+
+    # storeArgs # TODO
 
 
 class Pwrand(ListPattern):
-    pass
+    '''
+    Embed items of lst chosen by weights, weights are normalized and can
+    be a list or a pattern of lists. Constant weights are converted to a
+    cumulative table once and indices are drawn by blocks.
+    '''
+
+    def __init__(self, lst, weights, repeats=1):
+        super().__init__(lst, repeats)
+        self.weights = weights
+
+    def __embed__(self, inval=None):
+        lst = self.lst
+        if not hasattr(self.weights, '__stream__'):
+            for index in self._indices(inval):
+                inval = yield from stm.embed(lst[index], inval)
+            return inval
+        repeats = fn.value(self.repeats, inval)
+        weights_stream = stm.stream(self.weights)
+        counter = 0
+        while counter < repeats:
+            try:
+                weights = weights_stream.next(inval)
+            except stm.StopStream:
+                return inval
+            cumul = list(itertools.accumulate(weights))
+            rgen = _libsc3.main.current_tt.rgen
+            index = bisect.bisect_right(cumul, rgen.random() * cumul[-1])
+            inval = yield from stm.embed(lst[min(index, len(cumul) - 1)], inval)
+            counter += 1
+        return inval
+
+    def _indices(self, inval):
+        # Constant weights only.
+        cumul = list(itertools.accumulate(self.weights))
+        total = cumul[-1]
+        last = len(cumul) - 1
+        if stm._np is not None:
+            cumul_array = stm._np.array(cumul, dtype=float)
+
+        def np_draw(generator, n):
+            indices = cumul_array.searchsorted(
+                generator.random(n) * total, 'right')
+            return indices.clip(max=last)
+
+        def py_draw(rgen):
+            return min(bisect.bisect_right(cumul, rgen.random() * total), last)
+
+        return _draw(fn.value(self.repeats, inval), np_draw, py_draw)
+
+    # storeArgs # TODO
+
+
+def _wrand_frame(pattern, inval):
+    if hasattr(pattern.weights, '__stream__'):
+        return None  # Weights depend on inval, embedded as generator.
+    return _IndexFrame(pattern, inval)
+
+
+ptt._frames[Pshuf] = _IndexFrame
+ptt._frames[Prand] = _IndexFrame
+ptt._frames[Pxrand] = _IndexFrame
+ptt._frames[Pwrand] = _wrand_frame
 
 
 # # TODO: estos dos son un tanto específicos.
@@ -125,11 +322,62 @@ class Pwalk(ListPattern):
 # tampoco es que haya otra forma, Ptuple tal vez, se necesita delta.
 # En este sentido actúa como un conjunto de elementos específico (listas).
 class Ppar(ListPattern):
-    pass
+    # Child event streams are merged in one stream from a heap of next
+    # onsets, each child has its own EventStreamCleanup that exits when
+    # the child ends and is removed from the player in the next event.
+
+    def _init_streams(self, queue):
+        for i, pattern in enumerate(self.lst):
+            queue.append((0.0, i, stm.stream(pattern), stm.EventStreamCleanup()))
+
+    def __embed__(self, inval=None):
+        counter = 0
+        while counter < self.repeats:
+            queue = []
+            self._init_streams(queue)
+            heapq.heapify(queue)
+            now = 0.0
+            # // if first event not at time zero
+            if queue and queue[0][0] > 0.0:
+                now = queue[0][0]
+                inval = yield _silent(now, inval)
+            while queue:
+                _, order, stream, cleanup = heapq.heappop(queue)
+                try:
+                    outval = stream.next(inval)
+                except stm.StopStream:
+                    outval = None
+                if outval is None:
+                    if queue:
+                        # // that child stream ended, so rest until next one
+                        next_time = queue[0][0]
+                        outval = _silent(next_time - now, inval)
+                        inval = yield cleanup.exit(outval)
+                        now = next_time
+                    else:
+                        inval = cleanup.exit(inval)
+                else:
+                    cleanup.update(outval)
+                    heapq.heappush(
+                        queue,
+                        (now + evt._event_delta(outval), order,
+                         stream, cleanup))
+                    next_time = queue[0][0]
+                    outval['delta'] = next_time - now
+                    inval = yield outval
+                    now = next_time
+            counter += 1
+        return inval
 
 
 class Ptpar(Ppar):
-    pass
+    # lst is [onset, pattern, onset, pattern, ...] with onsets in beats.
+
+    def _init_streams(self, queue):
+        for i in range(0, len(self.lst) - 1, 2):
+            queue.append((
+                self.lst[i], i // 2, stm.stream(self.lst[i + 1]),
+                stm.EventStreamCleanup()))
 
 
 class Pgpar(Ppar):
@@ -138,3 +386,10 @@ class Pgpar(Ppar):
 
 class Pgtpar(Pgpar):
     pass
+
+
+def _silent(delta, inval):
+    # Event.silent, a rest of delta beats.
+    event = dict(inval) if inval else dict()
+    event['delta'] = Rest(delta)
+    return event
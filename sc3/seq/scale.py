@@ -2,49 +2,373 @@
 
 import math
 
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
 
-class Scale(list): # BUG: Tuning es como un array en sc y Scale implementa la intefaz llamando a Tuning, pero no sé si conviene heredar de tuple/list acá, esto es todo provisorio para seguir con Event
-    # TODO
+
+def _ratiomidi(ratios):
+    return [12.0 * math.log2(r) for r in ratios]
+
+
+def _et(size, octave_ratio=2.0):
+    step = 12.0 * math.log2(octave_ratio) / size
+    return [i * step for i in range(size)]
+
+
+# name: (semitones, octave_ratio, name), from TuningInfo in Tuning.sc.
+_TUNINGS = {
+    'et12': (_et(12), 2.0, 'ET12'),
+    'pythagorean': (_ratiomidi([
+        1, 256/243, 9/8, 32/27, 81/64, 4/3, 729/512, 3/2, 128/81, 27/16,
+        16/9, 243/128]), 2.0, 'Pythagorean'),
+    'just': (_ratiomidi([
+        1, 16/15, 9/8, 6/5, 5/4, 4/3, 45/32, 3/2, 8/5, 5/3, 9/5, 15/8]),
+        2.0, 'Limit Just Intonation'),
+    'sept1': (_ratiomidi([
+        1, 16/15, 9/8, 6/5, 5/4, 4/3, 7/5, 3/2, 8/5, 5/3, 9/5, 15/8]),
+        2.0, 'Septimal Tritone Just Intonation'),
+    'sept2': (_ratiomidi([
+        1, 16/15, 9/8, 6/5, 5/4, 4/3, 7/5, 3/2, 8/5, 5/3, 7/4, 15/8]),
+        2.0, '7-Limit Just Intonation'),
+    'mean4': ([0, 0.755, 1.93, 3.105, 3.86, 5.035, 5.79, 6.965, 7.72, 8.895,
+               10.07, 10.82], 2.0, 'Meantone, 1/4 Syntonic Comma'),
+    'mean5': ([0, 0.804, 1.944, 3.084, 3.888, 5.028, 5.832, 6.972, 7.776,
+               8.916, 10.056, 10.86], 2.0, 'Meantone, 1/5 Pythagorean Comma'),
+    'mean6': ([0, 0.86, 1.96, 3.06, 3.92, 5.02, 5.88, 6.98, 7.84, 8.94,
+               10.04, 10.9], 2.0, 'Meantone, 1/6 Pythagorean Comma'),
+    'kirnberger': (_ratiomidi([
+        1, 256/243, 5 ** 0.5 / 2, 32/27, 5/4, 4/3, 45/32, 5 ** 0.25, 128/81,
+        5 ** 0.75 / 2, 16/9, 15/8]), 2.0, 'Kirnberger III'),
+    'werckmeister': ([0, 0.92, 1.93, 2.94, 3.915, 4.98, 5.9, 6.965, 7.93,
+                      8.895, 9.96, 10.935], 2.0, 'Werckmeister III'),
+    'vallotti': ([0, 0.94135, 1.9609, 2.98045, 3.9218, 5.01955, 5.9218,
+                  6.98045, 7.9609, 8.94135, 10, 10.90225], 2.0, 'Vallotti'),
+    'young': ([0, 0.9, 1.96, 2.94, 3.92, 4.98, 5.88, 6.98, 7.92, 8.94, 9.96,
+               10.9], 2.0, 'Young'),
+    'reinhard': (_ratiomidi([
+        1, 14/13, 13/12, 16/13, 13/10, 18/13, 13/9, 20/13, 13/8, 22/13, 13/7,
+        208/105]), 2.0, 'Mayumi Reinhard'),
+    'wcHarm': (_ratiomidi([
+        1, 17/16, 9/8, 19/16, 5/4, 21/16, 11/8, 3/2, 13/8, 27/16, 7/4, 15/8]),
+        2.0, 'Wendy Carlos Harmonic'),
+    'wcSJ': (_ratiomidi([
+        1, 17/16, 9/8, 6/5, 5/4, 4/3, 11/8, 3/2, 13/8, 5/3, 7/4, 15/8]),
+        2.0, 'Wendy Carlos Super Just'),
+    'lu': (_ratiomidi([
+        1, 2187/2048, 9/8, 19683/16384, 81/64, 177147/131072, 729/512, 3/2,
+        6561/4096, 27/16, 59049/32768, 243/128]), 2.0, 'Chinese Shi-er-lu'),
+    'et19': (_et(19), 2.0, 'ET19'),
+    'et22': (_et(22), 2.0, 'ET22'),
+    'et24': (_et(24), 2.0, 'ET24'),
+    'et31': (_et(31), 2.0, 'ET31'),
+    'et41': (_et(41), 2.0, 'ET41'),
+    'et53': (_et(53), 2.0, 'ET53'),
+    'johnston': (_ratiomidi([
+        1, 25/24, 135/128, 16/15, 10/9, 9/8, 75/64, 6/5, 5/4, 81/64, 32/25,
+        4/3, 27/20, 45/32, 36/25, 3/2, 25/16, 8/5, 5/3, 27/16, 225/128, 16/9,
+        9/5, 15/8, 48/25]), 2.0, 'Ben Johnston'),
+    'partch': (_ratiomidi([
+        1, 81/80, 33/32, 21/20, 16/15, 12/11, 11/10, 10/9, 9/8, 8/7, 7/6,
+        32/27, 6/5, 11/9, 5/4, 14/11, 9/7, 21/16, 4/3, 27/20, 11/8, 7/5,
+        10/7, 16/11, 40/27, 3/2, 32/21, 14/9, 11/7, 8/5, 18/11, 5/3, 27/16,
+        12/7, 7/4, 16/9, 9/5, 20/11, 11/6, 15/8, 40/21, 64/33, 160/81]),
+        2.0, 'Harry Partch'),
+    'catler': (_ratiomidi([
+        1, 33/32, 16/15, 9/8, 8/7, 7/6, 6/5, 128/105, 16/13, 5/4, 21/16, 4/3,
+        11/8, 45/32, 16/11, 3/2, 8/5, 13/8, 5/3, 27/16, 7/4, 16/9, 24/13,
+        15/8]), 2.0, 'Jon Catler'),
+    'bp': (_et(13, 3.0), 3.0, 'Bohlen-Pierce'),
+}
+
+
+# name: (degrees, pitches per octave, name), from ScaleInfo in Scale.sc.
+_SCALES = {
+    # 5 note scales
+    'minorPentatonic': ([0, 3, 5, 7, 10], 12, 'Minor Pentatonic'),
+    'majorPentatonic': ([0, 2, 4, 7, 9], 12, 'Major Pentatonic'),
+    'ritusen': ([0, 2, 5, 7, 9], 12, 'Ritusen'),
+    'egyptian': ([0, 2, 5, 7, 10], 12, 'Egyptian'),
+    'kumai': ([0, 2, 3, 7, 9], 12, 'Kumai'),
+    'hirajoshi': ([0, 2, 3, 7, 8], 12, 'Hirajoshi'),
+    'iwato': ([0, 1, 5, 6, 10], 12, 'Iwato'),
+    'chinese': ([0, 4, 6, 7, 11], 12, 'Chinese'),
+    'indian': ([0, 4, 5, 7, 10], 12, 'Indian'),
+    'pelog': ([0, 1, 3, 7, 8], 12, 'Pelog'),
+    'prometheus': ([0, 2, 4, 6, 11], 12, 'Prometheus'),
+    'scriabin': ([0, 1, 4, 7, 9], 12, 'Scriabin'),
+    'gong': ([0, 2, 4, 7, 9], 12, 'Gong'),
+    'shang': ([0, 2, 5, 7, 10], 12, 'Shang'),
+    'jiao': ([0, 3, 5, 8, 10], 12, 'Jiao'),
+    'zhi': ([0, 2, 5, 7, 9], 12, 'Zhi'),
+    'yu': ([0, 3, 5, 7, 10], 12, 'Yu'),
+    # 6 note scales
+    'whole': ([0, 2, 4, 6, 8, 10], 12, 'Whole Tone'),
+    'augmented': ([0, 3, 4, 7, 8, 11], 12, 'Augmented'),
+    'augmented2': ([0, 1, 4, 5, 8, 9], 12, 'Augmented 2'),
+    'hexMajor7': ([0, 2, 4, 7, 9, 11], 12, 'Hex Major 7'),
+    'hexDorian': ([0, 2, 3, 5, 7, 10], 12, 'Hex Dorian'),
+    'hexPhrygian': ([0, 1, 3, 5, 8, 10], 12, 'Hex Phrygian'),
+    'hexSus': ([0, 2, 5, 7, 9, 10], 12, 'Hex Sus'),
+    'hexMajor6': ([0, 2, 4, 5, 7, 9], 12, 'Hex Major 6'),
+    'hexAeolian': ([0, 3, 5, 7, 8, 10], 12, 'Hex Aeolian'),
+    # 7 note scales
+    'major': ([0, 2, 4, 5, 7, 9, 11], 12, 'Major'),
+    'ionian': ([0, 2, 4, 5, 7, 9, 11], 12, 'Ionian'),
+    'dorian': ([0, 2, 3, 5, 7, 9, 10], 12, 'Dorian'),
+    'phrygian': ([0, 1, 3, 5, 7, 8, 10], 12, 'Phrygian'),
+    'lydian': ([0, 2, 4, 6, 7, 9, 11], 12, 'Lydian'),
+    'mixolydian': ([0, 2, 4, 5, 7, 9, 10], 12, 'Mixolydian'),
+    'aeolian': ([0, 2, 3, 5, 7, 8, 10], 12, 'Aeolian'),
+    'minor': ([0, 2, 3, 5, 7, 8, 10], 12, 'Natural Minor'),
+    'locrian': ([0, 1, 3, 5, 6, 8, 10], 12, 'Locrian'),
+    'harmonicMinor': ([0, 2, 3, 5, 7, 8, 11], 12, 'Harmonic Minor'),
+    'harmonicMajor': ([0, 2, 4, 5, 7, 8, 11], 12, 'Harmonic Major'),
+    'melodicMinor': ([0, 2, 3, 5, 7, 9, 11], 12, 'Melodic Minor'),
+    'melodicMinorDesc': ([0, 2, 3, 5, 7, 8, 10], 12,
+                         'Melodic Minor Descending'),
+    'melodicMajor': ([0, 2, 4, 5, 7, 8, 10], 12, 'Melodic Major'),
+    'bartok': ([0, 2, 4, 5, 7, 8, 10], 12, 'Bartok'),
+    'hindu': ([0, 2, 4, 5, 7, 8, 10], 12, 'Hindu'),
+    'todi': ([0, 1, 3, 6, 7, 8, 11], 12, 'Todi'),
+    'purvi': ([0, 1, 4, 6, 7, 8, 11], 12, 'Purvi'),
+    'marva': ([0, 1, 4, 6, 7, 9, 11], 12, 'Marva'),
+    'bhairav': ([0, 1, 4, 5, 7, 8, 11], 12, 'Bhairav'),
+    'ahirbhairav': ([0, 1, 4, 5, 7, 9, 10], 12, 'Ahirbhairav'),
+    'superLocrian': ([0, 1, 3, 4, 6, 8, 10], 12, 'Super Locrian'),
+    'romanianMinor': ([0, 2, 3, 6, 7, 9, 10], 12, 'Romanian Minor'),
+    'hungarianMinor': ([0, 2, 3, 6, 7, 8, 11], 12, 'Hungarian Minor'),
+    'neapolitanMinor': ([0, 1, 3, 5, 7, 8, 11], 12, 'Neapolitan Minor'),
+    'enigmatic': ([0, 1, 4, 6, 8, 10, 11], 12, 'Enigmatic'),
+    'spanish': ([0, 1, 4, 5, 7, 8, 10], 12, 'Spanish'),
+    'leadingWhole': ([0, 2, 4, 6, 8, 10, 11], 12, 'Leading Whole Tone'),
+    'lydianMinor': ([0, 2, 4, 6, 7, 8, 10], 12, 'Lydian Minor'),
+    'neapolitanMajor': ([0, 1, 3, 5, 7, 9, 11], 12, 'Neapolitan Major'),
+    'locrianMajor': ([0, 2, 4, 5, 6, 8, 10], 12, 'Locrian Major'),
+    # 8 note scales
+    'diminished': ([0, 1, 3, 4, 6, 7, 9, 10], 12, 'Diminished'),
+    'diminished2': ([0, 2, 3, 5, 6, 8, 9, 11], 12, 'Diminished 2'),
+    # 12 and 24 note scales
+    'chromatic': (list(range(12)), 12, 'Chromatic'),
+    'chromatic24': (list(range(24)), 24, 'Chromatic 24'),
+}
+
+
+class _VersionedList(list):
+    # In place changes increment version, values computed from the list
+    # are valid while it doesn't change.
+    _version = 0
+
+    @property
+    def version(self):
+        return self._version
+
+
+def _versioned(name):
+    method = getattr(list, name)
+
+    def mutator(self, *args):
+        ret = method(self, *args)
+        self._version += 1
+        return ret
+
+    mutator.__name__ = name
+    return mutator
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append',
+              'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(_VersionedList, _name, _versioned(_name))
+del _name
+
+
+class Tuning(_VersionedList): # BUG: Ídem Scale
+    '''
+    Semitones of each step of a tuning and the ratio of its octave.
+    tuning can be the name of a tuning of the library, see names().
+    '''
+
+    def __init__(self, tuning, octave_ratio=2.0, name='Unknown Tuning'):
+        if isinstance(tuning, str):
+            try:
+                tuning, octave_ratio, name = _TUNINGS[tuning]
+            except KeyError:
+                raise ValueError(f"unknown tuning '{tuning}'") from None
+        super().__init__(tuning)
+        self.name = name
+        self.octave_ratio = octave_ratio # BUG: es read only
+
+    @classmethod
+    def names(cls):
+        return list(_TUNINGS)
+
+    @classmethod
+    def et(cls, ppo=12):
+        return cls(_et(ppo), 2.0, f'ET{ppo}')
+
+    @classmethod
+    def default(cls, ppo):
+        return cls.et(ppo)
+
+    @property
+    def octave_ratio(self):
+        return self._octave_ratio
+
+    @octave_ratio.setter
+    def octave_ratio(self, value):
+        self._octave_ratio = value
+        self._spo = math.log2(value) * 12
+        self._version += 1
+
+    def spo(self):
+        return self._spo # NOTE: por qué 12.0 siempre es constante en relación a distintas cantidades de pasos por octava.
+
+    def ratios(self):
+        return [2.0 ** (x / 12.0) for x in self]
+
+    def cents(self):
+        return [x * 100.0 for x in self]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self)}, {self.octave_ratio}, "\
+               f"'{self.name}')"
+
+
+class Scale(_VersionedList): # BUG: Tuning es como un array en sc y Scale implementa la intefaz llamando a Tuning, pero no sé si conviene heredar de tuple/list acá, esto es todo provisorio para seguir con Event
+    '''
+    Semitones of the degrees of a scale in a tuning of ppo pitches per
+    octave. degrees can be the name of a scale of the library, see
+    names(), tuning can be a Tuning or the name of a tuning, if ppo is
+    None it is guessed from the degrees. Degree conversions also work
+    on numpy arrays of degrees.
+    '''
 
     def __init__(self, degrees='ionian', ppo=None, tuning=None, name='Unknown Scale'):
-        # TODO
-        self.tuning = Tuning([0, 2, 4, 5, 7, 9, 11]) # TODO: tuning or Tuning.default(ppo) # BUG: tiene setter especial
-        super().__init__(self.tuning) # BUG: provisorio
-        # TODO
+        if isinstance(degrees, str):
+            try:
+                degrees, ppo, name = _SCALES[degrees]
+            except KeyError:
+                raise ValueError(f"unknown scale '{degrees}'") from None
+        self.degrees = tuple(int(d) for d in degrees)
+        if ppo is None:
+            ppo = self._guess_ppo(self.degrees)
+        if tuning is None:
+            tuning = Tuning.default(ppo)
+        elif isinstance(tuning, str):
+            tuning = Tuning(tuning)
+        if len(tuning) != ppo:
+            raise ValueError(
+                f'scale pitches per octave ({ppo}) does not '
+                f'match tuning size ({len(tuning)})')
+        self._tuning = tuning
+        self.name = name
+        super().__init__(tuning[d] for d in self.degrees)
+        self._make_tables()
+
+    @staticmethod
+    def _guess_ppo(degrees):
+        top = max(degrees, default=0)
+        for ppo in (12, 19, 24, 53, 128):
+            if ppo > top:
+                return ppo
+        return top + 1
+
+    @classmethod
+    def names(cls):
+        return list(_SCALES)
+
+    @property
+    def tuning(self):
+        return self._tuning
+
+    @tuning.setter
+    def tuning(self, value): # BUG: en sclang también verifica el tamaño.
+        self._tuning = value
+        self._version += 1
+
+    @property
+    def version(self):
+        '''Changes when the scale or its tuning change in place.'''
+        return (self._version, self._tuning._version)
+
+    def _make_tables(self):
+        # Keys and frequency ratios of each degree and steps per octave,
+        # used by the degree conversions, made again if the version changed.
+        self._tables_version = self.version
+        self._spo = self.tuning.spo()
+        self._keys = tuple(float(key) for key in self)
+        self._ratios = tuple(2.0 ** (key / 12.0) for key in self._keys)
+        if _np is None:
+            self._keys_array = self._ratios_array = None
+        else:
+            self._keys_array = _np.array(self._keys)
+            self._ratios_array = _np.array(self._ratios)
+
+    def _check_tables(self):
+        if self._tables_version != (self._version, self._tuning._version):
+            self._make_tables()
+
+    @property
+    def ppo(self):
+        return len(self.tuning)
 
     # NOTE: podría ser property como en Tuning y acá abajo en octave_ratio
     def spo(self):
-        return self.tuning.spo()
+        self._check_tables()
+        return self._spo
 
     @property
     def octave_ratio(self):
         return self.tuning.octave_ratio
 
+    def ratios(self):
+        self._check_tables()
+        return list(self._ratios)
+
     def degree_to_key(self, degree, spo=None, acc=0): # NOTE: es performDegreeToKey, spo = steps per octave, acc = accidental
-        spo = spo or self.tuning.spo()
-        l = len(self)
-        base_key = spo * (degree // l) + self[degree % l]
+        self._check_tables()
+        spo = spo or self._spo
+        size = len(self._keys)
+        if _np is not None and isinstance(degree, _np.ndarray):
+            index = _np.floor(degree).astype(_np.intp)
+            base_key = spo * (index // size) + self._keys_array[index % size]
+        else:
+            index = math.floor(degree)
+            base_key = spo * (index // size) + self._keys[index % size]
         if acc == 0:
             return base_key
         else:
             return base_key + acc * (spo / 12)
 
-    # TODO
-
-
-class Tuning(list): # BUG: Ídem Scale
-    # TODO
-
-    def __init__(self, tuning, octave_ratio=2.0, name='Unknown Tuning'):
-        # TODO
-        super().__init__(tuning)
-        self.octave_ratio = octave_ratio # BUG: es read only
-        # TODO
-
-    def spo(self):
-        return math.log2(self.octave_ratio) * 12 # NOTE: por qué 12.0 siempre es constante en relación a distintas cantidades de pasos por octava.
+    def degree_to_midinote(self, degree, octave=5.0, transpose=0.0):
+        '''
+        Midi note of degree in octave plus transpose in steps, integer
+        degrees are looked up in the table of keys.
+        '''
+        self._check_tables()
+        if type(degree) is int:
+            size = len(self._keys)
+            key = self._keys[degree % size] + self._spo * (degree // size)
+        else:
+            key = self.degree_to_key(degree)
+        # Steps are semitones: (key / spo + octave - 5) * spo + 60.
+        return key + transpose + self._spo * (octave - 5.0) + 60.0
 
-    # TODO
+    def degree_to_ratio(self, degree, octave=0):
+        self._check_tables()
+        size = len(self._ratios)
+        if _np is not None and isinstance(degree, _np.ndarray):
+            index = _np.floor(degree).astype(_np.intp)
+            ratios = self._ratios_array[index % size]
+        else:
+            index = math.floor(degree)
+            ratios = self._ratios[index % size]
+        return ratios * self.octave_ratio ** (octave + index // size)
 
+    def degree_to_freq(self, degree, root_freq, octave=0):
+        return self.degree_to_ratio(degree, octave) * root_freq
 
-# TODO: sigue...
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self.degrees)}, {self.ppo}, "\
+               f"{self.tuning!r}, '{self.name}')"
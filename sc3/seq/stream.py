@@ -2,7 +2,11 @@
 
 import inspect
 import enum
+import operator
 import random
+import threading
+import types
+import weakref
 
 from ..base import main as _libsc3
 from ..base import functions as fn
@@ -11,6 +15,11 @@ from ..base import systemactions as sac
 from . import clock as clk
 from . import event as evt
 
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
 
 class StopStream(StopIteration):
     pass
@@ -39,7 +48,11 @@ class Stream(fn.AbstractFunction): #, ABC):
 
     def __embed__(self, inval=None):
         while True:
-            yield self.next(inval)
+            try:
+                outval = self.next(inval)
+            except StopIteration:
+                return inval  # Raising within a generator is RuntimeError.
+            inval = yield outval
 
     def __next__(self):
         return self.next()
@@ -68,6 +81,20 @@ class Stream(fn.AbstractFunction): #, ABC):
                 break
         return lst
 
+    def next_n(self, n, inval=None):
+        '''
+        Return the next n values of the stream, less if the stream ends.
+        If all values are numbers the result is a numpy array (when numpy
+        is available), otherwise it is a list.
+        '''
+        lst = []
+        try:
+            for _ in range(n):
+                lst.append(self.next(inval))
+        except StopIteration:
+            pass
+        return _as_array(lst)
+
     # put
     # putN
     # putAll
@@ -111,14 +138,57 @@ class Stream(fn.AbstractFunction): #, ABC):
 ### BasicOpStream.sc ###
 
 
+_NUMBER_TYPES = (int, float) if _np is None else (int, float, _np.number)
+
+# Selectors that give the same results on numpy arrays element by element.
+_ARRAY_OPS = {
+    operator.neg, operator.pos, operator.abs, operator.invert,
+    operator.add, operator.sub, operator.mul, operator.truediv,
+    operator.floordiv, operator.mod, operator.pow, operator.lshift,
+    operator.rshift, operator.and_, operator.or_, operator.xor,
+    operator.lt, operator.le, operator.gt, operator.ge,
+    operator.eq, operator.ne}
+
+# Python ints don't overflow, int64 arrays do silently.
+_INT_OVERFLOW_OPS = {operator.pow, operator.lshift}
+
+
+def _as_array(lst):
+    if _np is None or not all(isinstance(x, _NUMBER_TYPES) for x in lst):
+        return lst
+    return _np.array(lst)
+
+
+def _apply_op(selector, *args):
+    # Args are arrays or lists of the same size as returned by next_n.
+    if _np is not None\
+    and all(isinstance(x, _np.ndarray) for x in args)\
+    and (isinstance(selector, _np.ufunc) or selector in _ARRAY_OPS)\
+    and not (selector in _INT_OVERFLOW_OPS
+             and any(x.dtype.kind in 'iu' for x in args)):
+        try:
+            with _np.errstate(all='raise'):
+                return selector(*args)
+        except (ArithmeticError, TypeError, ValueError):
+            pass  # Element by element, errors raise as in next.
+    args = [x.tolist() if _np is not None and isinstance(x, _np.ndarray)
+            else x for x in args]
+    return _as_array([selector(*x) for x in zip(*args)])
+
+
 class UnaryOpStream(Stream):
     def __init__(self, selector, a):
         self.selector = selector
         self.a = a
+        self._fused = None
 
     def next(self, inval=None):
-        a = self.a.next(inval)  # raises StopStream
-        return self.selector(a)
+        if self._fused is None:
+            self._fused = _fuse_stream(self)
+        return self._fused(inval)  # raises StopStream
+
+    def next_n(self, n, inval=None):
+        return _apply_op(self.selector, self.a.next_n(n, inval))
 
     def reset(self):
         self.a.reset()
@@ -131,11 +201,28 @@ class BinaryOpStream(Stream):
         self.selector = selector
         self.a = a
         self.b = b
+        self._fused = None
+        self._by_block = None
 
     def next(self, inval=None):
-        a = self.a.next(inval)  # raises StopStream
-        b = self.b.next(inval)
-        return self.selector(a, b)
+        if self._fused is None:
+            self._fused = _fuse_stream(self)
+        return self._fused(inval)  # raises StopStream
+
+    def next_n(self, n, inval=None):
+        # Operands are pulled by blocks only if that gives the same values
+        # as next, which pulls a and b alternately, otherwise by value.
+        if self._by_block is None:
+            self._by_block = _independent_leaves(self)
+        if not self._by_block:
+            return super().next_n(n, inval)
+        a = self.a.next_n(n, inval)
+        b = self.b.next_n(len(a), inval)
+        if len(b) < len(a):
+            # next consumes one value of a before b ends, the rest is
+            # given back as if it was never pulled.
+            _rewind(self.a, len(a) - len(b) - 1)
+        return _apply_op(self.selector, a[:len(b)], b)
 
     def reset(self):
         self.a.reset()
@@ -149,15 +236,12 @@ class NAryOpStream(Stream):
         self.selector = selector
         self.a = a
         self.args = args # BUG: cambié el nombres arglist, no uso la optimización isNumeric, todos los args son stream (convertidos en la llamada)
+        self._fused = None
 
     def next(self, inval=None):
-        a = self.a.next(inval)  # raises StopStream
-        args = []
-        res = None
-        for item in self.args:
-            res = item.next(inval)  # raises StopStream
-            args.append(res)
-        return self.selector(a, *args)
+        if self._fused is None:
+            self._fused = _fuse_stream(self)
+        return self._fused(inval)  # raises StopStream
 
     def reset(self):
         self.a.reset()
@@ -167,9 +251,170 @@ class NAryOpStream(Stream):
     # storeOn # TODO
 
 
+def _fuse_stream(obj):
+    # Each element costs one call plus the next of the leaf streams.
+    fuser = fn._Fuser(unwrap=True)
+    return fuser.compile('inval', _stream_expr(fuser, obj))
+
+
+# Stream types (exact) that wrap another stream, e.g. the recording
+# streams of patterns, they are looked through by _leaves.
+_wrapper_types = set()
+
+
+def _operands(obj):
+    if type(obj) is UnaryOpStream:
+        return (obj.a,)
+    if type(obj) is BinaryOpStream:
+        return (obj.a, obj.b)
+    if type(obj) is NAryOpStream:
+        return (obj.a, *obj.args)
+    if type(obj) in _wrapper_types:
+        return (obj._stream,)
+    return ()
+
+
+def _leaves(obj):
+    operands = _operands(obj)
+    if not operands:
+        yield obj
+    for x in operands:
+        yield from _leaves(x)
+
+
+def _independent_leaves(obj):
+    # Leaves that implement _deterministic and _rewind can be pulled by
+    # block. Value streams have no state and can be shared, the others
+    # are used once. A leaf that is not deterministic (e.g. random, it
+    # may also embed any stream) is only combined with value streams,
+    # so the order of the pulls doesn't change the values.
+    ids = set()
+    shared = False
+    for x in _leaves(obj):
+        if type(x) is _ValueStream:
+            continue
+        if id(x) in ids or not hasattr(x, '_deterministic'):
+            return False
+        ids.add(id(x))
+        if not x._deterministic():
+            shared = True
+    return not shared or len(ids) == 1
+
+
+def _rewind(obj, n):
+    # Give back the last n values pulled by next_n, only for trees of
+    # _independent_leaves.
+    if hasattr(obj, '_rewind'):
+        obj._rewind(n)
+    for x in _operands(obj):
+        _rewind(x, n)
+
+
+def _stream_expr(fuser, obj):
+    # Operands are evaluated from left to right, StopStream goes through.
+    if type(obj) in (UnaryOpStream, BinaryOpStream, NAryOpStream):
+        return fuser.op(
+            obj.selector, *(_stream_expr(fuser, x) for x in _operands(obj)))
+    if type(obj) is _ValueStream:
+        return fuser.value(obj.value)
+    return f'{fuser.value(obj.next)}(inval)'
+
+
+class _ValueStream(Stream):
+    # Objects are infinite streams of themselves, see stream().
+    def __init__(self, value):
+        self.value = value
+
+    def next(self, inval=None):
+        return self.value
+
+    def next_n(self, n, inval=None):
+        return _as_array([self.value] * n)
+
+    def reset(self):
+        pass
+
+
+class _CachedStream(Stream):
+    # Values of a deterministic pattern, see Pattern.__stream__.
+    def __init__(self, values, array=None):
+        self._values = values
+        self._array = array  # Read only, shared.
+        self._index = 0
+
+    def next(self, inval=None):
+        try:
+            value = self._values[self._index]
+        except IndexError:
+            raise StopStream from None
+        self._index += 1
+        return value
+
+    def next_n(self, n, inval=None):
+        i = self._index
+        self._index = min(i + n, len(self._values))
+        if self._array is not None:
+            return self._array[i:self._index].copy()
+        return self._values[i:self._index]
+
+    def reset(self):
+        self._index = 0
+
+    def _deterministic(self):
+        return True
+
+    def _rewind(self, n):
+        self._index -= n
+
+
 ### Thread.sc ###
 
 
+class _Random(random.Random):
+    '''
+    Random generator of TimeThreads.
+
+    It also has a numpy Generator for block draws (e.g. of random
+    patterns) that is seeded from this generator when first used, the
+    state of both generators is saved and restored together. The epoch
+    changes when the seed or the state is set or read, blocks drawn
+    before are not used after that.
+    '''
+
+    _epoch = 0
+
+    def seed(self, a=None, version=2):
+        super().seed(a, version)
+        self._np_generator = None
+        self._epoch += 1
+
+    @property
+    def np_generator(self):
+        '''numpy.random.Generator or None if numpy is not available.'''
+        if self._np_generator is None and _np is not None:
+            self._np_generator = _np.random.Generator(
+                _np.random.PCG64(self.getrandbits(128)))
+        return self._np_generator
+
+    def getstate(self):
+        self._epoch += 1
+        if self._np_generator is None:
+            return (super().getstate(), None)
+        return (super().getstate(), self._np_generator.bit_generator.state)
+
+    def setstate(self, state):
+        if len(state) != 2:  # From random.Random.getstate.
+            state = (state, None)
+        super().setstate(state[0])
+        self._epoch += 1
+        if state[1] is None:
+            self._np_generator = None
+        else:
+            if self._np_generator is None:
+                self._np_generator = _np.random.Generator(_np.random.PCG64())
+            self._np_generator.bit_generator.state = state[1]
+
+
 class TimeThread(): #(Stream): # BUG: hereda de Stream por Routine y no la usa, pero acá puede haber herencia múltiple. Además, me puse poético con el nombre.
     # ./lang/LangSource/PyrKernel.h: enum { tInit, tStart, tReady, tRunning, tSleeping, tSuspended, tDone };
     # ./lang/LangSource/PyrKernel.h: struct PyrThread : public PyrObjectHdr
@@ -184,18 +429,18 @@ class TimeThread(): #(Stream): # BUG: hereda de Stream por Routine y no la usa,
         # se sobreescribe el reloj por TempoClock.default en Stream:play
         # y Routine:run vuelve a escribir SystemClock (cuando ya lo hizo en
         # PyrPrimitive). La única manera de usar el reloj heredado es llamando a next.
-        self._beats = _libsc3.main.current_tt.beats
-        self._seconds = _libsc3.main.current_tt.seconds # ojo que tienen setters porque son dependientes...
+        parent = _libsc3.main.current_tt
+        self._seconds = parent.seconds # ojo que tienen setters porque son dependientes...
+        self._beats = parent._beats  # Updated by seconds.
 
         # BUG: ver qué pasa con terminalValue <nextBeat, <>endBeat, <>endValue;
         # se usan en la implementación a bajo nivel de los relojes.
 
         self.func = func
-        self.state = self.State.Init
-        if _libsc3.main.current_tt.clock is None: # BUG: si mainThread siempre devuelve SystemClock y siempre es curThread por defecto, esta comprobación es necesaria?
+        if parent.clock is None: # BUG: si mainThread siempre devuelve SystemClock y siempre es curThread por defecto, esta comprobación es necesaria?
             self._clock = clk.SystemClock
         else:
-            self._clock = _libsc3.main.current_tt.clock
+            self._clock = parent.clock
 
         # NOTA: No guarda la propiedad <parent cuando crea el thread, es
         # &g->thread que la usa para setear beats y seconds pero no la guarda,
@@ -204,7 +449,7 @@ class TimeThread(): #(Stream): # BUG: hereda de Stream por Routine y no la usa,
         self.parent = None
         self.state = self.State.Init
         self._thread_player = None
-        self._rgen = _libsc3.main.current_tt.rgen
+        self._rgen = parent.rgen
 
         # para Routine
         self._iterator = None # se inicializa luego de la excepción
@@ -285,10 +530,11 @@ class TimeThread(): #(Stream): # BUG: hereda de Stream por Routine y no la usa,
     def rand_seed(self, x):
         # NOTE: La rutinas heredan el generador de parent y solo lo cambian si
         # NOTE: se siembra. Así se comporta sclang. Hay que usar sc3.random.
-        self._rgen = random.Random(x)
+        self._rgen = _Random(x)
 
     @property
     def rand_state(self):
+        # Includes the state of the numpy generator if it was used.
         return self._rgen.getstate()
 
     @rand_state.setter
@@ -313,6 +559,58 @@ class TimeThread(): #(Stream): # BUG: hereda de Stream por Routine y no la usa,
     # checkCanArchive { "cannot archive Threads".warn }
 
 
+class _MainTimeThread(TimeThread):
+    # Logical time of main time thread is kept for each system thread,
+    # clocks run their tasks in their own threads setting it to the time
+    # of the tasks without locking each other.
+
+    def __init__(self, rgen):
+        # init main time thread # NOTE: ver PyrInterpreter3 L157 newPyrProcess y PyrPrimitive initPyrThread
+        self._local = threading.local()
+        self.parent = None
+        self.func = None
+        self.state = self.State.Init
+        self._thread_player = None
+        self._rgen = rgen
+
+    @property
+    def _seconds(self):
+        return getattr(self._local, 'seconds', 0.0)
+
+    @_seconds.setter
+    def _seconds(self, value):
+        self._local.seconds = value
+
+    @property
+    def _beats(self):
+        return getattr(self._local, 'beats', 0.0)
+
+    @_beats.setter
+    def _beats(self, value):
+        self._local.beats = value
+
+
+_RUNNING = TimeThread.State.Running
+_SUSPENDED = TimeThread.State.Suspended
+_DONE = TimeThread.State.Done
+
+# Arity of routine functions, inspect.signature is slow and functions
+# (closures included) are usually started many times.
+_takes_inval_cache = weakref.WeakKeyDictionary()
+
+
+def _takes_inval(func):
+    try:
+        return _takes_inval_cache[func]
+    except KeyError:
+        ret = len(inspect.signature(func).parameters) > 0
+        _takes_inval_cache[func] = ret
+        return ret
+    except TypeError:
+        # Not weakly referenceable (builtins, slotted callables).
+        return len(inspect.signature(func).parameters) > 0
+
+
 class Routine(TimeThread, Stream):
     @classmethod
     def run(cls, func, clock=None, quant=None):
@@ -349,32 +647,33 @@ class Routine(TimeThread, Stream):
 
     def next(self, inval=None):
         # _RoutineAlwaysYield (y Done)
-        if self.state == self.State.Done:
+        if self.state is _DONE:
             if self._terminal_value is self._sentinel:
                 raise StopStream('Routine stopped')
             else:
                 return self._terminal_value
 
         # prRoutineResume
-        self.parent = _libsc3.main.current_tt
-        _libsc3.main.current_tt = self
-        self.seconds = self.parent.seconds
-        self.state = self.State.Running
+        main = _libsc3.main
+        parent = self.parent = main.current_tt
+        main.current_tt = self
+        self.seconds = parent._seconds  # Not the getter, self is current_tt.
+        self.state = _RUNNING
 
         try:
             # TODO: Reproducir test_concurrente.scd cuando implemente TempoClock.
-            if self._iterator is None:
-                if len(inspect.signature(self.func).parameters) == 0:
-                    self._iterator = self.func()
-                else:
+            if self._iterator is not None:
+                self._last_value = self._iterator.send(inval)
+            else:
+                if _takes_inval(self.func):
                     self._iterator = self.func(inval)
-                if inspect.isgenerator(self._iterator):
+                else:
+                    self._iterator = self.func()
+                if type(self._iterator) is types.GeneratorType:
                     self._last_value = next(self._iterator)
                 else:
                     raise AlwaysYield()
-            else:
-                self._last_value = self._iterator.send(inval)
-            self.state = self.State.Suspended
+            self.state = _SUSPENDED
         except StopStream as e:
             self._iterator = None
             self._last_value = None
@@ -395,7 +694,7 @@ class Routine(TimeThread, Stream):
             self.state = self.State.Done
             self._last_value = self._terminal_value
         finally:
-            _libsc3.main.current_tt = self.parent
+            main.current_tt = parent
             self.parent = None
 
         return self._last_value
@@ -682,41 +981,39 @@ class EventStreamCleanup():
         self.functions = set() # // cleanup functions from child streams and parent stream
 
     def add_function(self, event, func):
-        if isinstance(event, dict):
+        if isinstance(event, (dict, evt.EventRecord)):
             self.functions.add(func)
             if 'add_to_cleanup' not in event:
-                event.add_to_cleanup = []
-            event.add_to_cleanup.append(func)
+                event['add_to_cleanup'] = []
+            event['add_to_cleanup'].append(func)
 
     def add_node_cleanup(self, event, func):
-        if isinstance(event, dict):
+        if isinstance(event, (dict, evt.EventRecord)):
             self.functions.add(func)
             if 'add_to_node_cleanup' not in event:
-                event.add_to_node_cleanup = []
-            event.add_to_node_cleanup.append(func)
+                event['add_to_node_cleanup'] = []
+            event['add_to_node_cleanup'].append(func)
 
     def update(self, event):
-        if isinstance(event, dict):
+        if isinstance(event, (dict, evt.EventRecord)):
             if 'add_to_node_cleanup' in event:
-                self.functions.update(event.add_to_node_cleanup)
+                self.functions.update(event['add_to_node_cleanup'])
             if 'add_to_cleanup' in event:
-                self.functions.update(event.add_to_cleanup)
+                self.functions.update(event['add_to_cleanup'])
             if 'remove_from_cleanup' in event:
-                for item in event.remove_from_cleanup:
+                for item in event['remove_from_cleanup']:
                     self.functions.discard(item)
-            print('*** ver por qué EventStreamCleanup.update retorna el argumento event (además inalterado)')
             return event # TODO: Why?
 
     def exit(self, event, free_nodes=True):
-        if isinstance(event, dict):
+        if isinstance(event, (dict, evt.EventRecord)):
             self.update(event)
             for func in self.functions:
                 func(free_nodes)
             if 'remove_from_cleanup' not in event:
-                event.remove_from_cleanup = [] # NOTE: es necesario porque hace reasignación del array como si creara uno nuevo, por eso entiendo que es un array también.
-            event.remove_from_cleanup.extend(self.functions)
+                event['remove_from_cleanup'] = [] # NOTE: es necesario porque hace reasignación del array como si creara uno nuevo, por eso entiendo que es un array también.
+            event['remove_from_cleanup'].extend(self.functions)
             self.clear()
-            print('*** ver por qué EventStreamCleanup.exit retorna el argumento event (aunque acá sí alterado)')
             return event
 
     def terminate(self, free_nodes=True):
@@ -729,15 +1026,22 @@ class EventStreamCleanup():
 
 
 class EventStreamPlayer(PauseStream):
-    def __init__(self, stream, event=None):
+    def __init__(self, stream, event=None, batch=False):
         super().__init__(stream)
-        self.event = event or evt.Event.default() # BUG: tal vez debería ser una property de clase? o que todos los default sean funciones (SIMPLIFICA EL CÓDIGO) o propiedades. Pero Event *default crea un nuevo evento cada vez.
+        self.event = event or dict()  # NOTE: Event.default_parent is the parent of every event.
+        # If True, events with zero delta are played together,
+        # one bundle for each server, in the same wakeup.
+        self.batch = batch
         self.mute_count = 0
         self.cleanup = EventStreamCleanup()
 
         def stream_player_generator(in_time):
             while True:
-                in_time = yield self._next(in_time)
+                try:
+                    next_time = self._next(in_time)
+                except StopStream:
+                    return  # StopIteration can't be raised from generators.
+                in_time = yield next_time
 
         self.routine = Routine(stream_player_generator)
 
@@ -781,7 +1085,11 @@ class EventStreamPlayer(PauseStream):
                 raise StopStream()
             else:
                 out_event = self._stream.next(self.event.copy())
-                next_time = out_event.play_and_delta(self.cleanup, self.mute_count > 0)
+                if self.batch:
+                    next_time = self._play_batch(out_event)
+                else:
+                    next_time = evt._play_and_delta(
+                        out_event, self.cleanup, self.mute_count > 0)
                 # if (nextTime.isNil) { this.removedFromScheduler; ^nil }; # *** BUG ***
                 # BUG: para event.play_and_delta/event.delta, los patterns no van a devolver
                 # BUG: nil y setear la llave, van a tirar StopStream.
@@ -796,6 +1104,15 @@ class EventStreamPlayer(PauseStream):
             self.removed_from_scheduler() # BUG? Hay algo raro, llama cleanup.clear() en la línea anterior, que borras las funciones de cleanup, pero luego llama a cleanup.terminate a través removed_from_scheduler en esta línea que evalúa las funciones que borró (no las evalúa)
             raise StopStream() # NOTE: podría ir afuera
 
+    def _play_batch(self, out_event):
+        events = [out_event]
+        while evt._event_delta(events[-1]) == 0:
+            try:
+                events.append(self._stream.next(self.event.copy()))
+            except StopStream:
+                break  # Raised again in the next wakeup at the same time.
+        return evt._play_batch(events, self.cleanup, self.mute_count > 0)
+
     def as_event_stream_player(self): # BUG: VER: lo implementan Event, EventStreamPlayer, Pattern y Stream, parece protocolo.
         return self
 
@@ -809,10 +1126,11 @@ class EventStreamPlayer(PauseStream):
         self.stream_has_ended = False
         self._stream = self.original_stream
         self._stream.clock = self.clock
+        self.routine.clock = self.clock  # Events are played in routine, see event._event_latency.
         self.waiting = True # // make sure that accidental play/stop/play sequences don't cause memory leaks
         self.era = sac.CmdPeriod.era
         quant = clk.Quant.as_quant(quant) # NOTE: se necesita porque lo actualiza event.sync_with_quant
-        self.event = self.event.sync_with_quant(quant) # NOTE: actualiza el evento y retorna una copia o actualiza el objeto Quant pasado.
+        self.event = evt._sync_with_quant(self.event, quant) # NOTE: actualiza el evento y retorna una copia o actualiza el objeto Quant pasado.
 
         def event_stream_play():
             if self.waiting and self.next_beat is None:
@@ -831,19 +1149,16 @@ class EventStreamPlayer(PauseStream):
 def stream(obj):
     if hasattr(obj, '__stream__'):
         return obj.__stream__()
-
-    def _(inval=None):
-        while True: # BUG: los Object son streams infinitos el problema es que no se comportan lo mismo con embedInStream, ahí son finitos, valores únicos.
-            yield obj
-    return Routine(_)
+    return _ValueStream(obj) # BUG: los Object son streams infinitos el problema es que no se comportan lo mismo con embedInStream, ahí son finitos, valores únicos.
 
 
 def embed(obj, inval=None):
     if hasattr(obj, '__embed__'):
         return obj.__embed__(inval)
-    if hasattr(obj, '__stream__') or hasattr(obj, '__iter__'):
+    if hasattr(obj, '__stream__'):
         return  stream(obj).__embed__(inval)
 
-    def _(inval=None):
-        yield obj
-    return Routine(_).__embed__()
+    def _():
+        # Object embedInStream yields self once, lists too.
+        return (yield obj)
+    return _()
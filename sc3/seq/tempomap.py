@@ -0,0 +1,172 @@
+"""Tempo history for TempoClock."""
+
+import bisect as _bisect
+import math as _math
+
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+
+class TempoMap():
+    '''
+    Piecewise tempo map from beats to seconds and back.
+
+    Each segment starts at a beat, second and tempo and has either a
+    constant tempo or a tempo that changes linearly in beats until the
+    next segment (a ramp). Conversions bisect the segments so they are
+    O(log n) on the number of tempo changes, numpy arrays of beats or
+    seconds are converted at once when numpy is available.
+
+    TempoClock can record its tempo changes into a map, see
+    TempoClock.record_tempo_map(), or maps can be written by hand for
+    scores and analysis.
+    '''
+
+    def __init__(self, tempo=1.0, beats=0.0, seconds=0.0):
+        if tempo <= 0.0:
+            raise ValueError(f'invalid tempo {tempo}')
+        self._beats = [beats]
+        self._secs = [seconds]
+        self._tempos = [tempo]
+        self._slopes = [0.0]  # Tempo change per beat.
+        self._arrays = None
+
+    def __len__(self):
+        return len(self._beats)
+
+    @property
+    def segments(self):
+        '''List of (beats, seconds, tempo, slope) tuples.'''
+        return list(zip(self._beats, self._secs, self._tempos, self._slopes))
+
+    def add(self, beats, tempo, seconds=None):
+        '''
+        Change to tempo at beats, segments from that point on are
+        discarded. If seconds is None the map is continuous, otherwise
+        beats and seconds are a new reference point (as when setting
+        TempoClock.beats).
+        '''
+        if tempo <= 0.0:
+            raise ValueError(f'invalid tempo {tempo}')
+        if seconds is None:
+            seconds = self.beats2secs(beats)
+        self._truncate(beats, seconds)
+        self._append(beats, seconds, tempo, 0.0)
+
+    def ramp(self, beats, tempo, dur):
+        '''
+        Change linearly from the tempo at beats to tempo in dur beats,
+        the tempo stays constant after the ramp. Segments from beats on
+        are discarded.
+        '''
+        if tempo <= 0.0:
+            raise ValueError(f'invalid tempo {tempo}')
+        if dur <= 0.0:
+            self.add(beats, tempo)
+            return
+        start_tempo = self.tempo_at(beats)
+        seconds = self.beats2secs(beats)
+        self._truncate(beats, seconds)
+        self._append(beats, seconds, start_tempo, (tempo - start_tempo) / dur)
+        self._append(beats + dur, self.beats2secs(beats + dur), tempo, 0.0)
+
+    def _truncate(self, beats, seconds):
+        i = min(_bisect.bisect_left(self._beats, beats),
+                _bisect.bisect_left(self._secs, seconds))
+        if i == 0:
+            i = 1  # Keeps the segment that defines extrapolation.
+        del self._beats[i:], self._secs[i:], self._tempos[i:], self._slopes[i:]
+        self._arrays = None
+
+    def _append(self, beats, seconds, tempo, slope):
+        if len(self._beats) == 1 and beats <= self._beats[0]:
+            self._beats[0] = beats
+            self._secs[0] = seconds
+            self._tempos[0] = tempo
+            self._slopes[0] = slope
+        else:
+            self._beats.append(beats)
+            self._secs.append(seconds)
+            self._tempos.append(tempo)
+            self._slopes.append(slope)
+        self._arrays = None
+
+    def tempo_at(self, beats):
+        i = _bisect.bisect_right(self._beats, beats) - 1
+        if i < 0:
+            return self._tempos[0]
+        return self._tempos[i] + self._slopes[i] * (beats - self._beats[i])
+
+    def beats2secs(self, beats):
+        if _np is not None and isinstance(beats, _np.ndarray):
+            return self._beats2secs_array(beats)
+        i = _bisect.bisect_right(self._beats, beats) - 1
+        if i < 0:
+            return self._secs[0] + (beats - self._beats[0]) / self._tempos[0]
+        delta = beats - self._beats[i]
+        tempo = self._tempos[i]
+        slope = self._slopes[i]
+        if slope == 0.0:
+            return self._secs[i] + delta / tempo
+        # Integral of 1 / (tempo + slope * beats).
+        return self._secs[i] + _math.log1p(slope * delta / tempo) / slope
+
+    def secs2beats(self, seconds):
+        if _np is not None and isinstance(seconds, _np.ndarray):
+            return self._secs2beats_array(seconds)
+        i = _bisect.bisect_right(self._secs, seconds) - 1
+        if i < 0:
+            return self._beats[0] + (seconds - self._secs[0]) * self._tempos[0]
+        delta = seconds - self._secs[i]
+        tempo = self._tempos[i]
+        slope = self._slopes[i]
+        if slope == 0.0:
+            return self._beats[i] + delta * tempo
+        return self._beats[i] + tempo * _math.expm1(slope * delta) / slope
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            self._arrays = (
+                _np.array(self._beats, dtype=float),
+                _np.array(self._secs, dtype=float),
+                _np.array(self._tempos, dtype=float),
+                _np.array(self._slopes, dtype=float))
+        return self._arrays
+
+    def _segments_for(self, starts, values):
+        i = _np.searchsorted(starts, values, side='right') - 1
+        before = i < 0
+        return _np.maximum(i, 0), before
+
+    def _beats2secs_array(self, beats):
+        b0, s0, t0, k = self._get_arrays()
+        beats = beats.astype(float, copy=False)
+        i, before = self._segments_for(b0, beats)
+        delta = beats - b0[i]
+        tempo = t0[i]
+        slope = _np.where(before, 0.0, k[i])
+        ramp = slope != 0.0
+        ret = delta / tempo
+        if ramp.any():
+            ret[ramp] = _np.log1p(
+                slope[ramp] * delta[ramp] / tempo[ramp]) / slope[ramp]
+        return s0[i] + ret
+
+    def _secs2beats_array(self, seconds):
+        b0, s0, t0, k = self._get_arrays()
+        seconds = seconds.astype(float, copy=False)
+        i, before = self._segments_for(s0, seconds)
+        delta = seconds - s0[i]
+        tempo = t0[i]
+        slope = _np.where(before, 0.0, k[i])
+        ramp = slope != 0.0
+        ret = delta * tempo
+        if ramp.any():
+            ret[ramp] = tempo[ramp] * _np.expm1(
+                slope[ramp] * delta[ramp]) / slope[ramp]
+        return b0[i] + ret
+
+    def __repr__(self):
+        return f'{type(self).__name__}({len(self)} segments)'
@@ -3,6 +3,7 @@ from . buffer import *
 from . bus import *
 from . env import *
 from . node import *
+from . score import *
 from . server import *
 from . synthdef import *
 from . synthdesc import *
@@ -1,10 +1,15 @@
 """Node.sc"""
 
+import heapq
 import logging
+import threading
 
+from ..base import main as _libsc3
 from ..base import utils as utl
 from ..base import responsedefs as rdf
+from ..base import systemactions as sac
 from ..seq import stream as stm
+from ..seq import clock as clk
 from . import server as srv
 from . import synthdesc as sdc
 from . import _graphparam as gpp
@@ -110,12 +115,15 @@ class Node(gpp.NodeParameter):
         self.server.send_msg(
             '/n_set', # 15
             self.node_id,
-            *gpp.node_param(args)._as_osc_arg_list()
+            *self._control_args(args)
         )
 
     def set_msg(self, *args):
         return ['/n_set', self.node_id]\
-            + gpp.node_param(args)._as_osc_arg_list() # 15
+            + self._control_args(args) # 15
+
+    def _control_args(self, args):
+        return gpp.node_param(args)._as_osc_arg_list()
 
     def setn(self, *args):
         self.server.send_msg(*self.setn_msg(*args))
@@ -430,7 +438,18 @@ class RootNode(Group):
             rn.free_all()
 
 
+def _index_args(def_name, args):
+    desc = sdc.SynthDescLib.default.synth_descs.get(def_name)
+    if desc is not None:
+        args = desc.index_args(args)
+    return args
+
+
 class Synth(Node):
+    # If True, controls are sent by index instead of name when the
+    # SynthDesc of def_name is in SynthDescLib.default.
+    index_controls = False
+
     # /** immediately sends **/
     def __init__(self, def_name, args=None, target=None, add_action='addToHead'):
         super().__init__()
@@ -449,7 +468,7 @@ class Synth(Node):
             '/s_new', # 9
             self.def_name, self.node_id,
             add_action_id, target.node_id,
-            *gpp.node_param(args or [])._as_osc_arg_list()
+            *self._control_args(args or [])
         )
 
     # // does not send (used for bundling)
@@ -475,7 +494,7 @@ class Synth(Node):
                 '/s_new', # 9
                 synth.def_name, synth.node_id,
                 add_action_id, target.node_id,
-                *gpp.node_param(args or [])._as_osc_arg_list()
+                *synth._control_args(args or [])
             ],
             [
                 '/n_run', # 12
@@ -496,7 +515,7 @@ class Synth(Node):
             '/s_new', # 9
             synth.def_name, synth.node_id,
             4, node_to_replace.node_id, # 4 -> 'addReplace'
-            *gpp.node_param(args or [])._as_osc_arg_list()
+            *synth._control_args(args or [])
         )
         return synth
 
@@ -505,11 +524,14 @@ class Synth(Node):
     def grain(cls, def_name, args=None, target=None, add_action='addToHead'):
         target = gpp.node_param(target)._as_target()
         server = target.server
+        args = args or []
+        if cls.index_controls:
+            args = _index_args(def_name, args)
         server.send_msg(
             '/s_new', # 9
             def_name.as_def_name(), -1, # BUG: as_def_name no está implementado puede ser método de Object
             cls.add_actions[add_action], target.node_id,
-            *gpp.node_param(args or [])._as_osc_arg_list()
+            *gpp.node_param(args)._as_osc_arg_list()
         )
 
     def new_msg(self, target=None, args=None, add_action='addToHead'):
@@ -520,7 +542,7 @@ class Synth(Node):
         else:
             self.group = target.group
         return ['/s_new', self.def_name, self.node_id, add_action_id,
-                target.node_id, *gpp.node_param(args or [])._as_osc_arg_list()] # 9
+                target.node_id, *self._control_args(args or [])] # 9
 
     @classmethod
     def after(cls, node, def_name, args=None):
@@ -549,7 +571,7 @@ class Synth(Node):
         else:
             self.group = self.server.default_group
         return ['/s_new', self.def_name, self.node_id, 0,
-                self.group.node_id, *gpp.node_param(args)._as_osc_arg_list()] # 9
+                self.group.node_id, *self._control_args(args)] # 9
 
     def add_to_tail_msg(self, group, args):
         # // if aGroup is nil set to default group of server specified when basicNew was called
@@ -558,22 +580,27 @@ class Synth(Node):
         else:
             self.group = self.server.default_group
         return ['/s_new', self.def_name, self.node_id, 1,
-                self.group.node_id, *gpp.node_param(args)._as_osc_arg_list()] # 9
+                self.group.node_id, *self._control_args(args)] # 9
 
     def add_after_msg(self, node, args=None):
         self.group = node.group
         return ['/s_new', self.def_name, self.node_id, 3,
-                node.node_id, *gpp.node_param(args or [])._as_osc_arg_list()] # 9
+                node.node_id, *self._control_args(args or [])] # 9
 
     def add_before_msg(self, node, args=None):
         self.group = node.group
         return ['/s_new', self.def_name, self.node_id, 2,
-                node.node_id, *gpp.node_param(args or [])._as_osc_arg_list()] # 9
+                node.node_id, *self._control_args(args or [])] # 9
 
     def add_replace_msg(self, node_to_replace, args):
         self.group = node_to_replace.group
         return ['/s_new', self.def_name, self.node_id, 4,
-                node_to_replace.node_id, *gpp.node_param(args)._as_osc_arg_list()] # 9
+                node_to_replace.node_id, *self._control_args(args)] # 9
+
+    def _control_args(self, args):
+        if self.index_controls:
+            args = _index_args(self.def_name, args)
+        return gpp.node_param(args)._as_osc_arg_list()
 
     def get(self, index, action):
         raise Exception('implementar Synth:get con OSCFunc') # BUG
@@ -610,3 +637,125 @@ class Synth(Node):
 
     # TODO, VER
     #printOn
+
+
+class ReleaseScheduler():
+    '''
+    Pending gate releases of the nodes of a server. Releases within
+    window seconds from the earliest one are sent as one bundle, latency
+    seconds ahead from SystemClock, that contains a nested bundle for each
+    time so every gate closes at its own time. The release of a node is
+    cancelled when the server reports that the node ended (/n_end).
+    '''
+
+    window = 0.001
+    _all = dict()
+
+    def __init__(self, server):
+        self._server = server
+        self._queue = []  # Heap of [time, count, node_id, gate].
+        self._pending = dict()  # node_id: entry.
+        self._count = 0
+        self._flushes = set()  # Times of the scheduled flushes.
+        self._lock = threading.Lock()
+        self._responder = rdf.OSCFunc(self._n_end, '/n_end', server.addr)
+        self._responder.permanent = True
+
+    @classmethod
+    def for_server(cls, server):
+        try:
+            return cls._all[server]
+        except KeyError:
+            if not cls._all:
+                sac.CmdPeriod.add(cls.cmd_period)
+            obj = cls._all[server] = cls(server)
+            return obj
+
+    @classmethod
+    def cmd_period(cls):
+        # SystemClock was cleared and the nodes freed.
+        for obj in list(cls._all.values()):
+            obj.clear()
+
+    @property
+    def server(self):
+        return self._server
+
+    def add(self, node_id, time, gate='gate'):
+        '''
+        Release node_id at time, in logical seconds, by setting gate to 0,
+        gate can also be the control index.
+        '''
+        flush_time = time - (self._server.latency or 0)
+        with self._lock:
+            entry = [time, self._count, node_id, gate]
+            self._count += 1
+            prev = self._pending.get(node_id)
+            if prev is not None:
+                prev[2] = None
+            self._pending[node_id] = entry
+            heapq.heappush(self._queue, entry)
+            if self._flushes and min(self._flushes) <= flush_time:
+                return
+            self._flushes.add(flush_time)
+        self._sched_flush(flush_time)
+
+    def cancel(self, node_id):
+        with self._lock:
+            entry = self._pending.pop(node_id, None)
+            if entry is not None:
+                entry[2] = None
+
+    def clear(self):
+        with self._lock:
+            self._queue = []
+            self._pending = dict()
+            self._flushes = set()
+
+    def pending(self, node_id):
+        return node_id in self._pending
+
+    def _n_end(self, msg, *_):
+        self.cancel(msg[1])
+
+    def _sched_flush(self, flush_time):
+        clk.SystemClock.sched_abs(flush_time, lambda: self._flush(flush_time))
+
+    def _flush(self, flush_time):
+        latency = self._server.latency or 0
+        now = _libsc3.main.current_tt.seconds
+        bundles = []
+        next_flush = None
+        with self._lock:
+            self._flushes.discard(flush_time)
+            queue = self._queue
+            while queue and queue[0][0] - latency <= now:
+                end = queue[0][0] + self.window
+                group = []
+                while queue and queue[0][0] <= end:
+                    time = queue[0][0]
+                    msgs = []
+                    while queue and queue[0][0] == time:
+                        _, _, node_id, gate = heapq.heappop(queue)
+                        if node_id is not None:
+                            del self._pending[node_id]
+                            msgs.append(['/n_set', node_id, gate, 0]) # 15
+                    if msgs:
+                        group.append((time, msgs))
+                if group:
+                    bundles.append(group)
+            # There is always a flush scheduled before the first release.
+            if queue:
+                next_flush = queue[0][0] - latency
+                if self._flushes and min(self._flushes) <= next_flush:
+                    next_flush = None
+                else:
+                    self._flushes.add(next_flush)
+        if next_flush is not None:
+            self._sched_flush(next_flush)
+        osc = _libsc3.main._osc_interface
+        for group in bundles:
+            time, msgs = group[0]
+            if len(group) > 1:
+                msgs = [[osc.timetag(t), *m] for t, m in group]
+            self._server.send_bundle(time - now, *msgs)
@@ -0,0 +1,157 @@
+"""Score.sc"""
+
+import heapq as _heapq
+import struct as _struct
+
+from ..base import main as _libsc3
+from ..base import _oscinterface as osci
+
+
+__all__ = ['Score', 'ScoreWriter']
+
+
+def _bundle_dgram(bundle):
+    # [time, ['/path', arg1, ..., argN], ...], time in seconds from zero.
+    time = int(bundle[0] * 4294967296)  # 2 ** 32, same as SystemClock.
+    return osci.build_bundle([time, *(
+        msg if isinstance(msg, bytes) else list(msg)
+        for msg in bundle[1:])]).dgram
+
+
+def _write_bundle(file, bundle):
+    # scsynth -N command file format, each bundle is preceded
+    # by its size as a big endian int32.
+    dgram = _bundle_dgram(bundle)
+    file.write(_struct.pack('>i', len(dgram)))
+    file.write(dgram)
+
+
+class Score():
+    '''
+    List of timed bundles to be rendered by scsynth in nrt mode.
+
+    Each bundle is a list [time, msg1, msg2, ..., msgN] where time is in
+    seconds and messages are lists ['/path', arg1, arg2, ..., argN].
+    While the library is in nrt mode everything sent with NetAddr
+    (and thus Server) is recorded in main.nrt_score.
+    '''
+
+    def __init__(self, lst=None):
+        self._score = [] if lst is None else [list(b) for b in lst]
+
+    @property
+    def score(self):
+        return self._score
+
+    def add(self, bundle):
+        self._score.append(bundle)
+
+    def sort(self):
+        # Stable, bundles at the same time keep the order they were added.
+        self._score.sort(key=lambda bundle: bundle[0])
+
+    def clear(self):
+        self._score.clear()
+
+    @property
+    def start_time(self):
+        return min(b[0] for b in self._score) if self._score else 0.0
+
+    @property
+    def end_time(self):
+        return max(b[0] for b in self._score) if self._score else 0.0
+
+    def write_osc_file(self, path):
+        '''Sort and write the score as a binary command file for scsynth -N.'''
+        self.sort()
+        with open(path, 'wb') as file:
+            for bundle in self._score:
+                _write_bundle(file, bundle)
+
+    def __len__(self):
+        return len(self._score)
+
+    def __iter__(self):
+        return iter(self._score)
+
+    def __getitem__(self, index):
+        return self._score[index]
+
+    def __repr__(self):
+        return f'{type(self).__name__}({len(self._score)} bundles)'
+
+
+class ScoreWriter():
+    '''
+    Write bundles to a scsynth binary command file as logical time advances.
+
+    Bundles are kept in a heap until current logical time is horizon
+    seconds past them, then they are written in time order, so long nrt
+    renders don't need to hold the whole score in memory. A bundle that
+    comes later than that with an earlier time (e.g. from a negative
+    latency) is written as it comes and the file is sorted on close. Call
+    close (or use it as a context manager) to write the remaining bundles.
+    '''
+
+    def __init__(self, path, horizon=1.0):
+        self._path = path
+        self._file = open(path, 'wb')
+        self._heap = []
+        self._count = 0  # Keeps insertion order for bundles at the same time.
+        self.horizon = horizon
+        self._last_time = None  # Time of the last written bundle.
+        self._unsorted = False
+
+    @property
+    def path(self):
+        return self._path
+
+    def add(self, bundle):
+        _heapq.heappush(self._heap, (bundle[0], self._count, bundle))
+        self._count += 1
+        self.flush(_libsc3.main.current_tt.seconds - self.horizon)
+
+    def flush(self, until=None):
+        '''Write pending bundles up to until seconds, all if None.'''
+        heap = self._heap
+        while heap and (until is None or heap[0][0] <= until):
+            time, _, bundle = _heapq.heappop(heap)
+            if self._last_time is not None and time < self._last_time:
+                self._unsorted = True
+            else:
+                self._last_time = time
+            _write_bundle(self._file, bundle)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        if self._unsorted:
+            self._sort_file()
+
+    def _sort_file(self):
+        # Stable by timetag, the first 8 bytes of a bundle are '#bundle\0'.
+        with open(self._path, 'rb') as file:
+            data = file.read()
+        records = []
+        i = 0
+        while i < len(data):
+            size, = _struct.unpack('>i', data[i:i+4])
+            record = data[i:i+4+size]
+            records.append((_struct.unpack('>Q', record[12:20])[0], record))
+            i += 4 + size
+        records.sort(key=lambda record: record[0])
+        with open(self._path, 'wb') as file:
+            for _, record in records:
+                file.write(record)
+        self._unsorted = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return len(self._heap)
@@ -322,6 +322,7 @@ class Server(gpp.NodeParameter, metaclass=MetaServer):
         self.options = options or ServerOptions()
         self.latency = 0.2
         self.dump_mode = 0
+        self._bundle_local = _threading.local()  # Used by make_bundle.
 
         # NOTE: Estos valores se inicializan al llamar self.client_id = x abajo.
         # self.node_allocator = None # se inicializa en new_node_allocators
@@ -573,10 +574,38 @@ class Server(gpp.NodeParameter, metaclass=MetaServer):
     ### network messages ###
 
     def send_msg(self, *args):
-        self.addr.send_msg(*args)
+        bundle = getattr(self._bundle_local, 'bundle', None)
+        if bundle is None:
+            self.addr.send_msg(*args)
+        else:
+            bundle.append(list(args))
 
     def send_bundle(self, time, *args):
-        self.addr.send_bundle(time, *args)
+        bundle = getattr(self._bundle_local, 'bundle', None)
+        if bundle is None:
+            self.addr.send_bundle(time, *args)
+        else:
+            bundle.extend(args)
+
+    def make_bundle(self, time, func, bundle=None):
+        '''
+        Evaluate func(server) and send the messages it sends to this
+        server from the calling thread together in one bundle at time
+        (latency in seconds, None is now). If time is False the bundle
+        is not sent. Return the bundle as a list of messages.
+        '''
+        # In sclang addr is replaced by a BundleNetAddr, here collection
+        # is by thread so other clocks can send to the server meanwhile.
+        local = self._bundle_local
+        prev_bundle = getattr(local, 'bundle', None)
+        local.bundle = bundle = [] if bundle is None else bundle
+        try:
+            fn.value(func, self)
+        finally:
+            local.bundle = prev_bundle
+        if time is not False and bundle:
+            self.addr.send_bundle(time, *bundle)
+        return bundle
 
     # def send_raw(self, raw_bytes): # send a raw message without timestamp to the addr.
     #    self.addr.send_raw(raw_bytes)
@@ -83,6 +83,8 @@ class SynthDesc():
         self.has_gate = False
         self.has_array_args = None
         self.has_variants = False
+        self.msg_controls = ()  # (control name, event key) pairs set by make_msg_func.
+        self._encoders = dict()  # Event encoders, see event.py.
         # self.can_free_synth = False  # Non core interface, see note in SynthDef.
         self._msg_func_keep_gate = False # @property
 
@@ -321,6 +323,8 @@ class SynthDesc():
                 "Patterns will not detect argument names automatically because "
                 "of the duplicate name(s)")
             self.msg_func = None
+            self.msg_controls = None
+            self._encoders.clear()
             return
 
         # comma = False
@@ -367,6 +371,7 @@ class SynthDesc():
         suffix = hex(hash(self) & 0xFFFFFFFF) # 32 bits positive
         string = 'def sdesc_' + suffix + '(event):\n' # NOTE: es una función que se asigna a una llave de Event, que se evalúa/llama con valueEnvir en 'note', acá se necesita self al evaluarse como método al llamar a la llave con __getattr__ para tener los parámetros del evento.
         string += '    ret = []\n'
+        msg_controls = []
 
         for i, cname in enumerate(self.controls):
             name = cname.name
@@ -379,8 +384,13 @@ class SynthDesc():
                     string += "    if hasattr(event, '" + name2 + "'):\n" # NOTE: antes era None porque eran los argumentos de valueEnvir.
                     string += "        ret.append('" + name + "')\n"
                     string += "        ret.append(event.value('" + name2 + "'))\n"
+                    msg_controls.append((name, name2))
                     names_count += 1
         string += '    return ret\n'
+
+        # The encoders compiled by events depend on the controls.
+        self.msg_controls = tuple(msg_controls)
+        self._encoders.clear()
         string += 'self.msg_func = sdesc_' + suffix
 
         print('*** SynthDesc msg_func:'); print(string)
@@ -389,6 +399,28 @@ class SynthDesc():
         if names_count > 0:
             exec(string)
 
+    def control_index(self, name):
+        '''Return the index of the control name or None if not found.'''
+        if self.control_dict is None:
+            return None
+        cname = self.control_dict.get(name)
+        if cname is None:
+            return None
+        return cname.index
+
+    def index_args(self, args):
+        '''
+        Return a list of the name and value pairs of args with the names of
+        the controls replaced by their index, other names are not changed.
+        '''
+        args = list(args)
+        for i in range(0, len(args) - 1, 2):
+            if isinstance(args[i], str):
+                index = self.control_index(args[i])
+                if index is not None:
+                    args[i] = index
+        return args
+
     @property
     def msg_func_keep_gate(self):
         return self._msg_func_keep_gate
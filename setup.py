@@ -17,9 +17,9 @@ setuptools.setup(
     packages=['sc3', 'sc3.base',
               'sc3.seq', 'sc3.seq.patterns',
               'sc3.synth', 'sc3.synth.ugens'],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     classifiers=[
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
         'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
         'Operating System :: OS Independent',
         'Development Status :: 1 - Planning',
@@ -0,0 +1,259 @@
+import unittest
+import asyncio
+import threading
+import time
+from fractions import Fraction
+
+from sc3.all import *
+from sc3.seq.clock import AsyncioClock, TaskQueue
+
+
+class TaskQueueTestCase(unittest.TestCase):
+    def test_batch(self):
+        queue = TaskQueue()
+        for i, t in enumerate([2, 1, 1, 3, 1]):
+            queue.add(t, i)
+        queue.remove(2)
+        self.assertEqual(queue.pop_batch(), (1, [1, 4]))
+        queue.add_batch([(2, 1), (0.5, 3), (2, 4)])
+        self.assertEqual(queue.pop_batch(), (0.5, [3]))
+        self.assertEqual(queue.pop_batch(), (2, [0, 1, 4]))
+        self.assertTrue(queue.empty())
+
+
+class BatchWakeupTestCase(unittest.TestCase):
+    def test_simultaneous(self):
+        result = []
+        clock = TempoClock(50)
+
+        def make_rout(i):
+            @routine
+            def rout():
+                for _ in range(2):
+                    result.append((i, clock.beats, main.current_tt.seconds))
+                    yield 1
+            return rout
+
+        beat = clock.beats + 1
+        for i in range(4):
+            clock.sched_abs(beat, make_rout(i))
+        time.sleep(0.2)
+        clock.stop()
+        self.assertEqual([r[0] for r in result], [0, 1, 2, 3] * 2)
+        self.assertEqual(len(set(r[1] for r in result)), 2)
+        self.assertEqual(len(set(r[2] for r in result)), 2)
+
+
+class ParallelClocksTestCase(unittest.TestCase):
+    def test_independent_clocks(self):
+        result = []
+        slow = TempoClock(10)
+        fast = TempoClock(100)
+
+        @routine
+        def slow_rout():
+            time.sleep(0.3)  # Blocks only its own clock.
+            yield 1
+
+        @routine
+        def fast_rout():
+            for i in range(20):
+                result.append((main.current_tt is fast_rout, fast.beats))
+                yield 1
+
+        slow.sched(0, slow_rout)
+        fast.sched(2, fast_rout)
+        time.sleep(0.25)
+        self.assertGreater(len(result), 10)
+        self.assertTrue(all(r[0] for r in result))
+        self.assertIs(main.current_tt, main.main_tt)
+        time.sleep(0.1)
+        slow.stop()
+        fast.stop()
+
+
+class InboxTestCase(unittest.TestCase):
+    def test_cross_thread_sched(self):
+        result = []
+        clock = TempoClock(10)
+
+        def producer(n):
+            for i in range(50):
+                delta = (50 - i) * 0.002  # Each one earlier than the last.
+                for c in (SystemClock, AppClock):
+                    c.sched(delta, lambda: result.append(1))
+                clock.sched(delta * 10, lambda: result.append(1))
+
+        threads = [threading.Thread(target=producer, args=(n,))
+                   for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        time.sleep(0.3)
+        self.assertEqual(len(result), 600)
+        clock.stop()
+
+    def test_cross_thread_tempo(self):
+        clock = TempoClock(1)
+        timebases = {clock._timebase}
+        done = threading.Event()
+
+        def producer():
+            for i in range(200):
+                clock.tempo = 1 + i % 3
+                timebases.add(clock._timebase)
+            done.set()
+
+        values = []
+        thread = threading.Thread(target=producer)
+        thread.start()
+        while not done.is_set():
+            values.append(clock.beats2secs(100))
+        thread.join()
+        # Each conversion used one consistent timebase.
+        expected = [(100 - b) * d + s for _, d, s, b in timebases]
+        for secs in values:
+            self.assertTrue(any(abs(x - secs) < 1e-9 for x in expected))
+        tempo, beat_dur, _, _ = clock._timebase
+        self.assertEqual((clock.tempo, clock.beat_dur()), (tempo, beat_dur))
+        clock.stop()
+
+
+class AsyncioClockTestCase(unittest.TestCase):
+    def test_routine_and_wait(self):
+        result = []
+
+        async def run():
+            clock = AsyncioClock(tempo=20)
+
+            @routine
+            def rout():
+                for i in range(3):
+                    result.append(('rout', clock.beats))
+                    yield 1
+
+            clock.sched(0, rout)
+            beats = []
+            for i in range(3):
+                beats.append(await clock.wait(1))
+            await asyncio.sleep(0.1)
+            clock.stop()
+            await asyncio.sleep(0)
+            return clock, beats
+
+        clock, beats = asyncio.run(run())
+        self.assertEqual(len(result), 3)
+        self.assertEqual([b - beats[0] for b in beats], [0, 1, 2])
+        self.assertFalse(clock.running())
+        self.assertNotIn(clock, TempoClock.all)
+        self.assertIsInstance(clock, TempoClock)
+
+    def test_threads(self):
+        with self.assertRaises(RuntimeError):
+            AsyncioClock()
+        result = []
+
+        async def run():
+            clock = AsyncioClock(tempo=20)
+            clock.sched(1, lambda: result.append('late'))
+            thread = threading.Thread(target=clock.clear)
+            thread.start()
+            thread.join()
+            thread = threading.Thread(
+                target=lambda: clock.sched(0, lambda: result.append('now')))
+            thread.start()
+            thread.join()
+            await asyncio.sleep(0.1)
+            clock.stop()
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        self.assertEqual(result, ['now'])
+
+
+class NrtSchedulingTestCase(unittest.TestCase):
+    def setUp(self):
+        main.nrt()
+
+    def tearDown(self):
+        main.rt()
+
+    def test_logical_time_order(self):
+        result = []
+        clock = TempoClock(2)
+
+        @routine
+        def rout1():
+            for i in range(3):
+                result.append(('t', clock.beats, main.current_tt.seconds))
+                yield 1
+
+        @routine
+        def rout2():
+            for i in range(2):
+                result.append(('s', main.current_tt.seconds))
+                yield 0.75
+
+        start = main.current_tt.seconds
+        clock.sched(0, rout1)
+        SystemClock.sched(0, rout2)
+        main.run_nrt(start + 0.5)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(main.main_tt.seconds, start + 0.5)
+        main.run_nrt()
+        self.assertEqual([x[-1] - start for x in result],
+                         [0, 0, 0.5, 0.75, 1.0])
+        clock.stop()
+        self.assertFalse(clock.running())
+
+
+class RationalTimeTestCase(unittest.TestCase):
+    def setUp(self):
+        main.nrt()
+
+    def tearDown(self):
+        main.rt()
+
+    def test_rational_beats(self):
+        result = []
+        clock = TempoClock(3)
+        clock.rational = True
+
+        @routine
+        def rout(beats):  # Awake beats are the exact scheduled beats.
+            for i in range(3001):
+                result.append(beats)
+                beats = yield 1 / 3 if i % 2 else Fraction(1, 3)
+
+        clock.sched(0, rout)
+        main.run_nrt()
+        self.assertIsInstance(result[-1], Fraction)
+        self.assertEqual(result[-1] - result[0], 1000)
+        clock.stop()
+
+    def test_snap(self):
+        from sc3.seq.clock import _rational
+        for value, expected in [(1 / 3, Fraction(1, 3)),
+                                (0.1 + 0.2, Fraction(3, 10)),
+                                (2.375, Fraction(19, 8)),
+                                (1000 + 1 / 7, Fraction(7001, 7)),
+                                (0.0, 0)]:
+            self.assertEqual(_rational(value), expected)
+            self.assertIsInstance(_rational(value), Fraction)
+        for value in [1 / 11, 0.123456789, 1e-13, 1 / 3 + 1e-10,
+                      1 / 3 * (1 + 1e-11), float('inf'), 3, Fraction(1, 11)]:
+            self.assertIs(_rational(value), value)
+
+    def test_osc_time(self):
+        offset = SystemClock.elapsed_time_to_osc(0)
+        self.assertEqual(
+            SystemClock.elapsed_time_to_osc(Fraction(1, 3)) - offset,
+            2 ** 32 // 3)
+        self.assertEqual(SystemClock.elapsed_time_to_osc(2) - offset, 2 ** 33)
+        self.assertEqual(
+            SystemClock.elapsed_time_to_osc(0.25) - offset, 2 ** 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import os
+import subprocess
+import sys
+import time
+
+from sc3.all import *
+from sc3.seq.clocksync import ClockSync
+
+
+PEER = '''
+import sys, time
+from sc3.all import *
+from sc3.seq.clocksync import ClockSync
+clock = TempoClock(1)
+sync = ClockSync(clock, port=int(sys.argv[1]))
+sync.start()
+time.sleep(0.5)
+clock.tempo = 2
+time.sleep(2)
+print(time.time(), clock.secs2beats(main.elapsed_time()), clock.tempo)
+sync.stop()
+'''
+
+
+class ClockSyncTestCase(unittest.TestCase):
+    def test_two_processes(self):
+        port = 57400
+        clock = TempoClock(1, 100)
+        sync = ClockSync(clock, port=port)
+        sync.start()
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)))
+        out = subprocess.run(
+            [sys.executable, '-c', PEER, str(port)], env=env,
+            capture_output=True, text=True, timeout=30).stdout
+        wall, beats, tempo = map(float, out.split()[-3:])
+        now = main.elapsed_time() - (time.time() - wall)
+        self.assertEqual(sync.peers, 1)
+        self.assertAlmostEqual(clock.tempo, tempo, delta=tempo * 0.05)
+        self.assertAlmostEqual(clock.secs2beats(now), beats, delta=0.05)
+        sync.stop()
+        clock.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,338 @@
+import math
+import unittest
+
+from sc3.all import *
+from sc3.base import _osclib as oli
+from sc3.seq import event as evt
+from sc3.seq import scale as scl
+from sc3.synth import score as scr
+from sc3.seq.patterns.listpatterns import Pseq, Prand, Ppar
+
+
+@synthdef
+def test_event_sine(freq=440, amp=0.1, pan=0, gate=1, t_trig=1, i_out=0):
+    env = EnvGen.kr(Env.adsr(), gate, done_action=2)
+    Out.ar(i_out, Pan2.ar(SinOsc.ar(freq) * amp * env, pan))
+
+
+class PitchKeysTestCase(unittest.TestCase):
+    def test_resolve(self):
+        pitch = evt.PitchKeys({'degree': 2, 'octave': 4})
+        self.assertIsNone(pitch._resolved_midinote)
+        self.assertEqual(pitch.midinote, 52)
+        self.assertEqual(pitch.freq, bi.midicps(52))
+        self.assertEqual(pitch._resolved_freq, bi.midicps(52))
+        pitch.root = 1
+        self.assertIsNone(pitch._resolved_freq)
+        self.assertEqual(pitch.midinote, 53)
+        pitch.freq = 100
+        self.assertEqual(pitch.freq, 100)
+        self.assertAlmostEqual(pitch.midinote, bi.cpsmidi(100))
+        pitch.degree = -1
+        self.assertEqual(pitch.midinote, 48)
+
+    def test_scale_in_place(self):
+        scale = scl.Scale('major')
+        pitch = evt.PitchKeys({'degree': 1, 'scale': scale})
+        self.assertEqual(pitch.midinote, 62)
+        freq = pitch.freq
+        scale[1] = 1
+        self.assertEqual(pitch.midinote, 61)
+        self.assertEqual(pitch.freq, bi.midicps(61))
+        self.assertNotEqual(pitch.freq, freq)
+        pitch.octave = 6
+        self.assertEqual(pitch.midinote, 73)
+        self.assertEqual(pitch._resolved_midinote, 73)
+        scale.tuning.octave_ratio = 3.0
+        self.assertAlmostEqual(pitch.midinote, 61 + 12 * math.log2(3.0))
+        version = scale.version
+        scale.tuning = scl.Tuning.et(12)
+        self.assertNotEqual(scale.version, version)
+        self.assertEqual(pitch.midinote, 73)
+
+    def test_scale(self):
+        scale = scl.Scale()
+        for degree in range(-10, 10):
+            key = scale.degree_to_key(degree)
+            self.assertEqual(
+                scale.degree_to_midinote(degree, 3, 0.5), key + 36.5)
+
+
+class SNewEncoderTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.desc = test_event_sine.as_synthdesc()
+
+    def setUp(self):
+        main.nrt()
+        self.prev_score = main.nrt_score
+        main.nrt_score = self.score = Score()
+        self.desc._encoders.clear()
+        ReleaseScheduler.for_server(Server.default).clear()
+
+    def tearDown(self):
+        main.nrt_score = self.prev_score
+        main.rt()
+
+    def note(self, **keys):
+        if not {'degree', 'midinote', 'freq'} & set(keys):
+            keys['degree'] = 0
+        return evt.NoteType({'instrument': 'test_event_sine', **keys})
+
+    def test_msg(self):
+        self.note(degree=2, trig=0.5, foo=1).play()
+        main.run_nrt()
+        msg = self.score[0][1]
+        self.assertEqual(msg[:2], ['/s_new', 'test_event_sine'])
+        self.assertEqual(
+            msg[5:], ['freq', bi.midicps(64), 'amp', 0.1, 'pan', 0.0,
+                      't_trig', 0.5, 'i_out', 0])
+        self.assertEqual(self.score[1][1][2:], ['gate', 0])
+
+    def test_cache(self):
+        self.note().play()
+        self.note(pan=1).play()
+        self.assertEqual(len(self.desc._encoders), 1)
+        self.note(freq=220, out=1).play()
+        self.assertEqual(len(self.desc._encoders), 1)
+        self.note(foo=1).play()
+        self.assertEqual(len(self.desc._encoders), 2)
+        msgs = [b[1] for b in self.score if b[1][0] == '/s_new']
+        self.assertEqual(msgs[2][5:7], ['freq', 220])
+
+    def test_dgram(self):
+        note = self.note(midinote=69, amp=0.25)
+        note.server.server = Server.default
+        encoder = note.server._get_encoder(note)
+        main.rt()
+        try:
+            dgram = encoder.encode(note, 'test_event_sine', 1000, 0, 1)
+            fallback = encoder.encode(note, 'test_event_sine', 1000, 0, None)
+        finally:
+            main.nrt()
+        self.assertIsInstance(dgram, bytes)
+        msg = oli.OscMessage(dgram)
+        self.assertEqual(msg.address, '/s_new')
+        self.assertEqual(
+            msg.params, ['test_event_sine', 1000, 0, 1, 'freq', 440.0,
+                         'amp', 0.25, 'pan', 0.0, 't_trig', 0.5, 'i_out', 0.0])
+        self.assertIsInstance(fallback, list)
+
+    def test_index_controls(self):
+        self.note(degree=2, pan=-1, index_controls=True).play()
+        main.run_nrt()
+        msgs = [b[1] for b in self.score]
+        self.assertEqual(
+            msgs[0][5:], [0, bi.midicps(64), 1, 0.1, 2, -1, 4, 0.5, 5, 0])
+        self.assertEqual(msgs[1][2:], [3, 0])
+        note = self.note(midinote=69, index_controls=True)
+        note.server.server = Server.default
+        encoder = note.server._get_encoder(note)
+        main.rt()
+        try:
+            dgram = encoder.encode(note, 'test_event_sine', 1000, 0, 1)
+        finally:
+            main.nrt()
+        self.assertEqual(
+            oli.OscMessage(dgram).params[4:],
+            [0, 440.0, 1, 0.10000000149011612, 2, 0.0, 4, 0.5, 5, 0.0])
+
+
+class ReleaseSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        main.nrt()
+        self.prev_score = main.nrt_score
+        main.nrt_score = self.score = Score()
+        self.server = Server.default
+        self.releases = ReleaseScheduler.for_server(self.server)
+        self.releases.clear()
+        self.latency = self.server.latency
+
+    def tearDown(self):
+        main.nrt_score = self.prev_score
+        main.rt()
+
+    def test_bundles(self):
+        start = main.current_tt.seconds
+        for i, sustain in enumerate([1, 0.5, 1, 1.0005, 2]):
+            self.releases.add(1000 + i, start + sustain)
+        main.run_nrt()
+        def contents(bundle):
+            # Nested bundles have timetags.
+            return [(round(x[0] / 2 ** 32 - start, 6), x[1:])
+                    if isinstance(x[0], int) else x for x in bundle[1:]]
+        self.assertEqual(
+            [(round(b[0] - start, 6), contents(b)) for b in self.score],
+            [(0.5, [['/n_set', 1001, 'gate', 0]]),
+             (1, [(1, [['/n_set', 1000, 'gate', 0],
+                       ['/n_set', 1002, 'gate', 0]]),
+                  (1.0005, [['/n_set', 1003, 'gate', 0]])]),
+             (2, [['/n_set', 1004, 'gate', 0]])])
+        dgram = scr._bundle_dgram(self.score[1])
+        self.assertEqual(scr._bundle_dgram(self.score[1]), dgram)  # Not popped.
+        self.assertFalse(self.releases.pending(1000))
+
+    def test_cancel(self):
+        start = main.current_tt.seconds
+        self.releases.add(1000, start + 1)
+        self.releases.add(1001, start + 1)
+        self.releases.add(1002, start + 3)
+        self.assertTrue(self.releases.pending(1000))
+        Node.basic_new(self.server, 1001).free(False)  # Not ended yet.
+        self.releases._n_end(['/n_end', 1000, 1, -1, -1, 0])
+        self.releases.cancel(1002)
+        main.run_nrt()
+        self.assertEqual(
+            [b[1:] for b in self.score], [[['/n_set', 1001, 'gate', 0]]])
+
+    def test_ahead(self):
+        start = main.current_tt.seconds
+        sizes = []
+        self.releases.add(1000, start + 1)
+        for delta in [-1.5, -0.5]:
+            SystemClock.sched_abs(
+                start + 1 + delta * self.latency,
+                lambda: sizes.append(len(self.score)))
+        main.run_nrt()
+        self.assertEqual(sizes, [0, 1])
+        self.assertEqual(self.score[0][0] - start, 1)
+
+
+class RenderVoicesTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        test_event_sine.as_synthdesc()
+
+    def setUp(self):
+        main.nrt()
+
+    def tearDown(self):
+        main.rt()
+
+    def voices(self):
+        return [
+            Pbind('instrument', 'test_event_sine',
+                  'degree', Prand(list(range(7)), 6), 'dur', 0.5),
+            Pbind('instrument', 'test_event_sine',
+                  'degree', Pseq([0, Rest(), 4]), 'dur', 0.75)]
+
+    def test_not_pickled(self):
+        voices = self.voices()
+        voices[0].unpicklable = lambda: None
+        score = render_voices(voices, proto_event={'foo': lambda: None})
+        self.assertEqual([b[1][0] for b in score].count('/s_new'), 8)
+        main.rt()
+        with self.assertRaises(RuntimeError):
+            render_voices(voices)
+
+    def test_merge(self):
+        score = render_voices(self.voices(), seed=1, max_workers=2)
+        times = [b[0] for b in score]
+        self.assertEqual(times, sorted(times))
+        ids = [b[1][2] for b in score if b[1][0] == '/s_new']
+        self.assertEqual(len(ids), 8)
+        self.assertEqual(len(set(ids)), 8)
+        gates = [b[1][1] for b in score if b[1][0] == '/n_set']
+        self.assertEqual(sorted(gates), sorted(ids))
+        score = render_voices(self.voices(), 1, seed=1)
+        self.assertEqual(
+            [b[1][0] for b in score].count('/s_new'), 4)  # 0, 0.5, 1 and 0.
+        self.assertEqual(len(render_voices([])), 0)
+
+    def test_seed(self):
+        score = render_voices(self.voices(), seed=1)
+        self.assertEqual(render_voices(self.voices(), seed=1).score,
+                         score.score)
+        self.assertNotEqual(render_voices(self.voices(), seed=2).score,
+                            score.score)
+
+
+class EventStreamPlayerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        test_event_sine.as_synthdesc()
+
+    def setUp(self):
+        main.nrt()
+        self.prev_score = main.nrt_score
+        main.nrt_score = self.score = Score()
+        ReleaseScheduler.for_server(Server.default).clear()
+        self.clock = TempoClock()
+
+    def tearDown(self):
+        self.clock.stop()
+        main.nrt_score = self.prev_score
+        main.rt()
+
+    def play(self, batch, quant=None):
+        pattern = Ppar([
+            Pbind('instrument', 'test_event_sine',
+                  'degree', Pseq([i, Rest(), i]), 'dur', 1)
+            for i in range(3)])
+        start = main.current_tt.seconds
+        player = pattern.play(self.clock, quant=quant, batch=batch)
+        main.run_nrt()
+        self.assertTrue(player.stream_has_ended)
+        return [(round(b[0] - start, 6), [m[0] for m in b[1:]])
+                for b in self.score if b[1][0] == '/s_new']
+
+    def test_batch(self):
+        self.assertEqual(
+            self.play(True), [(0.2, ['/s_new'] * 3), (2.2, ['/s_new'] * 3)])
+
+    def test_single(self):
+        self.assertEqual(
+            self.play(False), [(0.2, ['/s_new'])] * 3 + [(2.2, ['/s_new'])] * 3)
+
+    def test_timing_offset(self):
+        # The player starts earlier on the grid and events are sent later.
+        quant = Quant(4, 1, 0.5)
+        self.assertEqual(
+            self.play(True, quant),
+            [(1.2, ['/s_new'] * 3), (3.2, ['/s_new'] * 3)])
+        self.assertEqual(quant.timing_offset, 0.5)
+        self.score.clear()
+        quant = Quant(4, 1)
+        player = Pbind('instrument', 'test_event_sine', 'dur', 1).play(
+            self.clock, {'timing_offset': 0.5}, quant)
+        self.assertEqual(quant.timing_offset, 0.5)
+        player.stop()
+
+    def test_timing_offset_single(self):
+        self.assertEqual(
+            self.play(False, Quant(4, 1, 0.5)),
+            [(1.2, ['/s_new'])] * 3 + [(3.2, ['/s_new'])] * 3)
+
+    def test_make_bundle(self):
+        server = Server.default
+        start = main.current_tt.seconds
+        bundle = server.make_bundle(
+            0.1, lambda s: (s.send_msg('/n_free', 1000),
+                            s.send_bundle(1, ['/n_free', 1001])))
+        self.assertEqual(bundle, [['/n_free', 1000], ['/n_free', 1001]])
+        self.assertEqual(server.make_bundle(False, lambda: None), [])
+        server.make_bundle(False, lambda s: s.send_msg('/n_free', 1002))
+        self.assertEqual(
+            list(self.score), [[start + 0.1, *bundle]])
+
+
+class SynthIndexControlsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        test_event_sine.as_synthdesc()
+
+    def test_msg(self):
+        synth = Synth.basic_new('test_event_sine')
+        args = ['amp', 0.2, 'foo', 1, 'i_out', 2]
+        self.assertEqual(synth.set_msg(*args)[2:], args)
+        synth.index_controls = True
+        self.assertEqual(synth.set_msg(*args)[2:], [1, 0.2, 'foo', 1, 5, 2])
+        self.assertEqual(
+            synth.new_msg(None, ['freq', 220])[5:], [0, 220])
+        synth = Synth.basic_new('unknown')
+        synth.index_controls = True
+        self.assertEqual(synth.set_msg('amp', 0.2)[2:], ['amp', 0.2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+from sc3.all import *
+from sc3.base import functions as fn
+from sc3.base.functions import function
+from sc3.seq import stream as stm
+from sc3.seq.patterns.listpatterns import Pseq
+
+
+class StreamFusionTestCase(unittest.TestCase):
+    def test_values(self):
+        s = (stream(Pseq([60, 62, 64])) * 2 - 60).midicps()
+        self.assertEqual(
+            s.all(), [bi.midicps(x * 2 - 60) for x in [60, 62, 64]])
+
+    def test_order(self):
+        log = []
+
+        def make(name):
+            def rout():
+                for i in range(3):
+                    log.append(name)
+                    yield i
+            return Routine(rout)
+
+        a, b, c = make('a'), make('b'), make('c')
+        s = -(a + (b * c)) - 1
+        self.assertEqual(s.next(), -1)
+        self.assertEqual(log, ['a', 'b', 'c'])
+        self.assertEqual(s.next(), -3)
+        self.assertEqual(s.next(), -7)
+        with self.assertRaises(StopStream):
+            s.next()
+
+    def test_shared_stream(self):
+        s = stream(Pseq([1, 2, 3, 4]))
+        self.assertEqual((s + s).all(), [3, 7])
+
+    def test_dispatch(self):
+        @function
+        def f(x):
+            return x
+
+        s = (stream(Pseq([60, f, 2.5])) + 1).midicps().clip(0, 1000)
+        self.assertEqual(s.next(), bi.midicps(61))
+        g = s.next()
+        self.assertIsInstance(g, fn.AbstractFunction)
+        self.assertEqual(g(60), bi.midicps(61))
+        self.assertEqual(s.next(), bi.midicps(3.5))
+
+
+class RoutineArityTestCase(unittest.TestCase):
+    def test_not_weakrefable(self):
+        class Gen():
+            __slots__ = ()
+
+            def __call__(self, inval):
+                yield inval
+
+        self.assertTrue(stm._takes_inval(Gen()))
+        self.assertTrue(stm._takes_inval(print))
+        self.assertFalse(stm._takes_inval(lambda: None))
+
+
+class FunctionFusionTestCase(unittest.TestCase):
+    def test_values(self):
+        @function
+        def f(x):
+            return x
+
+        g = 10 - (f * 2 + 1).squared() % 7
+        self.assertEqual(g(3), 10 - (3 * 2 + 1) ** 2 % 7)
+        self.assertEqual(g(4), 10 - (4 * 2 + 1) ** 2 % 7)
+        h = (f + f).clip(0, 5)
+        self.assertEqual(h(2), 4)
+        self.assertEqual(h(4), 5)
+
+    def test_nary_order(self):
+        log = []
+
+        def make(name):
+            @function
+            def f(x):
+                log.append(name)
+                return x
+            return f
+
+        g = make('a').clip(make('b'), make('c'))
+        self.assertEqual(g(3), 3)
+        self.assertEqual(log, ['b', 'c', 'a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
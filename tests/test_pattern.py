@@ -0,0 +1,426 @@
+import math
+import unittest
+
+from sc3.all import *
+from sc3.seq import pattern as ptt
+from sc3.seq import stream as stm
+from sc3.seq import event as evt
+from sc3.seq.patterns.listpatterns import (
+    Pseq, Prand, Pxrand, Pwrand, Pshuf, Ppar, Ptpar)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class RenderTestCase(unittest.TestCase):
+    def test_embed(self):
+        self.assertEqual(list(Pseq([1, Pseq([2, 3]), 4], 2)),
+                         [1, 2, 3, 4, 1, 2, 3, 4])
+
+    def test_next_n(self):
+        s = stream(Pseq([1, 2, 3]))
+        self.assertEqual(list(s.next_n(2)), [1, 2])
+        self.assertEqual(list(s.next_n(2)), [3])
+        self.assertEqual(len(s.next_n(2)), 0)
+        self.assertEqual(stream(Pseq([1, 'a'])).next_n(3)[0], 1)
+        self.assertIsInstance(stream(Pseq([1, 'a'])).next_n(3), list)
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array(self):
+        values = Pseq([1, 2.5, 3]).render(4)
+        self.assertIsInstance(values, np.ndarray)
+        self.assertEqual(values.tolist(), [1, 2.5, 3])
+
+    def test_ops(self):
+        a = Pseq([1, 2, 3], 2)
+        b = Pseq([10, 20], 4)
+        for pattern in [a + b, -a * b, (a + 1) / 2, b // a, abs(a - b),
+                        a ** 2, (a + b).midicps(), 2 ** a, b % 3 > a]:
+            expected = list(pattern)
+            self.assertEqual(list(pattern.render(100)), expected)
+            self.assertEqual(list(pattern.render(4)), expected[:4])
+
+    def test_errors(self):
+        with self.assertRaises(ZeroDivisionError):
+            (Pseq([1, 0]) / 0).render(2)
+        self.assertEqual(list((Pseq([2]) ** 70).render(1)), [2 ** 70])
+
+    def test_shared_stream(self):
+        s = stream(Pseq([1, 2, 3, 4]))
+        self.assertEqual(list((s + s).next_n(4)), [3, 7])
+        for make in [lambda s: s + s * 100, lambda s: s * (s + 1) + s]:
+            s = stream(Pseq([1, 2, 3, 4, 5, 6, 7, 8]))
+            expected = make(s).all()
+            s.reset()
+            self.assertEqual(list(make(s).next_n(4)), expected[:4])
+
+    def test_uneven(self):
+        a = stream(Pseq([1, 2, 3, 4, 5]))
+        b = stream(Pseq([10, 20]))
+        self.assertEqual(list((a + b).next_n(4)), [11, 22])
+        self.assertEqual(a.next(), 4)  # Like next, 3 was pulled.
+        c = stream(Pseq([1, 2, 3, 4, 5, 6, 7]))
+        b.reset()
+        self.assertEqual(list((c + (c + b)).next_n(4)), [13, 27])
+        self.assertEqual(c.next(), 7)
+        c.reset()
+        b.reset()
+        self.assertEqual(list(((c + 1) + (b - 1)).next_n(4)), [11, 22])
+        self.assertEqual(c.next(), 4)
+
+    def test_by_block(self):
+        apply_op = stm._apply_op
+        calls = []
+        def count(selector, *args):
+            calls.append(selector)
+            return apply_op(selector, *args)
+        stm._apply_op = count
+        try:
+            p = Pseq([1, 2, 3], 40) * Pseq([4, 5], 60) + 1
+            self.assertEqual(list(p.render(200)), list(p._stream()))
+            self.assertEqual(len(calls), 2)
+            self.assertIs(type(stream(Pseq([1, 2, 3], 40))), stm._CachedStream)
+            calls.clear()
+            self.assertEqual(len((Prand([1, 2, 3], 100) * 2).render(100)), 100)
+            self.assertEqual(len(calls), 1)
+            calls.clear()
+            a = stream(Pseq([1, 2, 3, 4, 5], 1))
+            b = stream(Pseq([10, 20], 1))
+            self.assertEqual(list((a + b).next_n(4)), [11, 22])
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(a.next(), 4)
+            self.assertEqual(a.next(), 5)
+            with self.assertRaises(StopIteration):
+                a.next()
+        finally:
+            stm._apply_op = apply_op
+
+
+class DeterministicCacheTestCase(unittest.TestCase):
+    def test_series(self):
+        self.assertEqual(list(Pseries(1, 2, 4)), [1, 3, 5, 7])
+        self.assertEqual(list(Pgeom(1, 3, 4)), [1, 3, 9, 27])
+        self.assertEqual(list(Pseries(0, Pseq([1, 10]), 5)), [0, 1])
+        s = stream(Pseries(0, 0.5))
+        self.assertEqual([s.next() for _ in range(3)], [0, 0.5, 1.0])
+
+    def test_cached(self):
+        p = Pseq([Pseries(0, 2, 4), Pgeom(1, 2, 3)], 2) * 10 + Pseq([1, 2.5], 3)
+        expected = list(p._stream())
+        self.assertEqual(expected, [1, 22.5, 41, 62.5, 11, 22.5])
+        s = stream(p)
+        self.assertIsNot(type(s), stm._CachedStream)
+        self.assertEqual(s.next_n(2).tolist(), expected[:2])
+        self.assertIsNot(type(stream(p)), stm._CachedStream)  # Not ended.
+        self.assertEqual(s.all(), expected)
+        s = stream(p)
+        self.assertIs(type(s), stm._CachedStream)
+        q = Pseq([1, 2.5], 3) * 10 + p
+        list(q)
+        self.assertIs(stream(q)._values, stream(q)._values)
+        self.assertEqual(s.all(), expected)
+        self.assertEqual([type(x) for x in s.all()], [type(x) for x in expected])
+        s.reset()
+        self.assertEqual(list(s.next_n(4)), expected[:4])
+        self.assertEqual(list(s.next_n(4)), expected[4:])
+
+    def test_not_cached(self):
+        for p in [Pseries(0, 1), Pseq([1, 2], float('inf')),
+                  Pseq([1, 2]).rand(), Pseq([1, 2]) + Pseries(0, 1),
+                  Pseq([1, [2, 3]])]:
+            self.assertIsNone(p._cache_key())
+        p = Pseries(0, 1, ptt._CACHE_MAX_LENGTH + 1)
+        self.assertIsNotNone(p._cache_key())
+        self.assertEqual(len(list(p)), ptt._CACHE_MAX_LENGTH + 1)
+        self.assertIsNot(type(stream(p)), stm._CachedStream)
+        self.assertIsNone(ptt._cache[p._cache_key()])
+
+    def test_float_keys(self):
+        for p, q in [(Pseq([0.0]), Pseq([-0.0])), (Pseq([0]), Pseq([0.0]))]:
+            self.assertNotEqual(p._cache_key(), q._cache_key())
+            self.assertEqual(list(p), list(q))
+        list(Pseq([0.0, 1]) * 1)
+        values = list(Pseq([-0.0, 1]) * 1)
+        self.assertEqual(math.copysign(1, values[0]), -1)
+        self.assertEqual(
+            math.copysign(1, list(Pseq([-0.0, 1]) * 1)[0]), -1)
+        self.assertIsNone(Pseq([float('nan')])._cache_key())
+
+    def test_mutation(self):
+        p = Pseq([1, 2, 3])
+        self.assertEqual(list(p), [1, 2, 3])
+        p.lst[1] = 20
+        self.assertEqual(list(p), [1, 20, 3])
+
+
+class EmbedStreamTestCase(unittest.TestCase):
+    def embed(self, pattern):
+        def gen(inval=None):
+            yield from pattern.__embed__(inval)
+        return Routine(gen)
+
+    def take(self, stream, n, inval=None):
+        ret = []
+        for _ in range(n):
+            try:
+                ret.append(stream.next(inval))
+            except StopStream:
+                break
+        return ret
+
+    def test_same_values(self):
+        patterns = [
+            Pseq([1, Pseq([2, Pn(Pseq([3, 4]), 2)]), 5], 2),
+            Pn(Pseq([1, 2.0]), 3),
+            Pseq([1, Pseries(0, 1, 3)], float('inf'), 1),
+            Pseq([Pseq([1, 2]), Pbind('a', Pseq([1, 2, 3]))], 2),
+            Pseq([Pbind('a', Pseq([1, 2])), Pn(Pbind('b', 3), 2, 'k')]),
+            Pseq([1, Pseq([4]) * 2, Pseries(1, Pseq([1, 2]), 5)])]
+        for pattern in patterns:
+            self.assertEqual(self.take(ptt._EmbedStream(pattern), 20, {}),
+                             self.take(self.embed(pattern), 20, {}))
+        pattern = Pseq([1, stream(Pseq([2, 3], 1.0)), 4])
+        self.assertEqual(list(pattern), [1, 2, 3, 4])
+
+    def test_stream(self):
+        pattern = Pseq([1, Pseq([2, 3], 1.0)], 2.0)
+        stream = pattern.__stream__()
+        self.assertIs(type(stream), ptt._EmbedStream)
+        self.assertEqual(stream.all(), [1, 2, 3, 1, 2, 3])
+        with self.assertRaises(StopStream):
+            stream.next()
+        stream.reset()
+        self.assertEqual(stream.next(), 1)
+        self.assertEqual(list(Pn(Pseq([1, 2]), 2)), [1, 2, 1, 2])
+
+    def test_deep(self):
+        pattern = Pseq([1, 2], 2.0)
+        for _ in range(2000):  # More than the recursion limit.
+            pattern = Pseq([pattern], 1.0)
+        self.assertEqual(list(pattern), [1, 2, 1, 2])
+
+
+class EventRecordTestCase(unittest.TestCase):
+    def test_record(self):
+        schema = evt.EventSchema(['a', 'b', 'a'])
+        self.assertEqual(schema.keys, ('a', 'b'))
+        parent = {'b': 1, 'c': 2}
+        event = evt.EventRecord(schema, parent)
+        event['a'] = 10
+        event['c'] = 20
+        event['d'] = 30
+        self.assertEqual(event, {'a': 10, 'b': 1, 'c': 20, 'd': 30})
+        self.assertEqual(list(event), ['a', 'c', 'd', 'b'])
+        self.assertEqual(parent, {'b': 1, 'c': 2})
+        copy = event.copy()
+        copy['b'] = 3
+        del copy['c']
+        self.assertEqual(copy, {'a': 10, 'b': 3, 'c': 2, 'd': 30})
+        self.assertEqual(event['b'], 1)
+        with self.assertRaises(KeyError):
+            del copy['c']
+
+    def test_pbind(self):
+        proto = {'dur': 0.5, 'amp': 0.1}
+        s = stream(Pbind('degree', Pseq([0, 1]), ['amp', 'pan'], [0.2, -1]))
+        event = s.next(proto)
+        self.assertIsInstance(event, evt.EventRecord)
+        self.assertIs(event.parent, proto)
+        self.assertEqual(
+            event, {'degree': 0, 'amp': 0.2, 'pan': -1, 'dur': 0.5})
+        self.assertEqual(proto, {'dur': 0.5, 'amp': 0.1})
+        self.assertEqual(s.next(event)['degree'], 1)
+        event = {}
+        s = stream(Pbind('a', Pseries(0, 1)))
+        for _ in range(100):
+            event = s.next(event)
+        self.assertEqual(event['a'], 99)
+        self.assertLessEqual(event._depth, evt.EventRecord._MAX_DEPTH)
+
+
+class TableTestCase(unittest.TestCase):
+    def test_columns(self):
+        pattern = Pbind(
+            'degree', Pseq([0, 1, 2, 3]),
+            'dur', Pseq([0.5, Rest(1), 0.25], float('inf')),
+            'x', Pseq([1, 'a'], float('inf')))
+        table = pattern.to_table(10, {'stretch': 2})
+        self.assertEqual(
+            list(table), ['onset', 'degree', 'dur', 'x', 'stretch', 'rest'])
+        self.assertEqual(list(table['onset']), [0, 1, 3, 3.5])
+        self.assertEqual(list(table['degree']), [0, 1, 2, 3])
+        self.assertEqual(list(table['dur']), [0.5, 1, 0.25, 0.5])
+        self.assertEqual(list(table['x']), [1, 'a', 1, 'a'])
+        self.assertEqual(list(table['rest']), [False, True, False, False])
+        self.assertEqual(len(pattern.to_table(3)['onset']), 3)
+
+    def test_logical_time(self):
+        def beats():
+            while True:
+                yield main.current_tt.beats
+
+        main.nrt()
+        try:
+            start = main.current_tt.beats
+            pattern = Pbind('t', Routine(beats), 'dur', Pseq([1, 0.5, 2]))
+            table = pattern.to_table(10, {'stretch': 2})
+            self.assertEqual([t - start for t in table['t']], [0, 2, 3])
+            self.assertEqual(main.current_tt.beats, start)
+        finally:
+            main.rt()
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array(self):
+        pattern = Pseq([
+            Pbind('a', Pseq([1, 2]), 'delta', 0.5),
+            Pbind('b', Pseq([0.5]))])
+        table = pattern.to_table(100)
+        self.assertEqual(table['onset'].dtype, float)
+        self.assertEqual(table['a'].dtype, float)
+        self.assertTrue(np.isnan(table['a'][2]))
+        self.assertEqual(list(table['onset']), [0, 0.5, 1])
+        self.assertEqual(Pbind('a', Pseq([1, 2])).to_table(5)['a'].dtype, int)
+        self.assertEqual(len(Pbind('a', 1).to_table(0)['onset']), 0)
+
+
+class PparTestCase(unittest.TestCase):
+    def test_merge(self):
+        pattern = Ppar([
+            Pbind('a', Pseq([1, 2, 3]), 'dur', 1),
+            Pbind('b', Pseq([1, 2]), 'dur', 1.5)])
+        table = pattern.to_table(20)
+        self.assertEqual(list(table['onset']), [0, 0, 1, 1.5, 2, 3])
+        self.assertEqual(list(table['delta']), [0, 1, 0.5, 0.5, 1, 0])
+        self.assertEqual(list(table['rest'])[-1], True)
+        events = list(stream(Ppar([Pbind('a', i) for i in range(100)], 2))
+                      .next_n(200, {}))
+        self.assertEqual([e['a'] for e in events[:100]], list(range(100)))
+        self.assertEqual(sum(evt._event_delta(e) for e in events), 2)
+
+    def test_offsets(self):
+        pattern = Ptpar([
+            0.5, Pbind('a', Pseq([1, 2])),
+            0, Pbind('b', Pseq([1]), 'dur', 0.25)], 2)
+        table = pattern.to_table(20)
+        self.assertEqual(
+            list(table['onset']), [0, 0.25, 0.5, 1.5, 2.5, 2.75, 3, 4])
+        self.assertEqual(
+            list(table['rest']), [False, True, False, False] * 2)
+
+    def test_cleanup(self):
+        calls = []
+
+        def voice(inval):
+            inval = yield {'dur': 1, 'add_to_cleanup': [calls.append]}
+            yield {'dur': 1}
+
+        s = stream(Ppar([Routine(voice), Pbind('a', Pseq([1, 2, 3]))]))
+        cleanup = EventStreamCleanup()
+        for i in range(6):  # The voice ends in the fifth event.
+            cleanup.update(s.next({}))
+            self.assertEqual(len(cleanup.functions), 0 if i > 3 else 1)
+            self.assertEqual(calls, [True] if i > 3 else [])
+        with self.assertRaises(StopStream):
+            s.next({})
+
+
+class RandomListPatternTestCase(unittest.TestCase):
+    def run_routine(self, func):
+        result = []
+
+        def rout():
+            result.extend(func(main.current_tt))
+            yield
+
+        Routine(rout).next()
+        return result
+
+    def take(self, pattern, n):
+        return list(stream(pattern).next_n(n))
+
+    def test_values(self):
+        lst = [1, 2, 3, 4]
+        values = list(Prand(lst, 100))
+        self.assertEqual(len(values), 100)
+        self.assertEqual(set(values), set(lst))
+        values = list(Pxrand(lst, 100))
+        self.assertTrue(all(a != b for a, b in zip(values, values[1:])))
+        values = list(Pshuf(lst, 3))
+        self.assertEqual(sorted(values[:4]), lst)
+        self.assertEqual(values[:4] * 3, values)
+        values = list(Pwrand(lst, [0, 1, 0, 3], 1000))
+        self.assertEqual(set(values), {2, 4})
+        self.assertGreater(values.count(4), values.count(2))
+        values = list(Pwrand(lst, Pseq([[1, 0, 0, 0], [0, 0, 0, 1]], 5), 20))
+        self.assertEqual(values, [1, 4] * 5)
+        self.assertEqual(list(Pseq([Prand([Pseq([1, 2])], 2), 3])),
+                         [1, 2, 1, 2, 3])
+
+    def test_seed(self):
+        patterns = [Prand(list(range(10)), 600), Pxrand(list(range(10)), 600),
+                    Pwrand(list(range(3)), [1, 2, 3], 600),
+                    Pshuf(list(range(10)), 60)]
+
+        def func(seed):
+            def draw(thread):
+                thread.rand_seed(seed)
+                return [self.take(p, 600) for p in patterns]
+            return draw
+
+        self.assertEqual(self.run_routine(func(1)), self.run_routine(func(1)))
+        self.assertNotEqual(self.run_routine(func(1)), self.run_routine(func(2)))
+
+    def test_state(self):
+        pattern = Prand(list(range(100)), float('inf'))
+
+        def draw(thread):
+            thread.rand_seed(3)
+            self.take(pattern, 10)
+            thread.rgen.random()
+            state = thread.rand_state
+            a = (self.take(pattern, 300), thread.rgen.random())
+            thread.rand_state = state
+            b = (self.take(pattern, 300), thread.rgen.random())
+            return [a, b]
+
+        a, b = self.run_routine(draw)
+        self.assertEqual(a, b)
+
+    def test_reseed(self):
+        patterns = [Prand(list(range(100)), float('inf')),
+                    Pxrand(list(range(100)), float('inf')),
+                    Pwrand(list(range(3)), [1, 2, 3], float('inf'))]
+
+        def draw(thread):
+            ret = []
+            for pattern in patterns:
+                thread.rand_seed(2)
+                expected = self.take(pattern, 300)
+                thread.rand_seed(1)
+                s = stream(pattern)
+                s.next_n(10)
+                thread.rand_seed(2)  # Running stream.
+                a = list(s.next_n(300))
+                state = thread.rand_state
+                b = list(s.next_n(10))
+                thread.rand_state = state
+                ret.append((expected, a, b, list(s.next_n(10))))
+            return ret
+
+        def offsets(values):
+            return [(y - x) % 100 for x, y in zip(values, values[1:])]
+
+        result = self.run_routine(draw)
+        for pattern, (expected, a, b, c) in zip(patterns, result):
+            if type(pattern) is Pxrand:
+                # Starts from the last index instead of drawing one.
+                self.assertEqual(offsets(b), offsets(c))
+            else:
+                self.assertEqual(a, expected)
+                self.assertEqual(b, c)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from sc3.seq.scale import Scale, Tuning
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ScaleTestCase(unittest.TestCase):
+    def test_catalog(self):
+        for name in Scale.names():
+            scale = Scale(name)
+            self.assertEqual(len(scale), len(scale.degrees))
+            self.assertEqual(scale.ppo, len(scale.tuning))
+        for name in Tuning.names():
+            self.assertEqual(Tuning(name)[0], 0)
+        with self.assertRaises(ValueError):
+            Scale('unknown')
+        with self.assertRaises(ValueError):
+            Scale('major', tuning='et24')
+
+    def test_tuning(self):
+        scale = Scale('major', tuning='just')
+        self.assertEqual(scale.name, 'Major')
+        self.assertAlmostEqual(scale.ratios()[4], 3 / 2)
+        self.assertAlmostEqual(scale.degree_to_ratio(11), 3 / 2 * 2)
+        self.assertAlmostEqual(scale.degree_to_freq(-2, 440, 1), 440 * 5 / 3)
+        scale = Scale([0, 4, 8], 13, 'bp')
+        self.assertEqual(scale.spo(), Tuning('bp').spo())
+        self.assertAlmostEqual(scale.degree_to_ratio(3), 3)
+        self.assertEqual(Scale(list(range(0, 24, 2))).ppo, 24)
+
+    def test_degree_to_key(self):
+        scale = Scale('dorian')
+        self.assertEqual(
+            [scale.degree_to_key(d) for d in range(-2, 9)],
+            [-3, -2, 0, 2, 3, 5, 7, 9, 10, 12, 14])
+        self.assertEqual(scale.degree_to_key(1, acc=1), 3)
+        self.assertEqual(scale.degree_to_midinote(7, 4), 60)
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array(self):
+        scale = Scale('hirajoshi', tuning=Tuning('pythagorean'))
+        degrees = np.arange(-12, 13)
+        for method in [scale.degree_to_key, scale.degree_to_midinote,
+                       scale.degree_to_ratio]:
+            self.assertTrue(np.allclose(
+                method(degrees), [method(int(d)) for d in degrees]))
+        self.assertTrue(np.allclose(
+            scale.degree_to_freq(degrees, 100, 1),
+            [scale.degree_to_freq(int(d), 100, 1) for d in degrees]))
+
+
+if __name__ == '__main__':
+    unittest.main()
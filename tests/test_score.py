@@ -0,0 +1,110 @@
+import unittest
+import os
+import struct
+import tempfile
+
+from sc3.all import *
+from sc3.base import _osclib as oli
+
+
+def read_osc_file(path):
+    ret = []
+    with open(path, 'rb') as file:
+        data = file.read()
+    i = 0
+    while i < len(data):
+        size, = struct.unpack('>i', data[i:i+4])
+        bndl = oli.OscBundle(data[i+4:i+4+size])
+        ret.append((bndl.timetag / 2 ** 32, [m.address for m in bndl]))
+        i += 4 + size
+    return ret
+
+
+class ScoreTestCase(unittest.TestCase):
+    def setUp(self):
+        main.nrt()
+        self.prev_score = main.nrt_score
+        self.path = tempfile.mktemp(suffix='.osc')
+
+    def tearDown(self):
+        main.nrt_score = self.prev_score
+        main.rt()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def play(self):
+        addr = NetAddr('127.0.0.1', 57110)
+
+        @routine
+        def rout():
+            for i in range(3):
+                addr.send_bundle(1, ['/s_new', 'default', -1, 0, 1])
+                yield 0.5
+            addr.send_msg('/n_free', 1)
+
+        start = main.current_tt.seconds
+        rout.play()
+        main.run_nrt()
+        return start
+
+    def test_record(self):
+        main.nrt_score = score = Score()
+        start = self.play()
+        self.assertEqual(
+            [b[0] - start for b in score], [1.0, 1.5, 2.0, 1.5])
+        self.assertEqual(score[3], [start + 1.5, ['/n_free', 1]])
+        score.write_osc_file(self.path)
+        bundles = read_osc_file(self.path)
+        self.assertEqual(
+            [b[1] for b in bundles], [['/s_new'], ['/s_new'],
+            ['/n_free'], ['/s_new']])
+        self.assertAlmostEqual(bundles[1][0], start + 1.5)
+
+    def test_writer(self):
+        with ScoreWriter(self.path, 0) as writer:
+            main.nrt_score = writer
+            start = self.play()
+            self.assertLess(len(writer), 3)
+        bundles = read_osc_file(self.path)
+        self.assertEqual(
+            [b[1] for b in bundles], [['/s_new'], ['/s_new'],
+            ['/n_free'], ['/s_new']])
+        for (time, _), delta in zip(bundles, [1.0, 1.5, 1.5, 2.0]):
+            self.assertAlmostEqual(time - start, delta)
+
+    def test_writer_late(self):
+        with ScoreWriter(self.path, 0.5) as writer:
+            main.nrt_score = writer
+            addr = NetAddr('127.0.0.1', 57110)
+
+            @routine
+            def rout():
+                for i in range(4):
+                    addr.send_bundle(0, ['/n_free', i])
+                    yield 1
+                addr.send_bundle(-3.5, ['/n_run', 0, 0])  # Late and earlier.
+
+            start = main.current_tt.seconds
+            rout.play()
+            main.run_nrt()
+            self.assertTrue(writer._unsorted)
+        bundles = read_osc_file(self.path)
+        self.assertEqual(
+            [b[1] for b in bundles], [['/n_free'], ['/n_run']] + [['/n_free']] * 3)
+        times = [b[0] for b in bundles]
+        self.assertEqual(times, sorted(times))
+
+    def test_dgram(self):
+        main.nrt_score = score = Score()
+        dgram = oli.OscMessageBuilder('/n_free').build().dgram
+        addr = NetAddr('127.0.0.1', 57110)
+        addr.send_bundle(None, dgram, ['/n_free', 1])
+        self.assertIs(score[0][1], dgram)
+        score = Score([[0, dgram], [0.5, ['/n_free', 1]]])
+        score.write_osc_file(self.path)
+        self.assertEqual(
+            read_osc_file(self.path), [(0, ['/n_free']), (0.5, ['/n_free'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
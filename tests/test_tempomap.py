@@ -0,0 +1,73 @@
+import unittest
+
+from sc3.all import *
+from sc3.seq.tempomap import TempoMap
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TempoMapTestCase(unittest.TestCase):
+    def setUp(self):
+        self.map = TempoMap(1, 0, 0)
+        self.map.add(4, 2)
+        self.map.ramp(8, 4, 4)
+
+    def test_conversion(self):
+        m = self.map
+        self.assertEqual(m.beats2secs(-1), -1)
+        self.assertEqual(m.beats2secs(6), 5)
+        self.assertEqual(m.secs2beats(6), 8)
+        self.assertEqual(m.tempo_at(10), 3)
+        self.assertEqual(m.tempo_at(20), 4)
+        for beats in [-2, 1, 4, 5.5, 9, 11.9, 12, 16]:
+            self.assertAlmostEqual(m.secs2beats(m.beats2secs(beats)), beats)
+
+    def test_truncate(self):
+        m = self.map
+        m.add(6, 3)
+        self.assertEqual(len(m), 3)
+        self.assertEqual(m.beats2secs(9), 6)
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array(self):
+        m = self.map
+        beats = np.linspace(-4, 20, 97)
+        secs = m.beats2secs(beats)
+        self.assertTrue(np.allclose(secs, [m.beats2secs(b) for b in beats]))
+        self.assertTrue(np.allclose(m.secs2beats(secs), beats))
+
+
+class TempoClockMapTestCase(unittest.TestCase):
+    def setUp(self):
+        main.nrt()
+
+    def tearDown(self):
+        main.rt()
+
+    def test_record(self):
+        start = main.current_tt.seconds
+        clock = TempoClock(1)
+        tempo_map = clock.record_tempo_map()
+
+        @routine
+        def rout():
+            yield 2
+            clock.tempo = 2
+            yield 2
+            clock.tempo = 4
+
+        clock.play(rout, 0)
+        main.run_nrt()
+        self.assertEqual(len(tempo_map), 3)
+        self.assertEqual(tempo_map.beats2secs(1) - start, 1)
+        self.assertEqual(tempo_map.beats2secs(3) - start, 2.5)
+        self.assertEqual(tempo_map.beats2secs(8) - start, 4)
+        self.assertEqual(clock.beats2secs(8), tempo_map.beats2secs(8))
+        clock.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()